@@ -122,7 +122,13 @@ def name(self):
 
     @_ensure_other_is_target
     def __eq__(self, other):
-        return self.microarchitecture == other.microarchitecture and \
+        # Known microarchitectures are unique objects, check identity first
+        # since comparing their ancestors is expensive
+        same_microarchitecture = (
+            self.microarchitecture is other.microarchitecture or
+            self.microarchitecture == other.microarchitecture
+        )
+        return same_microarchitecture and \
             self.module_name == other.module_name
 
     def __ne__(self, other):
@@ -4,12 +4,17 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import codecs
+import io
+import multiprocessing
+import multiprocessing.pool
 import os
 import re
 import sys
 import tarfile
 import shutil
 import tempfile
+import threading
+import time
 import hashlib
 import glob
 
@@ -36,6 +41,7 @@
 import spack.mirror
 import spack.util.url as url_util
 import spack.util.web as web_util
+from spack.util.compression import ParallelGzipWriter
 from spack.spec import Spec
 from spack.stage import Stage
 
@@ -91,8 +97,26 @@ def __init__(self, cache_root=None):
         #     - the concrete spec itself, keyed by ``spec`` (including the
         #           full hash, since the dag hash may match but we want to
         #           use the updated source if available)
+        #
+        # Entries are only added when a DAG hash is looked up, because the
+        # spec has to be read from the cached indices for that.
         self._mirrors_for_spec = {}
 
+        # (mirror url, cache key) of the cached indices associated so far,
+        # in order, and the number of those already searched for each DAG
+        # hash in _mirrors_for_spec
+        self._associated_indices = []
+        self._indices_searched = {}
+
+        # lock of the concrete spec cache, which is filled as specs are
+        # looked up, possibly by several threads
+        self._spec_cache_lock = threading.RLock()
+
+        # lookup tables of the cached indices read so far, by the cache key
+        # of the index.  The cache key includes the hash of the mirror url,
+        # so that mirrors with the same index don't share tables.
+        self._lookup_tables = {}
+
     def _init_local_index_cache(self):
         if not self._index_file_cache:
             self._index_file_cache = file_cache.FileCache(
@@ -118,6 +142,9 @@ def clear(self):
         self._local_index_cache = None
         self._specs_already_associated = set()
         self._mirrors_for_spec = {}
+        self._associated_indices = []
+        self._indices_searched = {}
+        self._lookup_tables = {}
 
     def _write_local_index_cache(self):
         self._init_local_index_cache()
@@ -130,68 +157,150 @@ def regenerate_spec_cache(self, clear_existing=False):
         from the locally cached buildcache index files.  This is essentially a
         no-op if it has already been done, as we keep track of the index
         hashes for which we have already associated the built specs. """
-        self._init_local_index_cache()
+        with self._spec_cache_lock:
+            self._init_local_index_cache()
+
+            if clear_existing:
+                self._specs_already_associated = set()
+                self._mirrors_for_spec = {}
+                self._associated_indices = []
+                self._indices_searched = {}
+
+            for mirror_url in self._local_index_cache:
+                cache_entry = self._local_index_cache[mirror_url]
+                cached_index_path = cache_entry['index_path']
+                if cached_index_path not in self._specs_already_associated:
+                    self._associate_built_specs_with_mirror(
+                        cached_index_path, mirror_url)
+                    self._specs_already_associated.add(cached_index_path)
+
+    @staticmethod
+    def _lookup_table_keys(cache_key):
+        name = os.path.splitext(cache_key)[0]
+        return ('lookup_{0}.json'.format(name),
+                'records_{0}.jsonl'.format(name))
+
+    def _lookup_table(self, cache_key):
+        """Return the lookup table of a cached index, which maps the DAG hash
+        of each spec in the index to its full hash and to the offset of its
+        install record in the records file of the index.
+
+        The first time, the index is read to write the records file, which
+        has one install record per line, and the lookup table.  Both are
+        cached along with the index, so that the specs are only read from
+        the records file when they are looked up.
+        """
+        if cache_key in self._lookup_tables:
+            return self._lookup_tables[cache_key]
 
-        if clear_existing:
-            self._specs_already_associated = set()
-            self._mirrors_for_spec = {}
+        table_key, records_key = self._lookup_table_keys(cache_key)
+        if (self._index_file_cache.init_entry(table_key) and
+                self._index_file_cache.init_entry(records_key)):
+            with self._index_file_cache.read_transaction(table_key) as f:
+                table = json.load(f)
+            self._lookup_tables[cache_key] = table
+            return table
 
-        for mirror_url in self._local_index_cache:
-            cache_entry = self._local_index_cache[mirror_url]
-            cached_index_path = cache_entry['index_path']
-            cached_index_hash = cache_entry['index_hash']
-            if cached_index_hash not in self._specs_already_associated:
-                self._associate_built_specs_with_mirror(cached_index_path,
-                                                        mirror_url)
-                self._specs_already_associated.add(cached_index_hash)
+        self._index_file_cache.init_entry(cache_key)
+        with self._index_file_cache.read_transaction(cache_key) as f:
+            installs = sjson.load(f)['database']['installs']
+
+        table = {}
+        offset = 0
+        with self._index_file_cache.write_transaction(records_key) as (
+                old, new):
+            for dag_hash, record in installs.items():
+                # The spec of each record is a single node dictionary
+                node = next(iter(record['spec'].values()))
+                line = json.dumps(record) + '\n'
+                new.write(line)
+                table[dag_hash] = [node.get('full_hash'), offset]
+                offset += len(line)
+
+        with self._index_file_cache.write_transaction(table_key) as (old, new):
+            json.dump(table, new)
+        self._lookup_tables[cache_key] = table
+        return table
 
     def _associate_built_specs_with_mirror(self, cache_key, mirror_url):
-        tmpdir = tempfile.mkdtemp()
-
-        try:
-            db_root_dir = os.path.join(tmpdir, 'db_root')
-            db = spack_db.Database(None, db_dir=db_root_dir,
-                                   enable_transaction_locking=False)
-
-            self._index_file_cache.init_entry(cache_key)
-            cache_path = self._index_file_cache.cache_path(cache_key)
-            with self._index_file_cache.read_transaction(cache_key):
-                db._read_from_file(cache_path)
-
-            spec_list = db.query_local(installed=False)
-
-            for indexed_spec in spec_list:
-                dag_hash = indexed_spec.dag_hash()
-                full_hash = indexed_spec._full_hash
-
-                if dag_hash not in self._mirrors_for_spec:
-                    self._mirrors_for_spec[dag_hash] = []
-
-                for entry in self._mirrors_for_spec[dag_hash]:
-                    # A binary mirror can only have one spec per DAG hash, so
-                    # if we already have an entry under this DAG hash for this
-                    # mirror url, we may need to replace the spec associated
-                    # with it (but only if it has a different full_hash).
+        self._lookup_table(cache_key)
+        self._associated_indices.append((mirror_url, cache_key))
+
+    def _read_indexed_spec(self, cache_key, dag_hash):
+        """Construct the spec with the given DAG hash from the records file
+        of a cached index, reading only the records of its dependencies."""
+        table = self._lookup_tables[cache_key]
+        _, records_key = self._lookup_table_keys(cache_key)
+
+        nodes = []
+        with self._index_file_cache.read_transaction(records_key):
+            records_path = self._index_file_cache.cache_path(records_key)
+            with open(records_path, 'rb') as f:
+                read, pending = set(), [dag_hash]
+                while pending:
+                    node_hash = pending.pop(0)
+                    if node_hash in read:
+                        continue
+                    read.add(node_hash)
+
+                    f.seek(table[node_hash][1])
+                    record = sjson.load(f.readline().decode('utf-8'))
+                    node = record['spec']
+                    name = next(iter(node))
+                    # Install records don't include the hash of the spec
+                    node[name]['hash'] = node_hash
+                    nodes.append(node)
+
+                    for dep in node[name].get('dependencies', {}).values():
+                        pending.append(dep['hash'])
+
+        spec = Spec.from_dict({'spec': nodes})
+        spec._mark_concrete()
+        return spec
+
+    def _associate_built_spec(self, dag_hash):
+        """Add the mirrors whose index has a DAG hash to
+        ``_mirrors_for_spec``, along with the spec read from their index."""
+        with self._spec_cache_lock:
+            searched = self._indices_searched.get(dag_hash, 0)
+            indices = self._associated_indices
+            self._indices_searched[dag_hash] = len(indices)
+            for mirror_url, cache_key in indices[searched:]:
+                table = self._lookup_tables.get(cache_key, {})
+                if dag_hash not in table:
+                    continue
+                full_hash = table[dag_hash][0]
+
+                entries = self._mirrors_for_spec.setdefault(dag_hash, [])
+                for entry in entries:
+                    # A binary mirror can only have one spec per DAG hash,
+                    # so if we already have an entry under this DAG hash for
+                    # this mirror url, we may need to replace the spec
+                    # associated with it (but only if it has a different
+                    # full_hash).
                     if entry['mirror_url'] == mirror_url:
-                        if full_hash and full_hash != entry['spec']._full_hash:
-                            entry['spec'] = indexed_spec
+                        spec = entry['spec']
+                        if full_hash and full_hash != spec._full_hash:
+                            entry['spec'] = self._read_indexed_spec(
+                                cache_key, dag_hash)
                         break
                 else:
-                    self._mirrors_for_spec[dag_hash].append({
-                        "mirror_url": mirror_url,
-                        "spec": indexed_spec,
-                    })
-        finally:
-            shutil.rmtree(tmpdir)
+                    spec = self._read_indexed_spec(cache_key, dag_hash)
+                    entries.append({"mirror_url": mirror_url, "spec": spec})
 
     def get_all_built_specs(self):
-        spec_list = []
-        for dag_hash in self._mirrors_for_spec:
-            # in the absence of further information, all concrete specs
-            # with the same DAG hash are equivalent, so we can just
-            # return the first one in the list.
-            if len(self._mirrors_for_spec[dag_hash]) > 0:
-                spec_list.append(self._mirrors_for_spec[dag_hash][0]['spec'])
+        with self._spec_cache_lock:
+            for _, cache_key in self._associated_indices:
+                for dag_hash in self._lookup_tables.get(cache_key, {}):
+                    self._associate_built_spec(dag_hash)
+
+            spec_list = []
+            for entries in self._mirrors_for_spec.values():
+                # in the absence of further information, all concrete specs
+                # with the same DAG hash are equivalent, so we can just
+                # return the first one in the list.
+                if len(entries) > 0:
+                    spec_list.append(entries[0]['spec'])
 
         return spec_list
 
@@ -227,10 +336,9 @@ def find_built_spec(self, spec):
         self.regenerate_spec_cache()
 
         find_hash = spec.dag_hash()
-        if find_hash not in self._mirrors_for_spec:
-            return None
-
-        return self._mirrors_for_spec[find_hash]
+        with self._spec_cache_lock:
+            self._associate_built_spec(find_hash)
+            return self._mirrors_for_spec.get(find_hash)
 
     def update_spec(self, spec, found_list):
         """
@@ -269,7 +377,8 @@ def update(self):
         configured_mirror_urls = [m.fetch_url for m in mirrors.values()]
         items_to_remove = []
         spec_cache_clear_needed = False
-        spec_cache_regenerate_needed = not self._mirrors_for_spec
+        spec_cache_regenerate_needed = not (
+            self._mirrors_for_spec or self._associated_indices)
 
         # First compare the mirror urls currently present in the cache to the
         # configured mirrors.  If we have a cached index for a mirror which is
@@ -320,6 +429,8 @@ def update(self):
             url = item['url']
             cache_key = item['cache_key']
             self._index_file_cache.remove(cache_key)
+            self._remove_lookup_table(
+                self._local_index_cache[url]['index_path'])
             del self._local_index_cache[url]
 
         # Iterate the configured mirrors now.  Any mirror urls we do not
@@ -339,6 +450,44 @@ def update(self):
         if spec_cache_regenerate_needed:
             self.regenerate_spec_cache(clear_existing=spec_cache_clear_needed)
 
+    def full_hashes(self, mirror_url):
+        """Map the DAG hash of each spec in the index of a mirror to its full
+        hash.
+
+        The index of the mirror is fetched and cached first, unless the
+        cached copy is up to date.  The mirror does not need to be among the
+        configured mirrors.  This reads the lookup table of the index, so
+        no spec is constructed.
+
+        Args:
+            mirror_url (str): Base url of mirror
+
+        Returns:
+            A dictionary of DAG hashes to full hashes, or None if the index
+                of the mirror cannot be read.  The full hash is None for
+                specs indexed without one.
+        """
+        self._init_local_index_cache()
+
+        cache_entry = self._local_index_cache.get(mirror_url)
+        expect_hash = cache_entry['index_hash'] if cache_entry else None
+        if self._fetch_and_cache_index(mirror_url, expect_hash=expect_hash):
+            self._write_local_index_cache()
+
+        cache_entry = self._local_index_cache.get(mirror_url)
+        if not cache_entry:
+            return None
+
+        table = self._lookup_table(cache_entry['index_path'])
+        return dict((dag_hash, full_hash)
+                    for dag_hash, (full_hash, _) in table.items())
+
+    def _remove_lookup_table(self, cache_key):
+        self._lookup_tables.pop(cache_key, None)
+        for key in self._lookup_table_keys(cache_key):
+            if self._index_file_cache.init_entry(key):
+                self._index_file_cache.remove(key)
+
     def _fetch_and_cache_index(self, mirror_url, expect_hash=None):
         """ Fetch a buildcache index file from a remote mirror and cache it.
 
@@ -433,6 +582,7 @@ def _fetch_and_cache_index(self, mirror_url, expect_hash=None):
         # clean up the old cache_key if necessary
         if old_cache_key:
             self._index_file_cache.remove(old_cache_key)
+            self._remove_lookup_table(old_cache_key)
 
         # We fetched an index and updated the local index cache, we should
         # regenerate the spec cache as a result.
@@ -550,10 +700,10 @@ def read_buildinfo_file(prefix):
     return buildinfo
 
 
-def write_buildinfo_file(spec, workdir, rel=False):
+def get_buildinfo(spec, rel=False):
     """
-    Create a cache file containing information
-    required for the relocation
+    Return the information required for the relocation of the
+    installation prefix of a spec
     """
     prefix = spec.prefix
     text_to_relocate = []
@@ -565,13 +715,20 @@ def write_buildinfo_file(spec, workdir, rel=False):
     deps = spack.build_environment.get_rpath_deps(spec.package)
     for d in deps:
         prefix_to_hash[str(d.prefix)] = d.dag_hash()
+    # Find the types of all the files at once, with several threads
+    path_names = []
+    for root, dirs, files in os.walk(prefix, topdown=True):
+        dirs[:] = [d for d in dirs if d not in blacklist]
+        path_names.extend(os.path.join(root, f) for f in files)
+    mime_types = relocate.mime_types(path_names)
+
     # Do this at during tarball creation to save time when tarball unpacked.
     # Used by make_package_relative to determine binaries to change.
     for root, dirs, files in os.walk(prefix, topdown=True):
         dirs[:] = [d for d in dirs if d not in blacklist]
         for filename in files:
             path_name = os.path.join(root, filename)
-            m_type, m_subtype = relocate.mime_type(path_name)
+            m_type, m_subtype = mime_types[path_name]
             if os.path.islink(path_name):
                 link = os.readlink(path_name)
                 if os.path.isabs(link):
@@ -597,7 +754,6 @@ def write_buildinfo_file(spec, workdir, rel=False):
                 rel_path_name = os.path.relpath(path_name, prefix)
                 text_to_relocate.append(rel_path_name)
 
-    # Create buildinfo data and write it to disk
     buildinfo = {}
     buildinfo['relative_rpaths'] = rel
     buildinfo['buildpath'] = spack.store.layout.root
@@ -608,6 +764,15 @@ def write_buildinfo_file(spec, workdir, rel=False):
     buildinfo['relocate_binaries'] = binary_to_relocate
     buildinfo['relocate_links'] = link_to_relocate
     buildinfo['prefix_to_hash'] = prefix_to_hash
+    return buildinfo
+
+
+def write_buildinfo_file(spec, workdir, rel=False):
+    """
+    Create a cache file containing information
+    required for the relocation
+    """
+    buildinfo = get_buildinfo(spec, rel)
     filename = buildinfo_file_name(workdir)
     with open(filename, 'w') as outfile:
         outfile.write(syaml.dump(buildinfo, default_flow_style=True))
@@ -685,42 +850,132 @@ def sign_tarball(key, force, specfile_path):
     spack.util.gpg.sign(key, specfile_path, '%s.asc' % specfile_path)
 
 
-def generate_package_index(cache_prefix):
+def _read_spec_yaml_from_url(url):
+    """Fetch the contents of the spec.yaml file at url, or return None if it
+    cannot be read."""
+    try:
+        tty.debug('fetching {0}'.format(url))
+        _, _, yaml_file = web_util.read_from_url(url)
+        return codecs.getreader('utf-8')(yaml_file).read()
+    except (URLError, web_util.SpackWebError) as url_err:
+        tty.error('Error reading spec.yaml: {0}'.format(url))
+        tty.error(url_err)
+        return None
+
+
+def _dag_hash_from_file_name(file_name):
+    """DAG hash in the name of a spec.yaml file named by tarball_name()."""
+    return file_name[:-len('.spec.yaml')].rsplit('-', 1)[-1]
+
+
+def generate_package_index(cache_prefix, incremental=False, concurrency=32):
     """Create the build cache index page.
 
     Creates (or replaces) the "index.json" page at the location given in
     cache_prefix.  This page contains a link for each binary package (.yaml)
     under cache_prefix.
+
+    Next to the index, "index.json.stamps" records a stamp of each spec
+    file (see ``web_util.list_url_stamps``).  With ``incremental``, the
+    existing index is read and updated: only the spec files that are new or
+    whose stamp changed since the index was written are fetched, and the
+    specs whose spec files were removed from the cache are dropped.  A spec
+    pushed again with ``-f`` keeps its DAG hash, but its spec file is
+    fetched again for the new full hash.  Without an existing index or
+    stamps, all the spec files are fetched.
+
+    Args:
+        cache_prefix (str): URL of the build cache
+        incremental (bool): update the existing index instead of
+            regenerating it from every spec file
+        concurrency (int): number of spec files fetched at the same time
+
+    Returns:
+        A tuple with the number of specs added to, updated in and removed
+        from the index
     """
     tmpdir = tempfile.mkdtemp()
     db_root_dir = os.path.join(tmpdir, 'db_root')
     db = spack_db.Database(None, db_dir=db_root_dir,
                            enable_transaction_locking=False,
                            record_fields=['spec', 'ref_count'])
+    index_json_path = os.path.join(db_root_dir, 'index.json')
+    index_stamps_path = os.path.join(db_root_dir, 'index.json.stamps')
 
-    file_list = (
-        entry
-        for entry in web_util.list_url(cache_prefix)
-        if entry.endswith('.yaml'))
+    try:
+        stamps = dict(
+            (entry, stamp)
+            for entry, stamp in web_util.list_url_stamps(cache_prefix).items()
+            if entry.endswith('.yaml'))
+        file_list = sorted(stamps)
+
+        indexed_stamps = {}
+        if incremental:
+            index_url = url_util.join(cache_prefix, 'index.json')
+            stamps_url = url_util.join(cache_prefix, 'index.json.stamps')
+            try:
+                _, _, index_file = web_util.read_from_url(index_url)
+                with open(index_json_path, 'w') as f:
+                    f.write(codecs.getreader('utf-8')(index_file).read())
+                db._read_from_file(index_json_path)
+                _, _, stamps_file = web_util.read_from_url(stamps_url)
+                indexed_stamps = sjson.load(
+                    codecs.getreader('utf-8')(stamps_file).read())
+            except (URLError, web_util.SpackWebError) as url_err:
+                tty.warn('Cannot read the index of {0} or its stamps, '
+                         'fetching every spec file'.format(cache_prefix))
+                tty.debug(url_err)
 
-    tty.debug('Retrieving spec.yaml files from {0} to build index'.format(
-        cache_prefix))
-    for file_path in file_list:
-        try:
-            yaml_url = url_util.join(cache_prefix, file_path)
-            tty.debug('fetching {0}'.format(yaml_url))
-            _, _, yaml_file = web_util.read_from_url(yaml_url)
-            yaml_contents = codecs.getreader('utf-8')(yaml_file).read()
-            # yaml_obj = syaml.load(yaml_contents)
-            # s = Spec.from_yaml(yaml_obj)
-            s = Spec.from_yaml(yaml_contents)
-            db.add(s, None)
-        except (URLError, web_util.SpackWebError) as url_err:
-            tty.error('Error reading spec.yaml: {0}'.format(file_path))
-            tty.error(url_err)
+        indexed = set(db._data)
+        present = set(_dag_hash_from_file_name(f) for f in file_list)
+        new_files = [f for f in file_list
+                     if _dag_hash_from_file_name(f) not in indexed or
+                     indexed_stamps.get(f) != stamps[f]]
+        stale = [db._data[h].spec for h in indexed if h not in present]
+
+        # The installed flag is not part of the index. Set it on the specs
+        # with a spec file, so that only dependencies without a spec file
+        # are removed along with their last dependent.
+        for h in indexed:
+            db._data[h].installed = h in present
+        for spec in stale:
+            if spec.dag_hash() in db._data:
+                db._remove(spec)
+        removed = len(indexed) - len(db._data)
+
+        tty.debug('Retrieving {0} spec.yaml files from {1} to build '
+                  'index'.format(len(new_files), cache_prefix))
+        urls = [url_util.join(cache_prefix, f) for f in new_files]
+        added = updated = 0
+        if urls:
+            pool = multiprocessing.pool.ThreadPool(
+                processes=max(1, min(concurrency, len(urls))))
+            try:
+                # Spec files are fetched concurrently, but parsed and added
+                # in the order of the listing
+                for f, yaml_contents in zip(
+                        new_files,
+                        pool.imap(_read_spec_yaml_from_url, urls)):
+                    if yaml_contents is None:
+                        # Fetch it again next time
+                        del stamps[f]
+                        continue
+                    spec = Spec.from_yaml(yaml_contents)
+                    if spec.dag_hash() not in indexed:
+                        db._add(spec, None)
+                        added += 1
+                        continue
+                    # Pushed again: the DAG hash, and so the dependencies,
+                    # are the same
+                    indexed_spec = db._data[spec.dag_hash()].spec
+                    if spec._full_hash != indexed_spec._full_hash:
+                        indexed_spec._full_hash = spec._full_hash
+                        indexed_spec._build_hash = spec._build_hash
+                        updated += 1
+            finally:
+                pool.terminate()
+                pool.join()
 
-    try:
-        index_json_path = os.path.join(db_root_dir, 'index.json')
         with open(index_json_path, 'w') as f:
             db._write_to_file(f)
 
@@ -747,9 +1002,20 @@ def generate_package_index(cache_prefix):
             url_util.join(cache_prefix, 'index.json.hash'),
             keep_original=False,
             extra_args={'ContentType': 'text/plain'})
+
+        # Push the stamps of the spec files in the index
+        with open(index_stamps_path, 'w') as f:
+            sjson.dump(stamps, f)
+        web_util.push_to_url(
+            index_stamps_path,
+            url_util.join(cache_prefix, 'index.json.stamps'),
+            keep_original=False,
+            extra_args={'ContentType': 'application/json'})
     finally:
         shutil.rmtree(tmpdir)
 
+    return added, updated, removed
+
 
 def generate_key_index(key_prefix, tmpdir=None):
     """Create the key index page.
@@ -799,11 +1065,154 @@ def generate_key_index(key_prefix, tmpdir=None):
                 shutil.rmtree(tmpdir)
 
 
+class _ChecksumWriter(object):
+    """Write-only file object computing the size and the sha256 checksum of
+    the data written through it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        self.fileobj.write(data)
+
+
+def _relocatable_copies(spec, buildinfo, workdir, rel, allow_root):
+    """
+    Check that the binaries in the prefix of a spec are relocatable.
+
+    With ``rel``, the binaries are copied to workdir to make their paths
+    relative, and the relative targets of the absolute links are computed.
+    Return the copies and the link targets, keyed by path in the prefix.
+    """
+    prefix = str(spec.prefix)
+    orig_path_names = [os.path.join(prefix, filename)
+                       for filename in buildinfo['relocate_binaries']]
+    if not rel:
+        relocate.raise_if_not_relocatable(orig_path_names, allow_root)
+        return {}, {}
+
+    cur_path_names = [os.path.join(workdir, filename)
+                      for filename in buildinfo['relocate_binaries']]
+    for orig_path, cur_path in zip(orig_path_names, cur_path_names):
+        mkdirp(os.path.dirname(cur_path))
+        shutil.copy2(orig_path, cur_path)
+
+    old_layout_root = buildinfo['buildpath']
+    platform = spack.architecture.get_platform(spec.platform)
+    if 'macho' in platform.binary_formats:
+        relocate.make_macho_binaries_relative(
+            cur_path_names, orig_path_names, old_layout_root)
+
+    if 'elf' in platform.binary_formats:
+        relocate.make_elf_binaries_relative(
+            cur_path_names, orig_path_names, old_layout_root)
+
+    relocate.raise_if_not_relocatable(cur_path_names, allow_root)
+
+    links = {}
+    for linkname in buildinfo.get('relocate_links', []):
+        orig_link = os.path.join(prefix, linkname)
+        target = os.readlink(orig_link)
+        links[orig_link] = os.path.relpath(target, os.path.dirname(orig_link))
+
+    return dict(zip(orig_path_names, cur_path_names)), links
+
+
+def _add_to_tarball(tar, path, arcname, substitutes, links, exclude):
+    """
+    Recursively add path to tar like ``TarFile.add``, reading the content of
+    the files in substitutes from their copy and rewriting the targets of
+    the symbolic links in links.
+    """
+    tarinfo = tar.gettarinfo(path, arcname)
+    if tarinfo is None:
+        tty.warn('Unsupported file type %s not added to tarball' % path)
+    elif tarinfo.isreg():
+        source = substitutes.get(path, path)
+        if source != path:
+            tarinfo.size = os.path.getsize(source)
+        with open(source, 'rb') as f:
+            tar.addfile(tarinfo, f)
+    elif tarinfo.isdir():
+        tar.addfile(tarinfo)
+        for name in sorted(os.listdir(path)):
+            child = os.path.join(path, name)
+            if child not in exclude:
+                _add_to_tarball(tar, child, os.path.join(arcname, name),
+                                substitutes, links, exclude)
+    else:
+        if tarinfo.issym() and path in links:
+            tarinfo.linkname = links[path]
+        tar.addfile(tarinfo)
+
+
+def _write_prefix_tarball(spackfile, tarfile_name, spec, buildinfo,
+                          substitutes, links, jobs=None):
+    """
+    Write the gzip compressed tarball of the prefix of a spec as the first
+    member of the .spack archive open in spackfile, in a single pass over
+    the prefix.
+
+    Return the sha256 checksum of the tarball.
+    """
+    if jobs is None:
+        jobs = config.get('config:build_jobs', 16)
+    jobs = min(jobs, multiprocessing.cpu_count())
+
+    # Reserve room for the header of the member, whose size is not known
+    # before the tarball is compressed
+    member = tarfile.TarInfo(tarfile_name)
+    member.mode = 0o644
+    member.mtime = int(time.time())
+    header_size = len(member.tobuf(tarfile.GNU_FORMAT))
+    spackfile.write(b'\0' * header_size)
+
+    prefix = str(spec.prefix)
+    buildinfo_path = buildinfo_file_name(prefix)
+    buildinfo_data = syaml.dump(
+        buildinfo, default_flow_style=True).encode('utf-8')
+
+    writer = _ChecksumWriter(spackfile)
+    with closing(ParallelGzipWriter(writer, jobs)) as gz:
+        with closing(tarfile.open(fileobj=gz, mode='w|')) as tar:
+            arcroot = os.path.basename(prefix)
+            _add_to_tarball(tar, prefix, arcroot, substitutes, links,
+                            exclude=[buildinfo_path])
+
+            # add the buildinfo file, which is not in the prefix
+            info = tarfile.TarInfo(os.path.join(
+                arcroot, os.path.relpath(buildinfo_path, prefix)))
+            info.size = len(buildinfo_data)
+            info.mode = 0o644
+            info.mtime = member.mtime
+            tar.addfile(info, io.BytesIO(buildinfo_data))
+
+    # Pad the member to a full tar block and write its header
+    remainder = writer.size % tarfile.BLOCKSIZE
+    if remainder:
+        spackfile.write(b'\0' * (tarfile.BLOCKSIZE - remainder))
+    member.size = writer.size
+    spackfile.seek(0)
+    spackfile.write(member.tobuf(tarfile.GNU_FORMAT))
+    spackfile.seek(0, os.SEEK_END)
+
+    return writer.hasher.hexdigest()
+
+
 def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
-                  allow_root=False, key=None, regenerate_index=False):
+                  allow_root=False, key=None, regenerate_index=False,
+                  jobs=None):
     """
     Build a tarball from given spec and put it into the directory structure
     used at the mirror (following <tarball_directory_name>).
+
+    The install prefix is read only once: it is compressed by ``jobs``
+    threads (``build_jobs`` from the configuration by default) while it is
+    written in the .spack archive.
     """
     if not spec.concrete:
         raise ValueError('spec must be concrete to build tarball')
@@ -814,7 +1223,6 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
 
     tarfile_name = tarball_name(spec, '.tar.gz')
     tarfile_dir = os.path.join(cache_prefix, tarball_directory_name(spec))
-    tarfile_path = os.path.join(tarfile_dir, tarfile_name)
     spackfile_path = os.path.join(
         cache_prefix, tarball_path_name(spec, '.spack'))
 
@@ -845,93 +1253,71 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
         else:
             raise NoOverwriteException(url_util.format(remote_specfile_path))
 
-    # make a copy of the install directory to work with
+    # Rewrite the paths in copies of the binaries only: everything else is
+    # read straight from the prefix while it is written to the tarball
+    buildinfo = get_buildinfo(spec, rel)
     workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
-    # install_tree copies hardlinks
-    # create a temporary tarfile from prefix and exract it to workdir
-    # tarfile preserves hardlinks
-    temp_tarfile_name = tarball_name(spec, '.tar')
-    temp_tarfile_path = os.path.join(tarfile_dir, temp_tarfile_name)
-    with closing(tarfile.open(temp_tarfile_path, 'w')) as tar:
-        tar.add(name='%s' % spec.prefix,
-                arcname='.')
-    with closing(tarfile.open(temp_tarfile_path, 'r')) as tar:
-        tar.extractall(workdir)
-    os.remove(temp_tarfile_path)
-
-    # create info for later relocation and create tar
-    write_buildinfo_file(spec, workdir, rel)
-
-    # optionally make the paths in the binaries relative to each other
-    # in the spack install tree before creating tarball
-    if rel:
-        try:
-            make_package_relative(workdir, spec, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            shutil.rmtree(tmpdir)
-            tty.die(e)
-    else:
-        try:
-            check_package_relocatable(workdir, spec, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            shutil.rmtree(tmpdir)
-            tty.die(e)
-
-    # create gzip compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
-    # remove copy of install directory
-    shutil.rmtree(workdir)
-
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
-
-    # add sha256 checksum to spec.yaml
-    with open(spec_file, 'r') as inputfile:
-        content = inputfile.read()
-        spec_dict = yaml.load(content)
-    bchecksum = {}
-    bchecksum['hash_algorithm'] = 'sha256'
-    bchecksum['hash'] = checksum
-    spec_dict['binary_cache_checksum'] = bchecksum
-    # Add original install prefix relative to layout root to spec.yaml.
-    # This will be used to determine is the directory layout has changed.
-    buildinfo = {}
-    buildinfo['relative_prefix'] = os.path.relpath(
-        spec.prefix, spack.store.layout.root)
-    buildinfo['relative_rpaths'] = rel
-    spec_dict['buildinfo'] = buildinfo
-
-    with open(specfile_path, 'w') as outfile:
-        outfile.write(syaml.dump(spec_dict))
-
-    # sign the tarball and spec file with gpg
-    if not unsigned:
-        key = select_signing_key(key)
-        sign_tarball(key, force, specfile_path)
+    try:
+        substitutes, links = _relocatable_copies(
+            spec, buildinfo, workdir, rel, allow_root)
+    except Exception as e:
+        shutil.rmtree(tmpdir)
+        tty.die(e)
 
-    # put tarball, spec and signature files in .spack archive
-    with closing(tarfile.open(spackfile_path, 'w')) as tar:
-        tar.add(name=tarfile_path, arcname='%s' % tarfile_name)
-        tar.add(name=specfile_path, arcname='%s' % specfile_name)
+    # Remove the temporary directory on errors, including the .spack
+    # archive being written in it
+    try:
+        # write the gzip compressed tarball of the install prefix directly
+        # in the .spack archive
+        with open(spackfile_path, 'wb') as spackfile:
+            checksum = _write_prefix_tarball(
+                spackfile, tarfile_name, spec, buildinfo, substitutes, links,
+                jobs)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+        # add sha256 checksum to spec.yaml
+        with open(spec_file, 'r') as inputfile:
+            content = inputfile.read()
+            spec_dict = yaml.load(content)
+        bchecksum = {}
+        bchecksum['hash_algorithm'] = 'sha256'
+        bchecksum['hash'] = checksum
+        spec_dict['binary_cache_checksum'] = bchecksum
+        # Add original install prefix relative to layout root to spec.yaml.
+        # This will be used to determine is the directory layout has changed.
+        buildinfo = {}
+        buildinfo['relative_prefix'] = os.path.relpath(
+            spec.prefix, spack.store.layout.root)
+        buildinfo['relative_rpaths'] = rel
+        spec_dict['buildinfo'] = buildinfo
+
+        with open(specfile_path, 'w') as outfile:
+            outfile.write(syaml.dump(spec_dict))
+
+        # sign the tarball and spec file with gpg
         if not unsigned:
-            tar.add(name='%s.asc' % specfile_path,
-                    arcname='%s.asc' % specfile_name)
-
-    # cleanup file moved to archive
-    os.remove(tarfile_path)
-    if not unsigned:
-        os.remove('%s.asc' % specfile_path)
+            key = select_signing_key(key)
+            sign_tarball(key, force, specfile_path)
+
+        # add spec and signature files to the .spack archive
+        with open(spackfile_path, 'ab') as spackfile:
+            with closing(tarfile.open(fileobj=spackfile, mode='w')) as tar:
+                tar.add(name=specfile_path, arcname='%s' % specfile_name)
+                if not unsigned:
+                    tar.add(name='%s.asc' % specfile_path,
+                            arcname='%s.asc' % specfile_name)
+
+        # cleanup file moved to archive
+        if not unsigned:
+            os.remove('%s.asc' % specfile_path)
 
-    web_util.push_to_url(
-        spackfile_path, remote_spackfile_path, keep_original=False)
-    web_util.push_to_url(
-        specfile_path, remote_specfile_path, keep_original=False)
+        web_util.push_to_url(
+            spackfile_path, remote_spackfile_path, keep_original=False)
+        web_util.push_to_url(
+            specfile_path, remote_specfile_path, keep_original=False)
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
 
     tty.debug('Buildcache for "{0}" written to \n {1}'
               .format(spec, remote_spackfile_path))
@@ -956,7 +1342,7 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     return None
 
 
-def download_tarball(spec, preferred_mirrors=None):
+def download_tarball(spec, preferred_mirrors=None, path=None):
     """
     Download binary tarball for given package into stage area, returning
     path to downloaded tarball if successful, None otherwise.
@@ -966,6 +1352,8 @@ def download_tarball(spec, preferred_mirrors=None):
         preferred_mirrors (list): If provided, this is a list of preferred
         mirror urls.  Other configured mirrors will only be used if the
         tarball can't be retrieved from one of these.
+        path (str): directory to download the tarball to, instead of the
+            ``build_cache`` stage
 
     Returns:
         Path to the downloaded tarball, or ``None`` if the tarball could not
@@ -991,7 +1379,7 @@ def download_tarball(spec, preferred_mirrors=None):
 
     for try_url in urls_to_try:
         # stage the tarball into standard place
-        stage = Stage(try_url, name="build_cache", keep=True)
+        stage = Stage(try_url, name="build_cache", keep=True, path=path)
         stage.create()
         try:
             stage.fetch()
@@ -1163,18 +1551,24 @@ def is_backup_file(file):
                                    prefix_to_prefix)
 
 
-def extract_tarball(spec, filename, allow_root=False, unsigned=False,
-                    force=False):
+def verify_tarball(spec, filename, unsigned=False, tmp_root=None):
     """
-    extract binary tarball for given package into install area
-    """
-    if os.path.exists(spec.prefix):
-        if force:
-            shutil.rmtree(spec.prefix)
-        else:
-            raise NoOverwriteException(str(spec.prefix))
+    Unpack the downloaded binary package of the spec in a temporary directory
+    and check its signature and checksum.
 
-    tmpdir = tempfile.mkdtemp()
+    Args:
+        spec (Spec): the spec of the binary package
+        filename (str): path to the downloaded binary package
+        unsigned (bool): ``True`` to skip the signature check
+        tmp_root (str): directory to create the temporary directory in,
+            instead of the default one
+
+    Returns:
+        (tuple) the temporary directory, the path of the tarball of the
+            install prefix in it, and the build information recorded in the
+            spec file
+    """
+    tmpdir = tempfile.mkdtemp(dir=tmp_root)
     stagepath = os.path.dirname(filename)
     spackfile_name = tarball_name(spec, '.spack')
     spackfile_path = os.path.join(stagepath, spackfile_name)
@@ -1221,10 +1615,32 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
             "Package tarball failed checksum verification.\n"
             "It cannot be installed.")
 
+    return tmpdir, tarfile_path, spec_dict.get('buildinfo', {})
+
+
+def extract_tarball(spec, filename, allow_root=False, unsigned=False,
+                    force=False, verified=None):
+    """
+    extract binary tarball for given package into install area
+
+    The binary package is verified first, unless ``verified`` holds the
+    result of ``verify_tarball()`` for it.
+    """
+    if os.path.exists(spec.prefix):
+        if force:
+            shutil.rmtree(spec.prefix)
+        else:
+            if verified:
+                shutil.rmtree(verified[0])
+            raise NoOverwriteException(str(spec.prefix))
+
+    tmpdir, tarfile_path, buildinfo = \
+        verified or verify_tarball(spec, filename, unsigned)
+    specfile_path = os.path.join(tmpdir, tarball_name(spec, '.spec.yaml'))
+
     new_relative_prefix = str(os.path.relpath(spec.prefix,
                                               spack.store.layout.root))
     # if the original relative prefix is in the spec file use it
-    buildinfo = spec_dict.get('buildinfo', {})
     old_relative_prefix = buildinfo.get('relative_prefix', new_relative_prefix)
     rel = buildinfo.get('relative_rpaths')
     # if the original relative prefix and new relative prefix differ the
@@ -1577,6 +1993,65 @@ def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
     return rebuild
 
 
+def specs_needing_rebuild(specs, mirror_url, rebuild_on_errors=False,
+                          concurrency=32):
+    """Check which of the given concrete specs need to be rebuilt for a
+    mirror, as ``needs_rebuild`` does for a single spec.
+
+    The full hashes of all the specs are first looked up in the index of the
+    mirror.  The specs missing from the index, or with a different full hash
+    in it, are checked against their spec.yaml files on the mirror, as the
+    index may be older than the spec files.  Those are fetched concurrently.
+
+    Arguments:
+        specs (iterable): concrete specs to check
+        mirror_url (str): url of the mirror to check the specs against
+        rebuild_on_errors (bool): treat any errors encountered while checking
+            a spec as a signal to rebuild it
+        concurrency (int): number of spec.yaml files fetched at the same time
+
+    Returns:
+        A dictionary mapping the DAG hash of each spec to True if it needs to
+            be rebuilt, False otherwise
+    """
+    specs = list(specs)
+    for spec in specs:
+        if not spec.concrete:
+            raise ValueError('spec must be concrete to check against mirror')
+
+    indexed_full_hashes = binary_index.full_hashes(mirror_url) or {}
+
+    rebuilds = {}
+    misses = []
+    for spec in specs:
+        dag_hash = spec.dag_hash()
+        if dag_hash in rebuilds:
+            continue
+        if indexed_full_hashes.get(dag_hash) == spec.full_hash():
+            rebuilds[dag_hash] = False
+        else:
+            rebuilds[dag_hash] = None
+            misses.append(spec)
+
+    tty.debug('{0} of {1} specs found in the index of {2}'.format(
+        len(rebuilds) - len(misses), len(rebuilds), mirror_url))
+
+    if misses:
+        def check(spec):
+            return needs_rebuild(spec, mirror_url, rebuild_on_errors)
+
+        pool = multiprocessing.pool.ThreadPool(
+            processes=max(1, min(concurrency, len(misses))))
+        try:
+            for spec, rebuild in zip(misses, pool.map(check, misses)):
+                rebuilds[spec.dag_hash()] = rebuild
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return rebuilds
+
+
 def check_specs_against_mirrors(mirrors, specs, output_file=None,
                                 rebuild_on_errors=False):
     """Check all the given specs against buildcaches on the given mirrors and
@@ -1602,8 +2077,10 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
 
         rebuild_list = []
 
+        rebuild_map = specs_needing_rebuild(
+            specs, mirror.fetch_url, rebuild_on_errors)
         for spec in specs:
-            if needs_rebuild(spec, mirror.fetch_url, rebuild_on_errors):
+            if rebuild_map[spec.dag_hash()]:
                 rebuild_list.append({
                     'short_spec': spec.short_spec,
                     'hash': spec.dag_hash()
@@ -38,6 +38,7 @@
 import os
 import shutil
 import sys
+import time
 import traceback
 import types
 from six import StringIO
@@ -715,6 +716,7 @@ def load_external_modules(pkg):
 
 def setup_package(pkg, dirty):
     """Execute all environment setup routines."""
+    start = time.time()
     build_env = EnvironmentModifications()
 
     if not dirty:
@@ -773,6 +775,10 @@ def setup_package(pkg, dirty):
     validate(build_env, tty.warn)
     build_env.apply_modifications()
 
+    pkg._setup_time = time.time() - start
+    tty.debug('Set up the build environment of {0} in {1:.2f}s'
+              .format(pkg.spec.name, pkg._setup_time))
+
 
 def modifications_from_dependencies(spec, context):
     """Returns the environment modifications that are required by
@@ -806,7 +812,7 @@ def modifications_from_dependencies(spec, context):
 
 
 def _setup_pkg_and_run(serialized_pkg, function, kwargs, child_pipe,
-                       input_multiprocess_fd):
+                       input_multiprocess_fd, setup=True):
 
     try:
         # We are in the child process. Python sets sys.stdin to
@@ -819,7 +825,7 @@ def _setup_pkg_and_run(serialized_pkg, function, kwargs, child_pipe,
 
         pkg = serialized_pkg.restore()
 
-        if not kwargs.get('fake', False):
+        if setup and not kwargs.get('fake', False):
             kwargs['unmodified_env'] = os.environ.copy()
             setup_package(pkg, dirty=kwargs.get('dirty', False))
         return_value = function(pkg, kwargs)
@@ -906,6 +912,33 @@ def child_fun():
     For more information on `multiprocessing` child process creation
     mechanisms, see https://docs.python.org/3/library/multiprocessing.html#contexts-and-start-methods
     """
+    return spawn_build_process(pkg, function, kwargs).complete()
+
+
+def spawn_build_process(pkg, function, kwargs, forward_stdin=True,
+                        setup=True):
+    """Start a child process to do part of a spack build without waiting.
+
+    This is the non-blocking half of ``start_build_process()``: the child
+    is created in the same way, but control returns to the caller right
+    away so several builds can run side by side.
+
+    Args:
+        pkg (PackageBase): package whose environment we should set up the
+            child process for.
+        function (callable): function to run in the child process.
+        kwargs (dict): arguments passed on to ``function``.
+        forward_stdin (bool): If True, forward the parent's terminal to the
+            child so that verbosity can be toggled interactively.  Only one
+            child can sensibly own the terminal at a time.
+        setup (bool): If False, run ``function`` without setting up the
+            build environment of the package, for work that does not
+            build anything.
+
+    Returns:
+        (BuildProcess): handle used to wait for the child and collect its
+            result.
+    """
     parent_pipe, child_pipe = multiprocessing.Pipe()
     input_multiprocess_fd = None
 
@@ -913,14 +946,15 @@ def child_fun():
 
     try:
         # Forward sys.stdin when appropriate, to allow toggling verbosity
-        if sys.stdin.isatty() and hasattr(sys.stdin, 'fileno'):
+        if forward_stdin and sys.stdin.isatty() and \
+                hasattr(sys.stdin, 'fileno'):
             input_fd = os.dup(sys.stdin.fileno())
             input_multiprocess_fd = MultiProcessFd(input_fd)
 
         p = multiprocessing.Process(
             target=_setup_pkg_and_run,
             args=(serialized_pkg, function, kwargs, child_pipe,
-                  input_multiprocess_fd))
+                  input_multiprocess_fd, setup))
         p.start()
 
     except InstallError as e:
@@ -928,31 +962,71 @@ def child_fun():
         raise
 
     finally:
-        # Close the input stream in the parent process
+        # Close the input stream and the child's end of the pipe in the
+        # parent process, so that the pipe reports EOF if the child dies
+        # without sending a result
         if input_multiprocess_fd is not None:
             input_multiprocess_fd.close()
+        child_pipe.close()
+
+    return BuildProcess(pkg, p, parent_pipe)
 
-    child_result = parent_pipe.recv()
-    p.join()
 
-    # If returns a StopPhase, raise it
-    if isinstance(child_result, StopPhase):
-        # do not print
-        raise child_result
+class BuildProcess(object):
+    """A child build process created by ``spawn_build_process()``."""
 
-    # let the caller know which package went wrong.
-    if isinstance(child_result, InstallError):
-        child_result.pkg = pkg
+    def __init__(self, pkg, process, pipe):
+        self.pkg = pkg
+        self.process = process
+        self.pipe = pipe
 
-    if isinstance(child_result, ChildError):
-        # If the child process raised an error, print its output here rather
-        # than waiting until the call to SpackError.die() in main(). This
-        # allows exception handling output to be logged from within Spack.
-        # see spack.main.SpackCommand.
-        child_result.print_context()
-        raise child_result
+    def fileno(self):
+        """File descriptor that becomes readable when the child is done,
+        so that handles can be passed directly to ``select.select()``."""
+        return self.pipe.fileno()
 
-    return child_result
+    def terminate(self):
+        """Stop the child process without collecting its result."""
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+    def complete(self):
+        """Wait for the child to finish and return its result.
+
+        Errors raised in the child are re-raised here, in the parent.
+        """
+        try:
+            child_result = self.pipe.recv()
+        except EOFError:
+            # The child exited without sending a result (e.g., it was
+            # killed by a signal)
+            self.process.join()
+            e = InstallError(
+                'Build process for {0} exited with code {1}'.format(
+                    self.pkg.name, self.process.exitcode))
+            e.pkg = self.pkg
+            raise e
+        self.process.join()
+
+        # If returns a StopPhase, raise it
+        if isinstance(child_result, StopPhase):
+            # do not print
+            raise child_result
+
+        # let the caller know which package went wrong.
+        if isinstance(child_result, InstallError):
+            child_result.pkg = self.pkg
+
+        if isinstance(child_result, ChildError):
+            # If the child process raised an error, print its output here
+            # rather than waiting until the call to SpackError.die() in
+            # main(). This allows exception handling output to be logged
+            # from within Spack. see spack.main.SpackCommand.
+            child_result.print_context()
+            raise child_result
+
+        return child_result
 
 
 def get_package_context(traceback, context=3):
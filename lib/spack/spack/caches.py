@@ -4,17 +4,22 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 """Caches used by Spack to store data"""
+import errno
 import os
+import threading
 
 import llnl.util.lang
+import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
 
 import spack.error
 import spack.paths
 import spack.config
 import spack.fetch_strategy
+import spack.util.crypto
 import spack.util.file_cache
 import spack.util.path
+import spack.util.spack_json as sjson
 
 
 def _misc_cache():
@@ -35,6 +40,117 @@ def _misc_cache():
 misc_cache = llnl.util.lang.Singleton(_misc_cache)
 
 
+class DetectionCache(object):
+    """Results of running executables to detect what they are (e.g. the
+    versions of compilers, or the external packages they belong to), stored
+    in a file of the misc cache, so that detecting them again only runs the
+    executables that are new or that changed since.
+
+    Each result is stored with the real path, size and modification time of
+    the files it was computed from, and is discarded if any of them changed.
+    Results are looked up with ``get`` and recorded with ``set``, and the
+    recorded results are written at once by ``save``.
+    """
+
+    def __init__(self, file_cache, name):
+        """
+        Args:
+            file_cache (spack.util.file_cache.FileCache): cache in which the
+                results are stored, or ``None`` not to store them
+            name (str): name of the kind of results in the cache
+        """
+        self.file_cache = file_cache
+        self.key = os.path.join('detection', name + '.json')
+
+        #: Number of results found in the cache, and of results recorded
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = None
+        self._updates = {}
+
+    @staticmethod
+    def stamp(paths):
+        """Real path, size and modification time of each file, or ``None``
+        if one of them cannot be found."""
+        stamp = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            stamp.append([os.path.realpath(path), st.st_size, st.st_mtime])
+        return stamp
+
+    def _read(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.file_cache and self.file_cache.init_entry(self.key):
+                try:
+                    with self.file_cache.read_transaction(self.key) as f:
+                        self._entries = sjson.load(f)
+                except ValueError:
+                    tty.debug('Ignoring corrupted detection cache '
+                              '{0}'.format(self.key))
+        return self._entries
+
+    def get(self, key, paths):
+        """Get the result stored for a key, if it is still valid.
+
+        Args:
+            key (str): what was detected, e.g. which probe was run on which
+                executable
+            paths (list): files the result was computed from
+
+        Returns:
+            A ``(found, result)`` tuple
+        """
+        if self.file_cache is None:
+            return False, None
+
+        entry = self._read().get(key)
+        stamp = self.stamp(paths)
+        if entry is None or stamp is None or entry['stamp'] != stamp:
+            return False, None
+
+        self.hits += 1
+        return True, entry['result']
+
+    def set(self, key, paths, result):
+        """Record the result computed for a key from some files. The result
+        must be serializable to JSON."""
+        stamp = self.file_cache and self.stamp(paths)
+        if not stamp:
+            return
+        self.misses += 1
+        self._updates[key] = {'stamp': stamp, 'result': result}
+
+    def save(self):
+        """Write the recorded results to the cache, along with the results
+        other processes stored in the meantime."""
+        if not self._updates:
+            return
+
+        self.file_cache.init_entry(self.key)
+        with self.file_cache.write_transaction(self.key) as (old, new):
+            entries = {}
+            if old:
+                try:
+                    entries = sjson.load(old)
+                except ValueError:
+                    pass
+            entries.update(self._updates)
+            sjson.dump(entries, new)
+
+        self._entries = entries
+        self._updates = {}
+
+
+def detection_cache(name):
+    """Cache of the results of detection of the given kind."""
+    return DetectionCache(misc_cache, name)
+
+
 def _fetch_cache():
     """Filesystem cache of downloaded archives.
 
@@ -54,6 +170,41 @@ def __init__(self, root, skip_unstable_versions):
         self.root = os.path.abspath(root)
         self.skip_unstable_versions = skip_unstable_versions
 
+        # Locks of the storage paths, so that threads adding specs with
+        # common resources to the mirror do not store them twice
+        self._path_locks = {}
+        self._path_locks_lock = threading.Lock()
+
+    def lock(self, relative_dest):
+        """Lock serializing the threads that store a target at the given
+        path of the mirror."""
+        with self._path_locks_lock:
+            if relative_dest not in self._path_locks:
+                self._path_locks[relative_dest] = threading.Lock()
+            return self._path_locks[relative_dest]
+
+    def contains(self, fetcher, relative_dest):
+        """Whether the fetcher's target is already stored in our mirror
+        cache.
+
+        Targets with a checksum must also match it, so that archives left
+        incomplete or corrupted by an interrupted run are stored again.
+        """
+        dst = os.path.join(self.root, relative_dest)
+        if not os.path.exists(dst):
+            return False
+
+        digest = getattr(fetcher, 'digest', None)
+        if digest and os.path.isfile(dst):
+            checker = spack.util.crypto.Checker(digest)
+            if not checker.check(dst):
+                tty.warn("Replacing {0} in the mirror".format(dst),
+                         "Expected {0} checksum {1} but got {2}".format(
+                             checker.hash_name, digest, checker.sum))
+                return False
+
+        return True
+
     def store(self, fetcher, relative_dest):
         """Fetch and relocate the fetcher's target into our mirror cache."""
 
@@ -80,7 +231,12 @@ def symlink(self, mirror_ref):
                 # to https://github.com/spack/spack/pull/13908)
                 os.unlink(cosmetic_path)
             mkdirp(os.path.dirname(cosmetic_path))
-            os.symlink(relative_dst, cosmetic_path)
+            try:
+                os.symlink(relative_dst, cosmetic_path)
+            except OSError as e:
+                # Another thread adding the same resource linked it first
+                if e.errno != errno.EEXIST:
+                    raise
 
 
 #: Spack's local cache for downloaded source archives
@@ -6,6 +6,8 @@
 import os
 import shutil
 import sys
+import time
+from multiprocessing.pool import ThreadPool
 
 import llnl.util.tty as tty
 import spack.architecture
@@ -83,6 +85,9 @@ def setup_parser(subparser):
                               ' its dependencies. Alternatively, one can'
                               ' decide to build a cache for only the package'
                               ' or only the dependencies'))
+    create.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of packages to create at once, and of "
+                             "threads compressing them (default: 1)")
     arguments.add_common_arguments(create, ['specs'])
     create.set_defaults(func=createtarball)
 
@@ -234,6 +239,10 @@ def setup_parser(subparser):
     update_index.add_argument(
         '-k', '--keys', default=False, action='store_true',
         help='If provided, key index will be updated as well as package index')
+    update_index.add_argument(
+        '-i', '--incremental', default=False, action='store_true',
+        help='Only fetch the spec files that are new or changed since the '
+             'index was written, and drop the specs whose files were removed')
     update_index.set_defaults(func=buildcache_update_index)
 
 
@@ -334,7 +343,8 @@ def match_downloaded_specs(pkgs, allow_multiple_matches=False, force=False,
 def _createtarball(env, spec_yaml=None, packages=None, add_spec=True,
                    add_deps=True, output_location=os.getcwd(),
                    signing_key=None, force=False, make_relative=False,
-                   unsigned=False, allow_root=False, rebuild_index=False):
+                   unsigned=False, allow_root=False, rebuild_index=False,
+                   jobs=None):
     if spec_yaml:
         with open(spec_yaml, 'r') as fd:
             yaml_text = fd.read()
@@ -408,14 +418,61 @@ def _createtarball(env, spec_yaml=None, packages=None, add_spec=True,
 
     tty.debug('writing tarballs to %s/build_cache' % outdir)
 
+    concurrent = min(jobs or 1, len(specs))
+    if concurrent <= 1:
+        for spec in specs:
+            _create_spec_tarball(
+                spec, outdir, force, make_relative, unsigned, allow_root,
+                signing_key, rebuild_index, jobs)
+        return
+
+    # Load the packages here, as the repository is not safe to use from
+    # several threads
     for spec in specs:
-        tty.debug('creating binary cache file for package %s ' % spec.format())
-        try:
-            bindist.build_tarball(spec, outdir, force, make_relative,
-                                  unsigned, allow_root, signing_key,
-                                  rebuild_index)
-        except bindist.NoOverwriteException as e:
-            tty.warn(e)
+        spec.package
+
+    # Package several specs at once, sharing the compression threads among
+    # them, and update the index only once all of them are in the mirror
+    pool = ThreadPool(concurrent)
+    try:
+        errors = pool.map(_create_spec_tarball_or_error, [
+            (spec, outdir, force, make_relative, unsigned, allow_root,
+             signing_key, False, max(1, jobs // concurrent))
+            for spec in specs])
+    finally:
+        pool.close()
+        pool.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+
+    if rebuild_index:
+        if not unsigned:
+            bindist.push_keys(
+                outdir, keys=[bindist.select_signing_key(signing_key)],
+                regenerate_index=True)
+        bindist.generate_package_index(
+            url_util.join(outdir, bindist.build_cache_relative_path()))
+
+
+def _create_spec_tarball(spec, outdir, force, make_relative, unsigned,
+                         allow_root, signing_key, rebuild_index, jobs):
+    tty.debug('creating binary cache file for package %s ' % spec.format())
+    try:
+        bindist.build_tarball(spec, outdir, force, make_relative,
+                              unsigned, allow_root, signing_key,
+                              rebuild_index, jobs)
+    except bindist.NoOverwriteException as e:
+        tty.warn(e)
+
+
+def _create_spec_tarball_or_error(args):
+    # tty.die exits with SystemExit, which would kill the pool's threads
+    try:
+        _create_spec_tarball(*args)
+    except BaseException as e:
+        return e
 
 
 def createtarball(args):
@@ -459,6 +516,12 @@ def createtarball(args):
         if scheme == '<missing>':
             raise ValueError(
                 '"{url}" is not a valid URL'.format(url=output_location))
+
+    if args.jobs < 1:
+        raise ValueError(
+            'invalid value for argument "--jobs" '
+            '[expected a positive integer, got "{0}"]'.format(args.jobs))
+
     add_spec = ('package' in args.things_to_install)
     add_deps = ('dependencies' in args.things_to_install)
 
@@ -467,7 +530,7 @@ def createtarball(args):
                    output_location=output_location, signing_key=args.key,
                    force=args.force, make_relative=args.rel,
                    unsigned=args.unsigned, allow_root=args.allow_root,
-                   rebuild_index=args.rebuild_index)
+                   rebuild_index=args.rebuild_index, jobs=args.jobs)
 
 
 def installtarball(args):
@@ -778,8 +841,13 @@ def buildcache_update_index(args):
     mirror = spack.mirror.MirrorCollection().lookup(outdir)
     outdir = url_util.format(mirror.push_url)
 
-    bindist.generate_package_index(
-        url_util.join(outdir, bindist.build_cache_relative_path()))
+    start = time.time()
+    added, updated, removed = bindist.generate_package_index(
+        url_util.join(outdir, bindist.build_cache_relative_path()),
+        incremental=args.incremental)
+    tty.msg('Updated the index of {0}: {1} specs added, {2} updated, {3} '
+            'removed [{4:.2f}s]'.format(outdir, added, updated, removed,
+                                        time.time() - start))
 
     if args.keys:
         keys_url = url_util.join(outdir,
@@ -10,6 +10,7 @@
 from six import iteritems
 
 import llnl.util.tty as tty
+import spack.compiler
 import spack.compilers
 import spack.config
 import spack.spec
@@ -62,6 +63,10 @@ def setup_parser(subparser):
     # Info
     info_parser = sp.add_parser('info', help='show compiler paths')
     info_parser.add_argument('compiler_spec')
+    info_parser.add_argument(
+        '--refresh', action='store_true',
+        help="forget the cached implicit link paths and real version of the "
+             "compilers, and run them again to find these")
     info_parser.add_argument(
         '--scope', choices=scopes, metavar=scopes_metavar,
         default=spack.config.default_list_scope(),
@@ -153,6 +158,10 @@ def compiler_info(args):
                     print("\t\t%s" % extra_rpath)
             print("\tmodules  = %s" % c.modules)
             print("\toperating system  = %s" % c.operating_system)
+            if args.refresh:
+                spack.compiler.info_cache.remove(c)
+                print("\treal version  = %s" % c.real_version)
+                print("\timplicit rpaths  = %s" % c.implicit_rpaths())
 
 
 def compiler_list(args):
@@ -5,6 +5,7 @@
 from __future__ import print_function
 
 import argparse
+import multiprocessing
 import os
 import re
 import sys
@@ -16,8 +17,13 @@
 import six
 import spack
 import spack.cmd
+import spack.caches
 import spack.error
+import spack.package
+import spack.repo
+import spack.spec
 import spack.util.environment
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 
 description = "manage external packages in Spack configuration"
@@ -236,6 +242,116 @@ def _update_pkg_config(scope, pkg_to_entries, not_buildable):
     return all_new_specs
 
 
+def _specs_to_dicts(specs):
+    """Detected specs in a form that can be cached and sent back by worker
+    processes, or ``None`` if they cannot be."""
+    dicts = []
+    for spec in specs:
+        if not isinstance(spec, spack.spec.Spec):
+            return None
+        d = {
+            'spec': str(spec),
+            'prefix': spec.external_path,
+            'modules': spec.external_modules,
+            'extra_attributes': spec.extra_attributes,
+        }
+        try:
+            sjson.dump(d)
+        except (TypeError, ValueError):
+            return None
+        dicts.append(d)
+    return dicts
+
+
+def _specs_from_dicts(dicts):
+    specs = []
+    for d in dicts:
+        spec = spack.spec.Spec(d['spec'], external_path=d['prefix'],
+                               external_modules=d['modules'])
+        if d['extra_attributes'] is not None:
+            spec = spack.spec.Spec.from_detection(
+                spec, extra_attributes=d['extra_attributes'])
+        specs.append(spec)
+    return specs
+
+
+def _detection_cache_entry(pkg, prefix, exes_in_prefix):
+    """Key and files of the specs detected in a prefix in the detection
+    cache. The package file is part of the files, so that specs are
+    detected again when the way to detect them changes."""
+    key = '{0}:{1}'.format(pkg.fullname, prefix)
+    pkg_files = [pkg.module.__file__, spack.package.__file__]
+    return key, sorted(exes_in_prefix) + pkg_files
+
+
+def _detect_in_prefix(args):
+    """Detect the specs of a package in a prefix, in a worker process."""
+    pkg_name, prefix, exes_in_prefix = args
+    pkg = spack.repo.get(pkg_name)
+    return _specs_to_dicts(_convert_to_iterable(
+        pkg.determine_spec_details(prefix, exes_in_prefix)))
+
+
+def _detect_specs(detectable):
+    """Detect the specs of packages in the prefixes of their executables.
+
+    Specs detected before from the same executables are taken from the
+    detection cache. The others are detected by a pool of worker processes
+    when they can be forked from this one, and in this process otherwise.
+
+    Args:
+        detectable (list): ``(package, executables)`` tuples
+
+    Returns:
+        A dictionary mapping ``(package full name, prefix)`` to the list of
+        specs detected in the prefix
+    """
+    cache = spack.caches.detection_cache('externals')
+    detected, to_detect = {}, []
+    for pkg, exes in detectable:
+        for prefix, exes_in_prefix in _group_by_prefix(exes):
+            found, dicts = cache.get(
+                *_detection_cache_entry(pkg, prefix, exes_in_prefix))
+            if found:
+                detected[(pkg.fullname, prefix)] = _specs_from_dicts(dicts)
+            else:
+                to_detect.append((pkg, prefix, exes_in_prefix))
+
+    results = [None] * len(to_detect)
+    get_start_method = getattr(
+        multiprocessing, 'get_start_method', lambda: 'fork')
+    if len(to_detect) > 1 and get_start_method() == 'fork':
+        pool = multiprocessing.Pool(
+            min(len(to_detect), multiprocessing.cpu_count()))
+        try:
+            results = pool.map(_detect_in_prefix, [
+                (pkg.fullname, prefix, exes_in_prefix)
+                for pkg, prefix, exes_in_prefix in to_detect
+            ])
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for (pkg, prefix, exes_in_prefix), dicts in zip(to_detect, results):
+        if dicts is None:
+            # Not detected by a worker, or not in a form we can cache
+            specs = _convert_to_iterable(
+                pkg.determine_spec_details(prefix, exes_in_prefix))
+            dicts = _specs_to_dicts(specs)
+        else:
+            specs = _specs_from_dicts(dicts)
+
+        if dicts is not None:
+            key, paths = _detection_cache_entry(pkg, prefix, exes_in_prefix)
+            cache.set(key, paths, dicts)
+        detected[(pkg.fullname, prefix)] = specs
+    cache.save()
+
+    tty.debug('Detected specs in {0} prefixes, {1} found in the detection '
+              'cache'.format(len(to_detect), cache.hits))
+    return detected
+
+
 def _get_external_packages(packages_to_check, system_path_to_exe=None):
     if not system_path_to_exe:
         system_path_to_exe = _get_system_executables()
@@ -257,13 +373,18 @@ def _get_external_packages(packages_to_check, system_path_to_exe=None):
     pkg_to_entries = defaultdict(list)
     resolved_specs = {}  # spec -> exe found for the spec
 
+    detectable = []
     for pkg, exes in pkg_to_found_exes.items():
         if not hasattr(pkg, 'determine_spec_details'):
             tty.warn("{0} must define 'determine_spec_details' in order"
                      " for Spack to detect externally-provided instances"
                      " of the package.".format(pkg.name))
             continue
+        detectable.append((pkg, exes))
+
+    detected = _detect_specs(detectable)
 
+    for pkg, exes in detectable:
         # TODO: iterate through this in a predetermined order (e.g. by package
         # name) to get repeatable results when there are conflicts. Note that
         # if we take the prefixes returned by _group_by_prefix, then consider
@@ -275,8 +396,7 @@ def _get_external_packages(packages_to_check, system_path_to_exe=None):
             # for one prefix, but without additional details (e.g. about the
             # naming scheme which differentiates them), the spec won't be
             # usable.
-            specs = _convert_to_iterable(
-                pkg.determine_spec_details(prefix, exes_in_prefix))
+            specs = detected[(pkg.fullname, prefix)]
 
             if not specs:
                 tty.debug(
@@ -8,6 +8,7 @@
 import spack.cmd
 import spack.cmd.common.arguments as arguments
 import spack.config
+import spack.installer
 import spack.repo
 
 description = "fetch archives for packages"
@@ -23,6 +24,9 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-D', '--dependencies', action='store_true',
         help="also fetch all dependencies")
+    subparser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help="fetch the sources of up to N packages at once")
     arguments.add_common_arguments(subparser, ['specs'])
 
 
@@ -34,6 +38,7 @@ def fetch(parser, args):
         spack.config.set('config:checksum', False, scope='command_line')
 
     specs = spack.cmd.parse_specs(args.specs, concretize=True)
+    packages = []
     for spec in specs:
         if args.missing or args.dependencies:
             for s in spec.traverse():
@@ -47,7 +52,24 @@ def fetch(parser, args):
                 if package.spec.external:
                     continue
 
-                package.do_fetch()
+                packages.append(package)
+
+        packages.append(spack.repo.get(spec))
 
-        package = spack.repo.get(spec)
-        package.do_fetch()
+    if args.jobs <= 1:
+        for package in packages:
+            package.do_fetch()
+        return
+
+    # Fetch in parallel, then, in order, the packages that need the user's
+    # confirmation to be fetched
+    prefetcher = spack.installer.SourcePrefetcher(args.jobs)
+    try:
+        for package in packages:
+            prefetcher.prefetch(package)
+
+        for package in packages:
+            if not prefetcher.wait(package):
+                package.do_fetch()
+    finally:
+        prefetcher.close()
@@ -15,7 +15,6 @@
 import spack.cmd.common.arguments as arguments
 import spack.repo
 import spack.spec
-import spack.fetch_strategy as fs
 
 
 description = 'get detailed information on a particular package'
@@ -54,6 +53,7 @@ def variant(s):
 
 
 class VariantFormatter(object):
+    """Formats the variants of a ``PackageMetadata`` record as a table."""
     def __init__(self, variants):
         self.variants = variants
         self.headers = ('Name [Default]', 'Allowed values', 'Description')
@@ -70,8 +70,8 @@ def __init__(self, variants):
         for k, v in variants.items():
             candidate_max_widths = (
                 len(fmt_name.format(k, self.default(v))),  # Name [Default]
-                len(v.allowed_values),  # Allowed values
-                len(v.description)  # Description
+                len(v['allowed_values']),  # Allowed values
+                len(v['description'])  # Description
             )
 
             self.column_widths = (
@@ -100,9 +100,9 @@ def __init__(self, variants):
         )
 
     def default(self, v):
-        s = 'on' if v.default is True else 'off'
-        if not isinstance(v.default, bool):
-            s = v.default
+        s = 'on' if v['default'] is True else 'off'
+        if not isinstance(v['default'], bool):
+            s = v['default']
         return s
 
     @property
@@ -119,10 +119,11 @@ def lines(self):
                     '{0} [{1}]'.format(k, self.default(v)),
                     width=self.column_widths[0]
                 )
-                allowed = v.allowed_values.replace('True, False', 'on, off')
+                allowed = v['allowed_values'].replace(
+                    'True, False', 'on, off')
                 allowed = textwrap.wrap(allowed, width=self.column_widths[1])
                 description = textwrap.wrap(
-                    v.description,
+                    v['description'],
                     width=self.column_widths[2]
                 )
                 for t in zip_longest(
@@ -132,7 +133,11 @@ def lines(self):
 
 
 def print_text_info(pkg):
-    """Print out a plain text description of a package."""
+    """Print out a plain text description of a package.
+
+    Args:
+        pkg (PackageMetadata): metadata record of the package
+    """
 
     header = section_title(
         '{0}:   '
@@ -141,7 +146,7 @@ def print_text_info(pkg):
 
     color.cprint('')
     color.cprint(section_title('Description:'))
-    if pkg.__doc__:
+    if pkg.doc:
         color.cprint(color.cescape(pkg.format_doc(indent=4)))
     else:
         color.cprint("    None")
@@ -155,7 +160,7 @@ def print_text_info(pkg):
 
     color.cprint('')
     color.cprint(section_title("Tags: "))
-    if hasattr(pkg, 'tags'):
+    if pkg.tags:
         tags = sorted(pkg.tags)
         colify(tags, indent=4)
     else:
@@ -181,7 +186,7 @@ def print_text_info(pkg):
         preferred = sorted(pkg.versions, key=key_fn).pop()
         url = ''
         if pkg.has_code:
-            url = fs.for_package_version(pkg, preferred)
+            url = pkg.fetcher(preferred)
 
         line = version('    {0}'.format(pad(preferred))) + color.cescape(url)
         color.cprint(line)
@@ -190,7 +195,7 @@ def print_text_info(pkg):
 
         for v in reversed(sorted(pkg.versions)):
             if pkg.has_code:
-                url = fs.for_package_version(pkg, v)
+                url = pkg.fetcher(v)
             line = version('    {0}'.format(pad(v))) + color.cescape(url)
             color.cprint(line)
 
@@ -201,7 +206,7 @@ def print_text_info(pkg):
     for line in formatter.lines:
         color.cprint(line)
 
-    if hasattr(pkg, 'phases') and pkg.phases:
+    if pkg.phases:
         color.cprint('')
         color.cprint(section_title('Installation Phases:'))
         phase_str = ''
@@ -220,9 +225,10 @@ def print_text_info(pkg):
 
     color.cprint('')
     color.cprint(section_title('Virtual Packages: '))
-    if pkg.provided:
+    provided = pkg.provided_specs
+    if provided:
         inverse_map = {}
-        for spec, whens in pkg.provided.items():
+        for spec, whens in provided.items():
             for when in whens:
                 if when not in inverse_map:
                     inverse_map[when] = set()
@@ -240,5 +246,5 @@ def print_text_info(pkg):
 
 
 def info(parser, args):
-    pkg = spack.repo.get(args.package)
+    pkg = spack.repo.path.get_pkg_metadata(args.package)
     print_text_info(pkg)
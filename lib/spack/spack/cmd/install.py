@@ -46,6 +46,9 @@ def update_kwargs_from_args(args, kwargs):
         'stop_at': args.until,
         'unsigned': args.unsigned,
         'full_hash_match': args.full_hash_match,
+        'concurrent_builds': args.concurrent_builds,
+        'fetch_jobs': args.fetch_jobs,
+        'workers': args.workers,
     })
 
     kwargs.update({
@@ -77,6 +80,19 @@ def setup_parser(subparser):
         '-u', '--until', type=str, dest='until', default=None,
         help="phase to stop after when installing (default None)")
     arguments.add_common_arguments(subparser, ['jobs'])
+    subparser.add_argument(
+        '--concurrent-builds', type=int, default=1, metavar='N',
+        help="build up to N packages at once (the -j budget is split "
+             "among them)")
+    subparser.add_argument(
+        '--fetch-jobs', type=int, default=1, metavar='N',
+        help="download the sources of up to N packages at once, ahead of "
+             "their builds")
+    subparser.add_argument(
+        '--workers', type=int, default=0, metavar='N',
+        help="share the builds with other `spack install --workers` "
+             "processes using the same install tree, running N of them on "
+             "this node")
     subparser.add_argument(
         '--overwrite', action='store_true',
         help="reinstall an existing spec, even if it has dependents")
@@ -85,9 +85,9 @@ def match(p, f):
                 if f.match(p):
                     return True
 
-                pkg = spack.repo.get(p)
-                if pkg.__doc__:
-                    return f.match(pkg.__doc__)
+                pkg = spack.repo.path.get_pkg_metadata(p, cached=True)
+                if pkg.doc:
+                    return f.match(pkg.doc)
                 return False
         else:
             def match(p, f):
@@ -134,7 +134,8 @@ def get_dependencies(pkg):
 @formatter
 def version_json(pkg_names, out):
     """Print all packages with their latest versions."""
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name, cached=True)
+            for name in pkg_names]
 
     out.write('[\n')
 
@@ -173,7 +174,9 @@ def html(pkg_names, out):
     """
 
     # Read in all packages
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name, cached=True)
+            for name in pkg_names]
+    known_names = set(pkg_names)
 
     # Start at 2 because the title of the page from Sphinx is id1.
     span_id = 2
@@ -245,7 +248,7 @@ def head(n, span_id, title, anchor=None):
                 out.write('<dt>%s Dependencies:</dt>\n' % deptype.capitalize())
                 out.write('<dd>\n')
                 out.write(', '.join(
-                    d if d not in pkg_names else
+                    d if d not in known_names else
                     '<a class="reference internal" href="#%s">%s</a>' % (d, d)
                     for d in deps))
                 out.write('\n')
@@ -61,6 +61,9 @@ def setup_parser(subparser):
     create_parser.add_argument(
         '-D', '--dependencies', action='store_true',
         help="also fetch all dependencies")
+    create_parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help="add up to N package versions to the mirror at once")
     create_parser.add_argument(
         '-n', '--versions-per-spec',
         help="the number of versions to fetch for each spec, choose 'all' to"
@@ -344,7 +347,7 @@ def mirror_create(args):
 
     # Actually do the work to create the mirror
     present, mirrored, error = spack.mirror.create(
-        directory, mirror_specs, args.skip_unstable_versions)
+        directory, mirror_specs, args.skip_unstable_versions, args.jobs)
     p, m, e = len(present), len(mirrored), len(error)
 
     verb = "updated" if existed else "created"
@@ -6,8 +6,10 @@
 from __future__ import print_function
 
 import os
+import time
 
 import llnl.util.tty as tty
+import spack.cmd.common.arguments as arguments
 import spack.config
 import spack.repo
 import spack.util.path
@@ -57,6 +59,10 @@ def setup_parser(subparser):
         default=spack.config.default_modify_scope(),
         help="configuration scope to modify")
 
+    # Index
+    index_parser = sp.add_parser('index', help=repo_index.__doc__)
+    arguments.add_common_arguments(index_parser, ['jobs'])
+
 
 def repo_create(args):
     """Create a new package repository."""
@@ -154,10 +160,20 @@ def repo_list(args):
         print(fmt % (repo.namespace, repo.root))
 
 
+def repo_index(args):
+    """Bring the package indexes of registered repositories up to date."""
+    for repo in spack.repo.path.repos:
+        start = time.time()
+        updated = repo.update_indexes(jobs=args.jobs)
+        tty.msg("Indexed %d packages in '%s' [%.2fs]"
+                % (len(updated), repo.namespace, time.time() - start))
+
+
 def repo(parser, args):
     action = {'create': repo_create,
               'list': repo_list,
               'add': repo_add,
               'remove': repo_remove,
-              'rm': repo_remove}
+              'rm': repo_remove,
+              'index': repo_index}
     action[args.repo_command](args)
@@ -29,7 +29,8 @@ def setup_parser(subparser):
 
 
 def versions(parser, args):
-    pkg = spack.repo.get(args.package)
+    # Safe versions don't need the package to be imported
+    pkg = spack.repo.path.get_pkg_metadata(args.package)
 
     if sys.stdout.isatty():
         tty.msg('Safe versions (already checksummed):')
@@ -49,6 +50,7 @@ def versions(parser, args):
     if sys.stdout.isatty():
         tty.msg('Remote versions (not yet checksummed):')
 
+    pkg = spack.repo.get(args.package)
     fetched_versions = pkg.fetch_remote_versions(args.concurrency)
     remote_versions = set(fetched_versions).difference(safe_versions)
 
@@ -4,24 +4,29 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import contextlib
+import hashlib
 import os
 import platform
 import re
 import itertools
+import json
 import shutil
 import tempfile
+import time
 
 import llnl.util.lang
 from llnl.util.filesystem import (
     path_contains_subdirectory, paths_containing_libs)
 import llnl.util.tty as tty
 
+import spack.caches
 import spack.error
 import spack.spec
 import spack.version
 import spack.architecture
 import spack.util.executable
 import spack.util.module_cmd
+import spack.util.spack_json as sjson
 import spack.compilers
 from spack.util.environment import filter_system_paths
 
@@ -183,6 +188,143 @@ def in_system_subdirectory(path):
     return any(path_contains_subdirectory(path, x) for x in system_dirs)
 
 
+class CompilerInfoCache(object):
+    """Results of running compilers to learn about them (their implicit link
+    paths and real version), stored in a file cache, so that every build
+    does not run its compiler again.
+
+    Entries are keyed on the class, spec, paths, flags, modules and
+    environment of the compiler, and on the inode, size and modification
+    time of its executables: updating a compiler in place invalidates its
+    entry.  Compilers whose executables cannot be found are never cached.
+    Entries can be removed with ``spack compiler info --refresh``, e.g.
+    when the modules of a compiler changed.
+    """
+
+    def __init__(self, file_cache):
+        """
+        Args:
+            file_cache (spack.util.file_cache.FileCache): cache in which the
+                entries are stored, or ``None`` not to store them
+        """
+        self.file_cache = file_cache
+
+        #: Seconds of compiler runs this process avoided thanks to the cache
+        self.time_saved = 0.0
+
+        # Entries read or written by this process, keyed on the cache file
+        self._entries = {}
+
+    def key(self, compiler):
+        """Name of the cache file of the compiler, or ``None`` if its
+        executables cannot be found."""
+        identity = {
+            'class': type(compiler).__name__,
+            'spec': str(compiler.spec),
+            'operating_system': str(compiler.operating_system),
+            'target': str(compiler.target),
+            'flags': sorted(compiler.flags.items()),
+            'modules': list(compiler.modules),
+            'environment': compiler.environment,
+            'executables': [],
+        }
+        for exe in (compiler.cc, compiler.cxx, compiler.f77, compiler.fc):
+            if not exe:
+                continue
+            path = exe
+            if not os.path.isabs(path):
+                path = spack.util.executable.which_string(path)
+            try:
+                st = os.stat(path)
+            except (OSError, TypeError):
+                return None
+            identity['executables'].append(
+                [exe, os.path.realpath(path),
+                 st.st_ino, st.st_size, st.st_mtime])
+
+        digest = hashlib.sha256(
+            json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join('compilers', digest + '.json')
+
+    def _lookup(self, key, name):
+        """Cached piece of information, as a dictionary with its ``value``
+        and the ``seconds`` it took to compute, or ``None``."""
+        entry = self._entries.get(key, {})
+        if name not in entry:
+            # Another process may have stored it since we last looked
+            entry = {}
+            if self.file_cache.init_entry(key):
+                try:
+                    with self.file_cache.read_transaction(key) as f:
+                        entry = sjson.load(f)
+                except ValueError:
+                    tty.debug('Ignoring corrupted compiler info cache '
+                              'entry {0}'.format(key))
+            self._entries[key] = entry
+        return entry.get(name)
+
+    def _write(self, key, name, value, seconds):
+        with self.file_cache.write_transaction(key) as (old, new):
+            entry = {}
+            if old:
+                try:
+                    entry = sjson.load(old)
+                except ValueError:
+                    pass
+            entry[name] = {'value': value, 'seconds': seconds}
+            sjson.dump(entry, new)
+        self._entries[key] = entry
+
+    def get(self, compiler, name, probe):
+        """Get a piece of information about a compiler, running ``probe()``
+        to get it, and storing its result, only if it is not cached.
+
+        Args:
+            compiler (Compiler): the compiler the information is about
+            name (str): name of the information in the cache entry
+            probe (function): function computing the information
+        """
+        key = self.file_cache and self.key(compiler)
+        if not key:
+            return probe()
+
+        cached = self._lookup(key, name)
+        if cached is not None:
+            self.time_saved += cached['seconds']
+            return cached['value']
+
+        start = time.time()
+        value = probe()
+        self._write(key, name, value, time.time() - start)
+        return value
+
+    def seconds(self, compiler, name):
+        """Time it took to compute a cached piece of information about a
+        compiler, or 0 if it is not cached."""
+        key = self.file_cache and self.key(compiler)
+        if not key:
+            return 0.0
+        cached = self._lookup(key, name)
+        return cached['seconds'] if cached else 0.0
+
+    def remove(self, compiler):
+        """Remove the cache entry of a compiler, if any."""
+        key = self.file_cache and self.key(compiler)
+        if not key:
+            return
+        self._entries.pop(key, None)
+        if self.file_cache.init_entry(key):
+            self.file_cache.remove(key)
+
+
+def _info_cache():
+    return CompilerInfoCache(spack.caches.misc_cache)
+
+
+#: Implicit link paths and real versions of compilers, in the misc cache
+info_cache = llnl.util.lang.Singleton(_info_cache)
+
+
 class Compiler(object):
     """This class encapsulates a Spack "compiler", which includes C,
        C++, and Fortran compilers.  Subclasses should implement
@@ -345,7 +487,8 @@ def real_version(self):
         if not self._real_version:
             try:
                 self._real_version = spack.version.Version(
-                    self.get_real_version())
+                    info_cache.get(self, 'real_version',
+                                   self.get_real_version))
             except spack.util.executable.ProcessError:
                 self._real_version = self.version
         return self._real_version
@@ -354,6 +497,10 @@ def implicit_rpaths(self):
         if self.enable_implicit_rpaths is False:
             return []
 
+        return info_cache.get(
+            self, 'implicit_rpaths', self._find_implicit_rpaths)
+
+    def _find_implicit_rpaths(self):
         # Put CXX first since it has the most linking issues
         # And because it has flags that affect linking
         exe_paths = [
@@ -8,8 +8,11 @@
 """
 import collections
 import itertools
+import multiprocessing
 import multiprocessing.pool
 import os
+import sys
+
 import six
 
 import llnl.util.lang
@@ -18,6 +21,7 @@
 import archspec.cpu
 
 import spack.paths
+import spack.caches
 import spack.error
 import spack.spec
 import spack.config
@@ -211,12 +215,34 @@ def find_compilers(path_hints=None):
         search_paths = getattr(o, 'compiler_search_paths', default_paths)
         arguments.extend(arguments_to_detect_version_fn(o, search_paths))
 
-    # Here we map the function arguments to the corresponding calls
-    tp = multiprocessing.pool.ThreadPool()
-    try:
-        detected_versions = tp.map(detect_version, arguments)
-    finally:
-        tp.close()
+    # Versions probed before from the same executables are taken from the
+    # cache, and only the remaining executables are run
+    cache = spack.caches.detection_cache('compiler-versions')
+    detected_versions = [None] * len(arguments)
+    to_probe = []
+    for i, args in enumerate(arguments):
+        entry = _detection_cache_entry(args)
+        found, version = cache.get(*entry) if entry else (False, None)
+        if found:
+            detected_versions[i] = _with_version(args, version), None
+        else:
+            to_probe.append(i)
+
+    probed = _probe_versions([arguments[i] for i in to_probe])
+    for i, (version, error) in zip(to_probe, probed):
+        args = arguments[i]
+        if error is None:
+            # Only successful probes are cached: failures may be transient
+            entry = _detection_cache_entry(args)
+            if entry:
+                cache.set(entry[0], entry[1], version)
+            detected_versions[i] = _with_version(args, version), None
+        else:
+            detected_versions[i] = None, error
+    cache.save()
+
+    tty.debug('Probed {0} candidate compilers, {1} found in the detection '
+              'cache'.format(len(to_probe), cache.hits))
 
     def valid_version(item):
         value, error = item
@@ -637,6 +663,71 @@ def _default(fn_args):
     return fn(detect_version_args)
 
 
+def _with_version(detect_version_args, version):
+    compiler_id = detect_version_args.id
+    return detect_version_args._replace(
+        id=compiler_id._replace(version=version))
+
+
+def _detection_cache_entry(detect_version_args):
+    """Key and files of the version of a compiler in the detection cache,
+    or ``None`` if its version cannot be cached.
+
+    Versions detected by operating systems with their own method (e.g.
+    from modules on Cray) are never cached. The module of the compiler
+    class is part of the files, so that versions are probed again when the
+    way to detect them changes.
+    """
+    compiler_id = detect_version_args.id
+    path = detect_version_args.path
+    if hasattr(compiler_id.os, 'detect_version') or not os.path.isabs(path):
+        return None
+
+    compiler_cls = class_for_compiler_name(compiler_id.compiler_name)
+    module_file = sys.modules[compiler_cls.__module__].__file__
+    key = '{0}:{1}:{2}'.format(
+        compiler_id.compiler_name, detect_version_args.language, path)
+    return key, [path, module_file]
+
+
+def _probe_version(detect_version_args):
+    """Version of a compiler and error, as returned by ``detect_version``,
+    in a form that worker processes can send back."""
+    value, error = detect_version(detect_version_args)
+    return (value.id.version if value else None), error
+
+
+def _probe_versions(arguments):
+    """Probe the versions of compilers concurrently.
+
+    Compilers are run by a pool of worker processes when they can be forked
+    from this one, so that probes are not serialized by the interpreter,
+    and by a pool of threads otherwise.
+
+    Returns:
+        A list of ``(version, error)`` tuples, in the order of the arguments
+    """
+    if not arguments:
+        return []
+
+    get_start_method = getattr(
+        multiprocessing, 'get_start_method', lambda: 'fork')
+    if len(arguments) > 1 and get_start_method() == 'fork':
+        pool = multiprocessing.Pool(
+            min(len(arguments), multiprocessing.cpu_count()))
+        try:
+            return pool.map(_probe_version, arguments)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    tp = multiprocessing.pool.ThreadPool()
+    try:
+        return tp.map(_probe_version, arguments)
+    finally:
+        tp.close()
+
+
 def make_compiler_list(detected_versions):
     """Process a list of detected versions and turn them into a list of
     compiler specs.
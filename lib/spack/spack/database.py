@@ -22,6 +22,8 @@
 
 import contextlib
 import datetime
+import functools
+import json
 import os
 import six
 import socket
@@ -90,6 +92,11 @@ def nullcontext(*args, **kwargs):
 # ensure a failed install is properly tracked).
 _pkg_lock_timeout = None
 
+# A journaled database is compacted into its index file once the journal
+# holds more changed records than the index has records, and at least this
+# many.
+_journal_min_length = 1000
+
 # Types of dependencies tracked by the database
 _tracked_deps = ('link', 'run')
 
@@ -195,6 +202,11 @@ def __init__(
         self.installation_time = installation_time or _now()
         self.deprecated_for = deprecated_for
 
+    @property
+    def name(self):
+        """Name of the package installed by this record."""
+        return self.spec.name
+
     def install_type_matches(self, installed):
         installed = InstallStatuses.canonicalize(installed)
         if self.installed:
@@ -229,7 +241,213 @@ def from_dict(cls, spec, dictionary):
         if 'installed' not in d:
             d['installed'] = False
 
-        return InstallRecord(spec, **d)
+        return cls(spec, **d)
+
+
+class _LazyInstallRecord(InstallRecord):
+    """An install record whose spec is only constructed from its node
+    dictionary the first time it is accessed.
+
+    Until then, the record keeps the node dictionary read from the
+    database file, and writes it back unchanged.
+    """
+    _spec = None
+    _node_dict = None
+    _read_spec = None
+
+    @classmethod
+    def from_dict(cls, read_spec, dictionary):
+        """Create a record from its dictionary in the database file.
+
+        Args:
+            read_spec (callable): called without arguments to construct
+                the spec of the record when first needed
+            dictionary (dict): install record read from the database
+        """
+        rec = super(_LazyInstallRecord, cls).from_dict(None, dictionary)
+        rec._node_dict = dictionary['spec']
+        rec._read_spec = read_spec
+        return rec
+
+    @property
+    def spec(self):
+        if self._spec is None and self._read_spec is not None:
+            self._spec = self._read_spec()
+            self._node_dict = self._read_spec = None
+        return self._spec
+
+    @spec.setter
+    def spec(self, spec):
+        self._spec = spec
+
+    @property
+    def spec_loaded(self):
+        """Whether the spec of this record has been constructed."""
+        return self._read_spec is None
+
+    @property
+    def name(self):
+        if self.spec_loaded:
+            return self._spec.name
+        return next(iter(self._node_dict))
+
+    def to_dict(self, include_fields=default_install_record_fields):
+        if self.spec_loaded:
+            return super(_LazyInstallRecord, self).to_dict(include_fields)
+
+        rec_dict = super(_LazyInstallRecord, self).to_dict(
+            [f for f in include_fields if f != 'spec'])
+        if 'spec' in include_fields:
+            rec_dict['spec'] = self._node_dict
+        return rec_dict
+
+
+class _QueryIndex(object):
+    """Secondary indexes over the install records of a database.
+
+    Abstract queries use these indexes to narrow down the records that
+    need a full ``Spec.satisfies()`` check. Only attributes of the
+    (concrete) spec are indexed, since they can't change for the lifetime
+    of a record. Record attributes like ``installed`` or ``explicit`` are
+    modified in place and are still checked record by record.
+
+    Records are always indexed by package name, which doesn't require
+    reading their spec. The other indexes map a string representation of
+    an attribute to a representative value and the set of record keys
+    having it, and are built the first time a query needs them. Queries
+    evaluate their constraints once per distinct value, rather than once
+    per record.
+    """
+
+    def __init__(self, data):
+        #: install records being indexed
+        self.data = data
+
+        self.by_name = {}
+        for key, rec in data.items():
+            self.by_name.setdefault(rec.name, set()).add(key)
+
+        self.by_version = None
+        self.by_compiler = None
+        self.by_arch = None
+        self.by_variant = None
+
+    @property
+    def has_attribute_indexes(self):
+        return self.by_version is not None
+
+    def _build_attribute_indexes(self):
+        self.by_version = {}
+        self.by_compiler = {}
+        self.by_arch = {}
+        self.by_variant = {}
+        for key, rec in self.data.items():
+            self._add_attributes(key, rec.spec)
+
+    @staticmethod
+    def _variant_key(variant):
+        return '{0}:{1}'.format(type(variant).__name__, variant)
+
+    def _tables(self, spec):
+        """Yield (table, string key, value) for each indexed attribute."""
+        yield self.by_version, str(spec.versions), spec.versions
+        yield self.by_compiler, str(spec.compiler), spec.compiler
+        yield self.by_arch, str(spec.architecture), spec.architecture
+        for name, variant in spec.variants.items():
+            table = self.by_variant.setdefault(name, {})
+            yield table, self._variant_key(variant), variant
+
+    def _add_attributes(self, key, spec):
+        for table, str_key, value in self._tables(spec):
+            table.setdefault(str_key, (value, set()))[1].add(key)
+
+    def add(self, key, rec):
+        self.by_name.setdefault(rec.name, set()).add(key)
+        if self.has_attribute_indexes:
+            self._add_attributes(key, rec.spec)
+
+    def remove(self, key, rec):
+        keys = self.by_name.get(rec.name, set())
+        keys.discard(key)
+        if not keys:
+            self.by_name.pop(rec.name, None)
+
+        if not self.has_attribute_indexes:
+            return
+
+        for table, str_key, value in self._tables(rec.spec):
+            _, keys = table.get(str_key, (None, set()))
+            keys.discard(key)
+            if not keys:
+                table.pop(str_key, None)
+
+    @staticmethod
+    def _matching(table, predicate):
+        """Keys of all the records whose indexed value satisfies predicate."""
+        keys = set()
+        for value, value_keys in table.values():
+            if predicate(value):
+                keys |= value_keys
+        return keys
+
+    def candidates(self, query_spec):
+        """Return the keys of the records that may satisfy ``query_spec``.
+
+        The result is a superset of the records strictly satisfying the
+        query, or None if the query can't be narrowed down by the index.
+        """
+        # A virtual query is satisfied through the providers of its
+        # records, so none of its constraints apply to the record itself,
+        # but only records of packages providing the virtual can match.
+        if query_spec.virtual:
+            index = spack.repo.path.provider_index
+            providers = index.providers.get(query_spec.name, {})
+            names = set(p.name for specs in providers.values() for p in specs)
+            return set().union(*(self.by_name.get(n, ()) for n in names))
+
+        constraints = []
+        if query_spec.name:
+            constraints.append(self.by_name.get(query_spec.name, set()))
+
+            # Records are narrowed down enough by name, don't read all
+            # their specs just to build the other indexes.
+            if not self.has_attribute_indexes:
+                return constraints[0]
+
+        if not self.has_attribute_indexes:
+            self._build_attribute_indexes()
+
+        if query_spec.versions and \
+                query_spec.versions != spack.spec._any_version:
+            constraints.append(self._matching(
+                self.by_version,
+                lambda v: v.satisfies(query_spec.versions, strict=True)))
+
+        if query_spec.compiler:
+            constraints.append(self._matching(
+                self.by_compiler,
+                lambda c: c and c.satisfies(
+                    query_spec.compiler, strict=True)))
+
+        if query_spec.architecture:
+            constraints.append(self._matching(
+                self.by_arch,
+                lambda a: a and a.satisfies(
+                    query_spec.architecture, strict=True)))
+
+        for name, variant in query_spec.variants.items():
+            constraints.append(self._matching(
+                self.by_variant.get(name, {}),
+                lambda v: v.satisfies(variant)))
+
+        if not constraints:
+            return None
+
+        constraints.sort(key=len)
+        keys = set(constraints[0])
+        for other in constraints[1:]:
+            keys &= other
+        return keys
 
 
 class ForbiddenLockError(SpackError):
@@ -329,6 +547,7 @@ def __init__(self, root, db_dir=None, upstream_dbs=None,
         # Set up layout of database files within the db dir
         self._index_path = os.path.join(self._db_dir, 'index.json')
         self._verifier_path = os.path.join(self._db_dir, 'index_verifier')
+        self._journal_path = os.path.join(self._db_dir, 'index.journal')
         self._lock_path = os.path.join(self._db_dir, 'lock')
 
         # This is for other classes to use to lock prefix directories.
@@ -342,6 +561,9 @@ def __init__(self, root, db_dir=None, upstream_dbs=None,
         # of a spec.
         self.prefix_fail_path = os.path.join(self._db_dir, 'prefix_failures')
 
+        # Work queues shared by the installers cooperating on a spec.
+        self._work_queue_dir = os.path.join(self._db_dir, 'work_queues')
+
         # Create needed directories and files
         if not os.path.exists(self._db_dir):
             fs.mkdirp(self._db_dir)
@@ -373,6 +595,9 @@ def __init__(self, root, db_dir=None, upstream_dbs=None,
                                 desc='database')
         self._data = {}
 
+        # secondary indexes for queries, built lazily over ``self._data``
+        self._query_index = None
+
         self.upstream_dbs = list(upstream_dbs) if upstream_dbs else []
 
         # whether there was an error at the start of a read transaction
@@ -392,6 +617,24 @@ def __init__(self, root, db_dir=None, upstream_dbs=None,
 
         self._record_fields = record_fields
 
+        # Whether specs are read from the index file only when accessed
+        self.lazy_load = spack.config.get('config:db_lazy_load', False)
+
+        # Whether changes are appended to a journal next to the index file,
+        # instead of rewriting the whole index file
+        self.journal = spack.config.get('config:db_format') == 'journal'
+
+        # Identifier of the index file last read or written. Journal entries
+        # for any other index file are stale, and ignored.
+        self._index_id = None
+
+        # Number of changed records in the journal of the index file
+        self._journal_length = 0
+
+        # Keys of the records changed since the database was last read or
+        # written, or None if the whole index file needs to be written
+        self._modified = None
+
     def write_transaction(self):
         """Get a write lock context manager for use in a `with` block."""
         return self._write_transaction_impl(
@@ -410,6 +653,16 @@ def _failed_spec_path(self, spec):
         return os.path.join(self._failure_dir,
                             '{0}-{1}'.format(spec.name, spec.full_hash()))
 
+    def work_queue_path(self, spec):
+        """Return the path to the work queue of the installers of the spec,
+        which may not exist."""
+        if not spec.concrete:
+            raise ValueError('Concrete spec required for work queue path for '
+                             '{0}'.format(spec.name))
+
+        return os.path.join(self._work_queue_dir,
+                            '{0}-{1}.json'.format(spec.name, spec.dag_hash()))
+
     def clear_all_failures(self):
         """Force remove install failure tracking files."""
         tty.debug('Releasing prefix failure locks')
@@ -624,12 +877,122 @@ def _write_to_file(self, stream):
                 'version': str(_db_version)
             }
         }
+        if self._index_id:
+            database['database']['index_id'] = self._index_id
 
         try:
             sjson.dump(database, stream)
         except (TypeError, ValueError) as e:
             raise sjson.SpackJSONError("error writing JSON database:", str(e))
 
+    def _record_modified(self, key):
+        """Note that the record for ``key`` was added, changed or removed,
+        so that it is written to the journal.
+
+        Does no locking.
+        """
+        if self._modified is not None:
+            self._modified.add(key)
+
+    def _read_journal(self, installs):
+        """Apply the changes in the journal of the index file to the
+        install records read from it.
+
+        Does not do any locking.
+        """
+        self._journal_length = 0
+        if not os.path.isfile(self._journal_path):
+            return
+
+        # An index file without identifier was written without a journal
+        if not self._index_id:
+            self._modified = None
+            return
+
+        with open(self._journal_path, 'r') as f:
+            lines = f.readlines()
+
+        for i, line in enumerate(lines):
+            try:
+                entry = sjson.load(line)
+                index_id, changes = entry['index_id'], entry['installs']
+            except Exception as e:
+                if i == len(lines) - 1:
+                    # The last write to the journal was interrupted, and
+                    # never completed. Drop it when the index is next written.
+                    tty.debug('Ignoring incomplete database journal entry')
+                    self._modified = None
+                    break
+                raise CorruptDatabaseError(
+                    "error parsing database journal:", str(e))
+
+            # Left over from an interrupted compaction
+            if index_id != self._index_id:
+                continue
+
+            for hash_key, rec in changes.items():
+                if rec is None:
+                    installs.pop(hash_key, None)
+                else:
+                    installs[hash_key] = rec
+            self._journal_length += len(changes)
+
+    def _append_to_journal(self):
+        """Append the records changed since the database was last read or
+        written to the journal, as a single entry.
+
+        Does no locking.
+        """
+        changes = {}
+        for key in self._modified:
+            rec = self._data.get(key)
+            if rec is not None:
+                rec = rec.to_dict(include_fields=self._record_fields)
+            changes[key] = rec
+
+        entry = {'index_id': self._index_id, 'installs': changes}
+        try:
+            line = json.dumps(entry) + '\n'
+        except (TypeError, ValueError) as e:
+            raise sjson.SpackJSONError(
+                "error writing JSON database journal:", str(e))
+
+        with open(self._journal_path, 'a') as f:
+            f.write(line)
+        self._journal_length += len(changes)
+
+    def _can_append_to_journal(self):
+        """Whether the changes since the database was last read or written
+        can be appended to the journal, rather than compacted with it into
+        the index file."""
+        if not (self.journal and self._index_id) or self._modified is None:
+            return False
+        length = self._journal_length + len(self._modified)
+        return length <= max(len(self._data), _journal_min_length)
+
+    def _get_query_index(self):
+        """Return the query index for the current records, building it
+        if the records were replaced since it was last built.
+
+        Does no locking.
+        """
+        index = self._query_index
+        if index is None or index.data is not self._data:
+            self._query_index = _QueryIndex(self._data)
+        return self._query_index
+
+    def _update_query_index(self, key, rec, remove=False):
+        """Keep an already built query index in sync with a change to
+        the records. Does no locking."""
+        index = self._query_index
+        if index is None or index.data is not self._data:
+            return
+
+        if remove:
+            index.remove(key, rec)
+        else:
+            index.add(key, rec)
+
     def _read_spec_from_dict(self, hash_key, installs):
         """Recursively construct a spec from a hash in a YAML database.
 
@@ -699,12 +1062,55 @@ def _assign_dependencies(self, hash_key, installs, data):
 
                 spec._add_dependency(child, dtypes)
 
-    def _read_from_file(self, filename):
+    def _read_lazy_spec(self, hash_key, spec_dict, data):
+        """Construct the spec of a record read lazily from the database
+        file, along with any of its dependencies not yet constructed.
+
+        Does not do any locking.
+        """
+        installs = {hash_key: {'spec': spec_dict}}
+        rec = data[hash_key]
+        try:
+            rec.spec = self._read_spec_from_dict(hash_key, installs)
+            self._assign_dependencies(hash_key, installs, data)
+        except MissingDependenciesError:
+            rec.spec = None
+            raise
+        except Exception as e:
+            rec.spec = None
+            msg = ("Invalid record in Spack database: "
+                   "hash: %s, cause: %s: %s")
+            msg %= (hash_key, type(e).__name__, str(e))
+            raise CorruptDatabaseError(msg, self._index_path)
+
+        rec.spec._mark_concrete()
+        return rec.spec
+
+    def _read_all_specs(self):
+        """Construct the specs of all the records read lazily, e.g. to
+        make sure the dependents of every spec are known.
+
+        Does not do any locking.
+        """
+        for rec in self._data.values():
+            rec.spec
+
+    def _read_from_file(self, filename, lazy=None):
         """Fill database from file, do not maintain old data.
         Translate the spec portions from node-dict form to spec form.
 
+        Changes recorded in the journal are applied when reading the index
+        file of this database.
+
+        If ``lazy`` is True (by default, if ``config:db_lazy_load`` is
+        set), specs are only translated when their record is first
+        accessed.
+
         Does not do any locking.
         """
+        if lazy is None:
+            lazy = self.lazy_load
+
         try:
             with open(filename, 'r') as f:
                 fdata = sjson.load(f)
@@ -728,11 +1134,18 @@ def check(cond, msg):
 
         installs = db['installs']
 
+        if filename == self._index_path:
+            self._index_id = db.get('index_id')
+            self._read_journal(installs)
+
         # TODO: better version checking semantics.
         version = Version(db['version'])
         if version > _db_version:
             raise InvalidDatabaseVersionError(_db_version, version)
         elif version < _db_version:
+            # the index is saved in the new format the next time it's written
+            self._modified = None
+
             if not any(
                     old == version and new == _db_version
                     for old, new in _skip_reindex
@@ -754,6 +1167,20 @@ def invalid_record(hash_key, error):
             msg %= (hash_key, type(error).__name__, str(error))
             raise CorruptDatabaseError(msg, self._index_path)
 
+        if lazy:
+            data = {}
+            for hash_key, rec in installs.items():
+                try:
+                    read_spec = functools.partial(
+                        self._read_lazy_spec, hash_key, rec['spec'], data)
+                    data[hash_key] = _LazyInstallRecord.from_dict(
+                        read_spec, rec)
+                except Exception as e:
+                    invalid_record(hash_key, e)
+
+            self._data = data
+            return
+
         # Build up the database in three passes:
         #
         #   1. Read in all specs without dependencies.
@@ -811,7 +1238,7 @@ def reindex(self, directory_layout):
         def _read_suppress_error():
             try:
                 if os.path.isfile(self._index_path):
-                    self._read_from_file(self._index_path)
+                    self._read_from_file(self._index_path, lazy=False)
             except CorruptDatabaseError as e:
                 self._error = e
                 self._data = {}
@@ -829,6 +1256,7 @@ def _read_suppress_error():
                 self._error = None
 
             old_data = self._data
+            self._modified = None
             try:
                 self._construct_from_directory_layout(
                     directory_layout, old_data)
@@ -965,23 +1393,44 @@ def _write(self, type, value, traceback):
 
         This routine does no locking.
         """
-        # Do not write if exceptions were raised
+        # Do not write if exceptions were raised. Read the database again
+        # in the next transaction, rather than keep the changes made so far.
         if type is not None:
+            self.last_seen_verifier = ''
             return
 
+        if self._can_append_to_journal():
+            if not self._modified:
+                return
+            self._append_to_journal()
+        else:
+            self._write_index()
+
+        self._modified = set()
+        if _use_uuid:
+            with open(self._verifier_path, 'w') as f:
+                new_verifier = str(uuid.uuid4())
+                f.write(new_verifier)
+                self.last_seen_verifier = new_verifier
+
+    def _write_index(self):
+        """Write the whole in-memory database to its index file, and
+        discard the journal, whose changes are now in the index file.
+
+        This routine does no locking.
+        """
         temp_file = self._index_path + (
             '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
 
+        # Journal entries written from now on are for the new index file
+        self._index_id = '%s.%s.%s' % (
+            socket.getfqdn(), os.getpid(), time.time())
+
         # Write a temporary database file them move it into place
         try:
             with open(temp_file, 'w') as f:
                 self._write_to_file(f)
             os.rename(temp_file, self._index_path)
-            if _use_uuid:
-                with open(self._verifier_path, 'w') as f:
-                    new_verifier = str(uuid.uuid4())
-                    f.write(new_verifier)
-                    self.last_seen_verifier = new_verifier
         except BaseException as e:
             tty.debug(e)
             # Clean up temp file if something goes wrong.
@@ -989,6 +1438,10 @@ def _write(self, type, value, traceback):
                 os.remove(temp_file)
             raise
 
+        if os.path.exists(self._journal_path):
+            os.remove(self._journal_path)
+        self._journal_length = 0
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
@@ -1008,6 +1461,7 @@ def _read(self):
                     (current_verifier == '')):
                 self.last_seen_verifier = current_verifier
                 # Read from file if a database exists
+                self._modified = set()
                 self._read_from_file(self._index_path)
             return
         elif self.is_upstream:
@@ -1017,6 +1471,7 @@ def _read(self):
 
         # The file doesn't exist, try to traverse the directory.
         # reindex() takes its own write lock, so no lock here.
+        self._modified = None
         with lk.WriteTransaction(self.lock):
             self._write(None, None, None)
         self.reindex(spack.store.layout)
@@ -1097,6 +1552,8 @@ def _add(
             self._data[key] = InstallRecord(
                 new_spec, path, installed, ref_count=0, **extra_args
             )
+            self._update_query_index(key, self._data[key])
+            self._record_modified(key)
 
             # Connect dependencies from the DB to the new copy.
             for name, dep in six.iteritems(
@@ -1107,6 +1564,7 @@ def _add(
                 new_spec._add_dependency(record.spec, dep.deptypes)
                 if not upstream:
                     record.ref_count += 1
+                    self._record_modified(dkey)
 
             # Mark concrete once everything is built, and preserve
             # the original hash of concrete specs.
@@ -1121,6 +1579,7 @@ def _add(
             self._data[key].installation_time = _now()
 
         self._data[key].explicit = explicit
+        self._record_modified(key)
 
     @_autospec
     def add(self, spec, directory_layout, explicit=False):
@@ -1161,9 +1620,11 @@ def _decrement_ref_count(self, spec):
 
         rec = self._data[key]
         rec.ref_count -= 1
+        self._record_modified(key)
 
         if rec.ref_count == 0 and not rec.installed:
             del self._data[key]
+            self._update_query_index(key, rec, remove=True)
             for dep in spec.dependencies(_tracked_deps):
                 self._decrement_ref_count(dep)
 
@@ -1175,17 +1636,20 @@ def _increment_ref_count(self, spec):
 
         rec = self._data[key]
         rec.ref_count += 1
+        self._record_modified(key)
 
     def _remove(self, spec):
         """Non-locking version of remove(); does real work."""
         key = self._get_matching_spec_key(spec)
         rec = self._data[key]
+        self._record_modified(key)
 
         if rec.ref_count > 0:
             rec.installed = False
             return rec.spec
 
         del self._data[key]
+        self._update_query_index(key, rec, remove=True)
         for dep in rec.spec.dependencies(_tracked_deps):
             # FIXME: the two lines below needs to be updated once #11983 is
             # FIXME: fixed. The "if" statement should be deleted and specs are
@@ -1252,6 +1716,25 @@ def _deprecate(self, spec, deprecator):
         spec_rec.deprecated_for = deprecator_key
         spec_rec.installed = False
         self._data[spec_key] = spec_rec
+        self._record_modified(spec_key)
+
+    @_autospec
+    def update_explicit(self, spec, explicit):
+        """Update whether a spec in the database was installed explicitly.
+
+        Args:
+            spec (Spec): the spec whose install record is being updated
+            explicit (bool): ``True`` if the package was requested explicitly
+                by the user, ``False`` if it was pulled in as a dependency of
+                an explicit package.
+        """
+        with self.write_transaction():
+            key = self._get_matching_spec_key(spec)
+            upstream, rec = self.query_by_spec_hash(key)
+            if upstream or rec.explicit == explicit:
+                return
+            rec.explicit = explicit
+            self._record_modified(key)
 
     @_autospec
     def deprecate(self, spec, deprecator):
@@ -1266,8 +1749,16 @@ def installed_relatives(self, spec, direction='children', transitive=True,
         if direction not in ('parents', 'children'):
             raise ValueError("Invalid direction: %s" % direction)
 
+        with self.read_transaction():
+            if direction == 'parents':
+                # Dependents are only known once their specs are read
+                self._read_all_specs()
+                for upstream_db in self.upstream_dbs:
+                    upstream_db._read_all_specs()
+            specs = self.query(spec)
+
         relatives = set()
-        for spec in self.query(spec):
+        for spec in specs:
             if transitive:
                 to_add = spec.traverse(
                     direction=direction, root=False, deptype=deptype)
@@ -1422,6 +1913,11 @@ def _query(
         # TODO: like installed and known that can be queried?  Or are
         # TODO: these really special cases that only belong here?
 
+        # Parse the query once, rather than once per record in satisfies()
+        if query_spec is not any and \
+                not isinstance(query_spec, spack.spec.Spec):
+            query_spec = spack.spec.Spec(query_spec)
+
         # Just look up concrete specs with hashes; no fancy search.
         if isinstance(query_spec, spack.spec.Spec) and query_spec.concrete:
             # TODO: handling of hashes restriction is not particularly elegant.
@@ -1432,13 +1928,25 @@ def _query(
             else:
                 return []
 
-        # Abstract specs require more work -- currently we test
-        # against everything.
+        # Abstract specs require more work -- we use the query index to
+        # narrow down the candidates, and test against each of them.
         results = []
+        check_dates = start_date is not None or end_date is not None
         start_date = start_date or datetime.datetime.min
         end_date = end_date or datetime.datetime.max
 
-        for key, rec in self._data.items():
+        keys = None
+        if query_spec is not any:
+            keys = self._get_query_index().candidates(query_spec)
+        if hashes is not None:
+            keys = set(hashes) if keys is None else keys.intersection(hashes)
+        # Iterate the records in their order in the database: the candidates
+        # only narrow down the records to test
+        records = self._data.items()
+        if keys is not None:
+            records = ((k, r) for k, r in records if k in keys)
+
+        for key, rec in records:
             if hashes is not None and rec.spec.dag_hash() not in hashes:
                 continue
 
@@ -1452,11 +1960,12 @@ def _query(
                     rec.spec.name) != known:
                 continue
 
-            inst_date = datetime.datetime.fromtimestamp(
-                rec.installation_time
-            )
-            if not (start_date < inst_date < end_date):
-                continue
+            if check_dates:
+                inst_date = datetime.datetime.fromtimestamp(
+                    rec.installation_time
+                )
+                if not (start_date < inst_date < end_date):
+                    continue
 
             if (query_spec is any or
                 rec.spec.satisfies(query_spec, strict=True)):
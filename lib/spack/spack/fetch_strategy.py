@@ -22,6 +22,7 @@
     * archive()
         Archive a source directory, e.g. for creating a mirror.
 """
+import contextlib
 import copy
 import functools
 import os
@@ -29,6 +30,7 @@
 import re
 import shutil
 import sys
+import threading
 
 import llnl.util.tty as tty
 import six
@@ -36,6 +38,7 @@
 import spack.config
 import spack.error
 import spack.util.crypto as crypto
+import spack.util.download
 import spack.util.pattern as pattern
 import spack.util.url as url_util
 import spack.util.web as web_util
@@ -49,6 +52,14 @@
 #: List of all fetch strategies, created by FetchStrategy metaclass.
 all_strategies = []
 
+#: Maximum number of archives downloaded from the same host at the same time
+#: when fetching in parallel, so that servers are not flooded
+max_downloads_per_host = 4
+
+#: Semaphores bounding the downloads from each host, keyed on the host
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
 CONTENT_TYPE_MISMATCH_WARNING_TEMPLATE = (
     "The contents of {subject} look like {content_type}.  Either the URL"
     " you are trying to use does not exist or you have an internet gateway"
@@ -61,6 +72,32 @@ def warn_content_type_mismatch(subject, content_type='HTML'):
         subject=subject, content_type=content_type))
 
 
+@contextlib.contextmanager
+def download_slot(fetcher):
+    """Wait for one of the ``max_downloads_per_host`` download slots of the
+    host the fetcher downloads from.
+
+    Fetchers without a URL, and those of local files, are not limited.
+
+    Args:
+        fetcher (FetchStrategy): the fetcher about to fetch
+    """
+    url = getattr(fetcher, 'url', None)
+    host = urllib_parse.urlparse(url).netloc if url else ''
+    if not host:
+        yield
+        return
+
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(
+                max_downloads_per_host)
+        slot = _host_slots[host]
+
+    with slot:
+        yield
+
+
 def _needs_stage(fun):
     """Many methods on fetch strategies require a stage to be set
        using set_stage().  This decorator adds a check for self.stage."""
@@ -262,6 +299,10 @@ def __init__(self, url=None, checksum=None, **kwargs):
         self.extra_options = kwargs.get('fetch_options', {})
         self._curl = None
 
+        # Archive downloaded natively, and its checksum computed while it
+        # was written, so check() need not read it again
+        self._fetched_checksum = None
+
         self.extension = kwargs.get('extension', None)
 
         if not self.url:
@@ -318,8 +359,25 @@ def fetch(self):
         if not self.archive_file:
             raise FailedDownloadError(url)
 
+    @property
+    def _fetch_natively(self):
+        """Whether to download in process instead of running curl."""
+        return spack.config.get('config:url_fetch_method') == 'native'
+
+    def _connect_timeout(self):
+        connect_timeout = spack.config.get('config:connect_timeout', 10)
+        timeout = (self.extra_options or {}).get('timeout')
+        if timeout:
+            connect_timeout = max(connect_timeout, int(timeout))
+        return connect_timeout
+
     def _existing_url(self, url):
         tty.debug('Checking existence of {0}'.format(url))
+        if self._fetch_natively:
+            return spack.util.download.exists(
+                url, timeout=self._connect_timeout(),
+                verify_ssl=spack.config.get('config:verify_ssl'))
+
         curl = self.curl
         # Telling curl to fetch the first byte (-r 0-0) is supposed to be
         # portable.
@@ -328,6 +386,9 @@ def _existing_url(self, url):
         return curl.returncode == 0
 
     def _fetch_from_url(self, url):
+        if self._fetch_natively:
+            return self._fetch_from_url_natively(url)
+
         save_file = None
         partial_file = None
         if self.stage.save_filename:
@@ -375,10 +436,15 @@ def _fetch_from_url(self, url):
             # Timeout if can't establish a connection after n sec.
             curl_args.extend(['--connect-timeout', str(connect_timeout)])
 
-        # Run curl but grab the mime type from the http headers
+        # Run curl but grab the mime type from the http headers.  Only
+        # change directory when curl names the file, so that downloads
+        # to a known file can run in threads.
         curl = self.curl
-        with working_dir(self.stage.path):
+        if partial_file:
             headers = curl(*curl_args, output=str, fail_on_error=False)
+        else:
+            with working_dir(self.stage.path):
+                headers = curl(*curl_args, output=str, fail_on_error=False)
 
         if curl.returncode != 0:
             # clean up archive on failure.
@@ -420,6 +486,48 @@ def _fetch_from_url(self, url):
             warn_content_type_mismatch(self.archive_file or "the archive")
         return partial_file, save_file
 
+    def _fetch_from_url_natively(self, url):
+        """Download the URL with ``spack.util.download``, resuming partial
+        downloads and computing the checksum of the archive on the way."""
+        save_file = self.stage.save_filename or os.path.join(
+            self.stage.path, os.path.basename(urllib_parse.urlparse(url).path))
+        partial_file = save_file + '.part'
+        tty.msg('Fetching {0}'.format(url))
+
+        headers = {}
+        cookie = (self.extra_options or {}).get('cookie')
+        if cookie:
+            headers['Cookie'] = cookie
+
+        hasher = None
+        if self.digest:
+            hasher = crypto.hash_fun_for_digest(self.digest)()
+
+        self._fetched_checksum = None
+        try:
+            content_type = spack.util.download.fetch(
+                url, partial_file, hasher=hasher, headers=headers,
+                timeout=self._connect_timeout(),
+                verify_ssl=spack.config.get('config:verify_ssl'))
+        except spack.util.download.DownloadError as e:
+            if os.path.exists(partial_file):
+                # Keep what was downloaded of the archive for next time,
+                # unless the server has nothing to resume it with
+                if e.status is not None:
+                    os.remove(partial_file)
+
+            if e.status == 404:
+                raise FailedDownloadError(
+                    url, "URL %s was not found!" % url)
+            raise FailedDownloadError(url, e.long_message)
+
+        if hasher is not None:
+            self._fetched_checksum = (save_file, hasher.hexdigest())
+
+        if content_type and 'text/html' in content_type:
+            warn_content_type_mismatch(save_file)
+        return partial_file, save_file
+
     @property
     @_needs_stage
     def archive_file(self):
@@ -519,7 +627,14 @@ def check(self):
                 "Attempt to check URLFetchStrategy with no digest.")
 
         checker = crypto.Checker(self.digest)
-        if not checker.check(self.archive_file):
+        if self._fetched_checksum and \
+                self._fetched_checksum[0] == self.archive_file:
+            # Checksum computed while downloading the archive
+            checker.sum = self._fetched_checksum[1]
+        else:
+            checker.check(self.archive_file)
+
+        if checker.sum != self.digest:
             raise ChecksumError(
                 "%s checksum failed for %s" %
                 (checker.hash_name, self.archive_file),
@@ -1163,23 +1278,23 @@ def fetch(self):
 
         tty.debug('Fetching {0}'.format(self.url))
 
-        basename = os.path.basename(parsed_url.path)
+        # Don't change directory, so that S3 mirrors can be fetched from
+        # in threads
+        download_path = os.path.join(
+            self.stage.path, os.path.basename(parsed_url.path))
 
-        with working_dir(self.stage.path):
-            _, headers, stream = web_util.read_from_url(self.url)
+        _, headers, stream = web_util.read_from_url(self.url)
 
-            with open(basename, 'wb') as f:
-                shutil.copyfileobj(stream, f)
+        with open(download_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
 
-            content_type = web_util.get_header(headers, 'Content-type')
+        content_type = web_util.get_header(headers, 'Content-type')
 
         if content_type == 'text/html':
             warn_content_type_mismatch(self.archive_file or "the archive")
 
         if self.stage.save_filename:
-            os.rename(
-                os.path.join(self.stage.path, basename),
-                self.stage.save_filename)
+            os.rename(download_path, self.stage.save_filename)
 
         if not self.archive_file:
             raise FailedDownloadError(self.url)
@@ -1194,6 +1309,14 @@ def stable_target(fetcher):
     return False
 
 
+def thread_safe(stage):
+    """Returns whether the stage can be fetched in a thread, next to other
+       fetches.  Version control fetchers, and curl when the stage has no
+       file name to save to, change the working directory of the process."""
+    return (isinstance(stage.default_fetcher, URLFetchStrategy) and
+            bool(stage.save_filename))
+
+
 def from_url(url):
     """Given a URL, find an appropriate fetch strategy for it.
        Currently just gives you a URLFetchStrategy that uses curl.
@@ -27,26 +27,39 @@
 installations of packages in a Spack instance.
 """
 
+import contextlib
+import errno
 import glob
 import heapq
 import itertools
+import multiprocessing
 import os
+import select
 import shutil
 import six
+import socket
 import sys
+import tempfile
 import time
+from multiprocessing.pool import ThreadPool
 
 import llnl.util.filesystem as fs
 import llnl.util.lock as lk
 import llnl.util.tty as tty
 import spack.binary_distribution as binary_distribution
+import spack.compiler
 import spack.compilers
+import spack.config
 import spack.error
+import spack.fetch_strategy
 import spack.hooks
 import spack.package
 import spack.package_prefs as prefs
 import spack.repo
+import spack.stage
 import spack.store
+import spack.subprocess_context
+import spack.util.spack_json as sjson
 
 from llnl.util.tty.color import colorize
 from llnl.util.tty.log import log_output
@@ -79,6 +92,13 @@
 #: queue invariants).
 STATUS_REMOVED = 'removed'
 
+#: Message used when terminating an installation on the first failure
+fail_fast_err = 'Terminating after first install failure'
+
+#: Seconds to wait for the other workers of this node once the install is
+#: done, after which they are stopped
+worker_join_timeout = 60
+
 
 def _handle_external_and_upstream(pkg, explicit):
     """
@@ -234,11 +254,7 @@ def _install_from_cache(pkg, cache_only, explicit, unsigned=False,
         pkg, explicit, unsigned=unsigned, full_hash_match=full_hash_match)
     pkg_id = package_id(pkg)
     if not installed_from_cache:
-        pre = 'No binary for {0} found'.format(pkg_id)
-        if cache_only:
-            tty.die('{0} when cache-only specified'.format(pre))
-
-        tty.msg('{0}: installing from source'.format(pre))
+        _no_binary_found(pkg, cache_only)
         return False
 
     tty.debug('Successfully extracted {0} from binary cache'.format(pkg_id))
@@ -247,6 +263,22 @@ def _install_from_cache(pkg, cache_only, explicit, unsigned=False,
     return True
 
 
+def _no_binary_found(pkg, cache_only):
+    """
+    Report that the package has to be installed from source, since there
+    is no binary for it.
+
+    Args:
+        pkg (PackageBase): the package to be installed
+        cache_only (bool): only extract from binary cache
+    """
+    pre = 'No binary for {0} found'.format(package_id(pkg))
+    if cache_only:
+        tty.die('{0} when cache-only specified'.format(pre))
+
+    tty.msg('{0}: installing from source'.format(pre))
+
+
 def _print_installed_pkg(message):
     """
     Output a message with a package icon.
@@ -377,11 +409,9 @@ def _update_explicit_entry_in_db(pkg, rec, explicit):
             package.
     """
     if explicit and not rec.explicit:
-        with spack.store.db.write_transaction():
-            rec = spack.store.db.get_record(pkg.spec)
-            message = '{s.name}@{s.version} : marking the package explicit'
-            tty.debug(message.format(s=pkg.spec))
-            rec.explicit = True
+        message = '{s.name}@{s.version} : marking the package explicit'
+        tty.debug(message.format(s=pkg.spec))
+        spack.store.db.update_explicit(pkg.spec, True)
 
 
 def clear_failures():
@@ -569,6 +599,13 @@ def package_id(pkg):
 
 install_args_docstring = """
             cache_only (bool): Fail if binary package unavailable.
+            concurrent_builds (int): Maximum number of packages with no
+                uninstalled dependencies to build at the same time, each in
+                its own build process.  The ``build_jobs`` budget is split
+                among them.  Default is 1 (one package at a time).  With
+                ``use_cache``, as many threads download and verify binary
+                packages ahead of their installation, which are extracted
+                in build processes too.
             dirty (bool): Don't clean the build environment before installing.
             explicit (bool): True if package was explicitly installed, False
                 if package was implicitly installed (as a dependency).
@@ -576,6 +613,12 @@ def package_id(pkg):
                 otherwise, the default is to install as many dependencies as
                 possible (i.e., best effort installation).
             fake (bool): Don't really build; install fake stub files instead.
+            fetch_jobs (int): Number of threads downloading and checking the
+                sources of the packages to build ahead of their builds, with
+                at most ``fetch_strategy.max_downloads_per_host`` downloads
+                from the same host.  Default is 1 (each package is fetched
+                when its build starts).  Not used with ``workers``, whose
+                builds may share the stages of this node.
             install_deps (bool): Install dependencies before installing this
                 package
             install_source (bool): By default, source is not installed, but
@@ -598,6 +641,10 @@ def package_id(pkg):
             use_cache (bool): Install from binary package, if available.
             verbose (bool): Display verbose build output (by default,
                 suppresses it)
+            workers (int): Share the build tasks with the other installers of
+                the spec started with ``workers``, e.g., on other nodes using
+                the same install tree, and run this many of them in separate
+                processes on this node.  Default is 0 (no work sharing).
         """
 
 
@@ -660,6 +707,25 @@ def __init__(self, pkg):
         # Locks on specs being built, keyed on the package's unique id
         self.locks = {}
 
+        # Concurrent build processes, keyed on the package's unique id
+        self.building = {}
+
+        # Work queue shared with the other workers installing the spec, if any
+        self.work_queue = None
+
+        # Processes of the other workers started on this node, if any
+        self.helpers = []
+
+        # Downloads of binary packages ahead of their installation, if any
+        self.prefetcher = None
+
+        # Downloads of sources ahead of their builds, if any
+        self.source_prefetcher = None
+
+        # Seconds of compiler runs the builds avoided thanks to the compiler
+        # info cache
+        self.compiler_time_saved = 0.0
+
     def __repr__(self):
         """Returns a formal representation of the package installer."""
         rep = '{0}('.format(self.__class__.__name__)
@@ -1055,6 +1121,39 @@ def _install_task(self, task, **kwargs):
         Args:
             task (BuildTask): the installation build task for a package"""
 
+        if not self._prepare_build(task, **kwargs):
+            return
+
+        pkg = task.pkg
+        self._count_compiler_time_saved(pkg)
+        try:
+            self._setup_install_dir(pkg)
+
+            # Create a child process to do the actual installation.
+            # Preserve verbosity settings across installs.
+            spack.package.PackageBase._verbose = (
+                spack.build_environment.start_build_process(
+                    pkg, build_process, kwargs)
+            )
+
+            self._register_build(task)
+        except spack.build_environment.StopPhase as e:
+            self._stopped_early(pkg, e)
+
+    _install_task.__doc__ += install_args_docstring
+
+    def _prepare_build(self, task, **kwargs):
+        """
+        Perform the steps preceding the build of the spec represented by the
+        build task, which includes installing it from a binary cache if
+        possible.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+
+        Return:
+            True if the package still needs to be built, False otherwise
+        """
         cache_only = kwargs.get('cache_only', False)
         tests = kwargs.get('tests', False)
         unsigned = kwargs.get('unsigned', False)
@@ -1077,43 +1176,416 @@ def _install_task(self, task, **kwargs):
             if task.compiler:
                 spack.compilers.add_compilers_to_config(
                     spack.compilers.find_compilers([pkg.spec.prefix]))
-            return
+            return False
 
         pkg.run_tests = (tests is True or tests and pkg.name in tests)
 
         # hook that allows tests to inspect the Package before installation
         # see unit_test_check() docs.
-        if not pkg.unit_test_check():
-            return
+        return bool(pkg.unit_test_check())
+
+    def _register_build(self, task):
+        """
+        Record the newly built spec of the build task in the database.
+
+        Args:
+            task (BuildTask): the build task for the built package
+        """
+        pkg = task.pkg
+
+        # Note: PARENT of the build process adds the new package to
+        # the database, so that we don't need to re-read from file.
+        spack.store.db.add(pkg.spec, spack.store.layout,
+                           explicit=task.pkg_id == self.pkg_id)
 
+        # If a compiler, ensure it is added to the configuration
+        if task.compiler:
+            spack.compilers.add_compilers_to_config(
+                spack.compilers.find_compilers([pkg.spec.prefix]))
+
+    def _stopped_early(self, pkg, exc):
+        """
+        Report a build that was asked to stop before its last phase.
+
+        Args:
+            pkg (PackageBase): the package being installed
+            exc (StopPhase): the exception raised by the build process
+        """
+        # A StopPhase exception means that do_install was asked to
+        # stop early from clients, and is not an error at this point
+        pid = '{0}: '.format(pkg.pid) if tty.show_pid() else ''
+        tty.debug('{0}{1}'.format(pid, str(exc)))
+        tty.debug('Package stage directory: {0}'
+                  .format(pkg.stage.source_path))
+
+    def _build_jobs_per_build(self, concurrent_builds):
+        """
+        Determine how many of the ``build_jobs`` budget that is not used by
+        running builds to give the next build.
+
+        The remaining budget is split evenly among the builds that can still
+        be started, so the last package of a chain gets every job while
+        independent packages share them.
+
+        Args:
+            concurrent_builds (int): maximum number of simultaneous builds
+
+        Return:
+            (int) number of jobs for the next build
+        """
+        budget = min(spack.config.get('config:build_jobs', 16),
+                     multiprocessing.cpu_count())
+        in_use = sum(jobs for _, _, _, jobs in self.building.values())
+
+        # The task being started has already been popped off the queue
+        ready = 1 + sum(1 for task in self.build_tasks.values()
+                        if task.priority == 0)
+        slots = min(concurrent_builds - len(self.building), ready)
+        return max(1, (budget - in_use) // max(1, slots))
+
+    def _count_compiler_time_saved(self, pkg):
+        """
+        Add the time the build of the package saves by finding the implicit
+        link paths of its compiler in the compiler info cache, instead of
+        running the compiler, to ``compiler_time_saved``.
+
+        Args:
+            pkg (PackageBase): the package about to be built
+        """
         try:
-            self._setup_install_dir(pkg)
+            compiler = pkg.compiler
+            if compiler.enable_implicit_rpaths is False:
+                return
+            self.compiler_time_saved += spack.compiler.info_cache.seconds(
+                compiler, 'implicit_rpaths')
+        except Exception as e:
+            tty.debug('Cannot look up the compiler of {0}: {1}'
+                      .format(package_id(pkg), str(e)))
+
+    def _start_build(self, task, **kwargs):
+        """
+        Start building the spec represented by the build task in its own
+        build process without waiting for it to finish.
 
-            # Create a child process to do the actual installation.
-            # Preserve verbosity settings across installs.
-            spack.package.PackageBase._verbose = (
-                spack.build_environment.start_build_process(
-                    pkg, build_process, kwargs)
-            )
+        Args:
+            task (BuildTask): the installation build task for a package
 
-            # Note: PARENT of the build process adds the new package to
-            # the database, so that we don't need to re-read from file.
-            spack.store.db.add(pkg.spec, spack.store.layout,
-                               explicit=explicit)
+        Return:
+            True if a build process was started, False if there was nothing
+            left to build
+        """
+        if self.prefetcher is not None:
+            binary = self.prefetcher.get(task.pkg.spec)
+            if binary is not None:
+                self._start_extraction(task, binary, **kwargs)
+                return True
 
-            # If a compiler, ensure it is added to the configuration
-            if task.compiler:
-                spack.compilers.add_compilers_to_config(
-                    spack.compilers.find_compilers([pkg.spec.prefix]))
+            _no_binary_found(task.pkg, kwargs.get('cache_only', False))
+            kwargs = dict(kwargs, use_cache=False)
+
+        if not self._prepare_build(task, **kwargs):
+            return False
+
+        pkg = task.pkg
+        self._count_compiler_time_saved(pkg)
+        self._setup_install_dir(pkg)
+
+        jobs = self._build_jobs_per_build(kwargs['concurrent_builds'])
+        with spack.config.override('config:build_jobs', jobs):
+            # Only one build can own the terminal, so none of them do.
+            build = spack.build_environment.spawn_build_process(
+                pkg, build_process, kwargs, forward_stdin=False)
+
+        tty.debug('Started build of {0} with {1} jobs [{2} running]'
+                  .format(task.pkg_id, jobs, len(self.building) + 1))
+        self.building[task.pkg_id] = (task, build, time.time(), jobs)
+        return True
+
+    def _start_extraction(self, task, binary, **kwargs):
+        """
+        Start extracting the downloaded binary package of the spec
+        represented by the build task in its own process without waiting for
+        it to finish.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+            binary (tuple): the spec, path and verification result of the
+                binary package, as returned by ``BinaryPrefetcher.get()``
+        """
+        pkg = task.pkg
+        tty.msg(install_msg(task.pkg_id, self.pid))
+        task.start = task.start or time.time()
+        task.status = STATUS_INSTALLING
+        pkg.installed_from_binary_cache = True
+
+        # Relocation needs the prefixes of the spec and its dependencies,
+        # which would have to be read from the database in the extraction
+        # process -- while this process writes to it.
+        binary_spec = binary[0]
+        for spec in binary_spec.traverse():
+            spec.prefix
+
+        build = spack.build_environment.spawn_build_process(
+            pkg, extract_process, dict(kwargs, binary=binary),
+            forward_stdin=False, setup=False)
+
+        tty.debug('Started extraction of {0} [{1} running]'
+                  .format(task.pkg_id, len(self.building) + 1))
+        self.building[task.pkg_id] = (task, build, time.time(), 1)
+
+    def _finish_build(self, pkg_id):
+        """
+        Wait for the build process of the package to finish and record the
+        package as built.
+
+        Args:
+            pkg_id (str): identifier for the package being built
+        """
+        task, build, start, jobs = self.building.pop(pkg_id)
+        pkg = task.pkg
+        if pkg.installed_from_binary_cache:
+            try:
+                build.complete()
+                self._register_build(task)
+                _print_installed_pkg(pkg.prefix)
+                spack.hooks.post_install(pkg.spec)
+            finally:
+                tty.msg('Extraction of {0} took {1}'
+                        .format(pkg_id, _hms(time.time() - start)))
+            return
+
+        try:
+            spack.package.PackageBase._verbose = build.complete()
+            self._register_build(task)
         except spack.build_environment.StopPhase as e:
-            # A StopPhase exception means that do_install was asked to
-            # stop early from clients, and is not an error at this point
-            pid = '{0}: '.format(pkg.pid) if tty.show_pid() else ''
-            tty.debug('{0}{1}'.format(pid, str(e)))
-            tty.debug('Package stage directory: {0}'
-                      .format(pkg.stage.source_path))
+            self._stopped_early(pkg, e)
+        finally:
+            tty.msg('Build of {0} took {1} [{2} jobs]'
+                    .format(pkg_id, _hms(time.time() - start), jobs))
 
-    _install_task.__doc__ += install_args_docstring
+    def _wait_for_builds(self, block=True):
+        """
+        Return the ids of the packages whose build processes have finished.
+
+        Args:
+            block (bool): ``True`` to wait until at least one build is done,
+                ``False`` to only collect those that are already done
+        """
+        builds = dict((build.fileno(), pkg_id)
+                      for pkg_id, (_, build, _, _) in self.building.items())
+        timeout = None if block else 0
+        done = select.select(list(builds), [], [], timeout)[0]
+        return [builds[fd] for fd in sorted(done)]
+
+    def _terminate_builds(self):
+        """Stop any build processes that are still running."""
+        for pkg_id, (task, build, _, _) in list(self.building.items()):
+            tty.debug('Terminating the build of {0}'.format(pkg_id))
+            build.terminate()
+            task.pkg.stage.created = False
+        self.building.clear()
+
+    def _should_prefetch(self, task):
+        """
+        Determine if the binary package of the build task's spec is worth
+        downloading ahead of its installation.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+
+        Return:
+            True if the spec is to be installed in this install tree and is
+            not installed yet, False otherwise
+        """
+        spec = task.pkg.spec
+        if spec.external or task.pkg.installed_upstream:
+            return False
+
+        if spec.dag_hash() in self.overwrite:
+            return False
+
+        _, installed_in_db = self._check_db(spec)
+        return not installed_in_db
+
+    def _binary_available(self, task, **kwargs):
+        """
+        Determine if the build task's spec may be installed from a binary
+        package, according to the cached indices of the binary mirrors.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+        """
+        if not kwargs.get('use_cache', True):
+            return False
+
+        spec = task.pkg.spec
+        return bool(binary_distribution.binary_index.find_built_spec(spec))
+
+    def _wait_for_sources(self, task):
+        """
+        Wait for the prefetch of the sources of the build task's package.
+
+        A failed prefetch is not an error: the sources are fetched again,
+        and the error reported, when the package is built.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+        """
+        try:
+            if self.source_prefetcher.wait(task.pkg):
+                tty.debug('Prefetched the sources of {0}'
+                          .format(task.pkg_id))
+        except Exception as e:
+            tty.debug('Failed to prefetch the sources of {0}: {1}'
+                      .format(task.pkg_id, str(e)))
+
+    def _claim_task(self, task):
+        """
+        Claim the spec of the build task in the work queue shared with other
+        workers.
+
+        A spec claimed by another worker is only worked on when no other task
+        is ready, in which case the prefix locks are relied upon to wait for
+        the other worker -- or to take over from it if it is gone.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+
+        Return:
+            True if this worker should proceed with the task, False if the
+            task should be left to another worker for now
+        """
+        self._reap_helpers()
+        if self.work_queue.claim(task.spec):
+            return True
+
+        elsewhere = self.work_queue.claimed_elsewhere()
+        return all(t.spec.dag_hash() in elsewhere
+                   for t in self.build_tasks.values() if t.priority == 0)
+
+    def _reap_helpers(self, timeout=0):
+        """
+        Collect the other workers of this node that are done, reporting
+        those that failed and putting the specs they claimed back in the
+        work queue.
+
+        Args:
+            timeout (float): seconds to wait for all of the workers to be
+                done; those still running afterwards are stopped
+        """
+        deadline = time.time() + timeout
+        for helper in list(self.helpers):
+            helper.join(max(0, deadline - time.time()) if timeout else 0)
+            if helper.is_alive():
+                if not timeout:
+                    continue
+
+                tty.warn('Stopping worker {0}, which is still running'
+                         .format(helper.pid))
+                helper.terminate()
+                helper.join()
+
+            elif helper.exitcode:
+                tty.warn('Worker {0} exited with code {1}'
+                         .format(helper.pid, helper.exitcode))
+
+            self.helpers.remove(helper)
+            worker = '{0}:{1}'.format(socket.gethostname(), helper.pid)
+            for dag_hash in self.work_queue.requeue(worker):
+                tty.debug('Requeued {0} claimed by worker {1}'
+                          .format(dag_hash, worker))
+
+    def _flag_install_failure(self, task, exc):
+        """
+        Report the failed installation of the build task's package and flag
+        it, and its dependents, as failed.
+
+        Args:
+            task (BuildTask): the build task for the failed package
+            exc (Exception): the exception raised by the installation
+        """
+        if (not isinstance(exc, spack.error.SpackError) or
+                not exc.printed):
+            # SpackErrors can be printed by the build process or at
+            # lower levels -- skip printing if already printed.
+            # TODO: sort out this and SpackEror.print_context()
+            err = 'Failed to install {0} due to {1}: {2}'
+            tty.error(
+                err.format(task.pkg.name, exc.__class__.__name__, str(exc)))
+
+        self._update_failed(task, True, exc)
+
+    def _run_task_step(self, task, step, keep_prefix, fail_fast):
+        """
+        Run a step of a concurrent build -- starting or finishing it -- and
+        update the installation status of the task once the build is over.
+
+        Failures are handled as for sequential builds: the package and its
+        dependents are flagged as failed, and the exception is only re-raised
+        for the explicit package or when failing fast.
+
+        Args:
+            task (BuildTask): the installation build task for a package
+            step (callable): returns ``True`` if the build is still running
+            keep_prefix (bool): ``True`` to keep the install prefix on failure
+            fail_fast (bool): ``True`` to terminate on the first failure
+
+        Return:
+            True if the build is still running, False otherwise
+        """
+        pkg = task.pkg
+        running = False
+        try:
+            running = bool(step())
+            if not running:
+                self._update_installed(task)
+
+                # If we installed then we should keep the prefix
+                stop_before_phase = getattr(pkg, 'stop_before_phase', None)
+                last_phase = getattr(pkg, 'last_phase', None)
+                keep_prefix = keep_prefix or \
+                    (stop_before_phase is None and last_phase is None)
+
+        except spack.directory_layout.InstallDirectoryAlreadyExistsError:
+            tty.debug("Keeping existing install prefix in place.")
+            self._update_installed(task)
+            raise
+
+        except KeyboardInterrupt as exc:
+            # The build has been terminated with a Ctrl-C so terminate.
+            err = 'Failed to install {0} due to {1}: {2}'
+            tty.error(err.format(pkg.name, exc.__class__.__name__, str(exc)))
+            raise
+
+        except (Exception, SystemExit) as exc:
+            # Best effort installs suppress the exception and mark the
+            # package as a failure UNLESS this is the explicit package.
+            self._flag_install_failure(task, exc)
+
+            if fail_fast:
+                raise InstallError('{0}: {1}'.format(fail_fast_err, str(exc)))
+
+            if task.pkg_id == self.pkg_id:
+                raise
+
+        finally:
+            if not running:
+                # Remove the install prefix if anything went wrong during
+                # install.
+                if not keep_prefix:
+                    pkg.remove_prefix()
+
+                # The subprocess *may* have removed the build stage. Mark it
+                # not created so that the next time pkg.stage is invoked, we
+                # check the filesystem for it.
+                pkg.stage.created = False
+
+        if not running:
+            # Perform basic task cleanup for the installed spec to
+            # include downgrading the write to a read lock
+            self._cleanup_task(pkg)
+
+        return running
 
     def _next_is_pri0(self):
         """
@@ -1221,6 +1693,9 @@ def _requeue_task(self, task):
             tty.msg('{0} {1}'.format(install_msg(task.pkg_id, self.pid),
                                      'in progress by another process'))
 
+        if self.work_queue is not None:
+            self.work_queue.release(task.spec)
+
         start = task.start or time.time()
         self._push_task(task.pkg, task.compiler, start, task.attempts,
                         STATUS_INSTALLING)
@@ -1273,6 +1748,9 @@ def _update_failed(self, task, mark=False, exc=None):
             self.failed[pkg_id] = None
         task.status = STATUS_FAILED
 
+        if self.work_queue is not None:
+            self.work_queue.finish(task.spec, STATUS_FAILED)
+
         for dep_id in task.dependents:
             if dep_id in self.build_tasks:
                 tty.warn('Skipping build of {0} since {1} failed'
@@ -1297,6 +1775,13 @@ def _update_installed(self, task):
         pkg_id = task.pkg_id
         tty.debug('Flagging {0} as installed'.format(pkg_id))
 
+        # Only the packages built by this worker are recorded as its work
+        if self.work_queue is not None:
+            if task.status == STATUS_INSTALLING:
+                self.work_queue.finish(task.spec, STATUS_INSTALLED)
+            else:
+                self.work_queue.release(task.spec)
+
         self.installed.add(pkg_id)
         task.status = STATUS_INSTALLED
         for dep_id in task.dependents:
@@ -1320,13 +1805,7 @@ def install(self, **kwargs):
 
         Args:"""
 
-        fail_fast = kwargs.get('fail_fast', False)
         install_deps = kwargs.get('install_deps', True)
-        keep_prefix = kwargs.get('keep_prefix', False)
-        keep_stage = kwargs.get('keep_stage', False)
-        restage = kwargs.get('restage', False)
-
-        fail_fast_err = 'Terminating after first install failure'
 
         # install_package defaults True and is popped so that dependencies are
         # always installed regardless of whether the root was installed
@@ -1348,11 +1827,123 @@ def install(self, **kwargs):
         if not_local:
             return
 
+        # Start the other workers of this node, which share the work queue
+        workers = kwargs.pop('workers', 0)
+        if workers:
+            self.work_queue = WorkQueue(self.spec)
+
+            helper_kwargs = dict(kwargs, install_package=install_package)
+            for _ in range(workers - 1):
+                helper = multiprocessing.Process(
+                    target=_install_worker,
+                    args=(spack.subprocess_context.PackageInstallContext(
+                        self.pkg), helper_kwargs))
+                helper.start()
+                self.helpers.append(helper)
+
         # Initialize the build task queue
         self._init_queue(install_deps, install_package)
 
+        # Download and verify binary packages ahead of their extraction
+        concurrent_builds = kwargs.get('concurrent_builds', 1)
+        if concurrent_builds > 1 and kwargs.get('use_cache', True):
+            self.prefetcher = BinaryPrefetcher(
+                concurrent_builds, unsigned=kwargs.get('unsigned', False),
+                full_hash_match=kwargs.get('full_hash_match', False))
+            for _, task in sorted(self.build_pq):
+                if self._should_prefetch(task):
+                    self.prefetcher.prefetch(task.pkg.spec)
+
+        # Download the sources of the packages to build ahead of their builds
+        fetch_jobs = kwargs.get('fetch_jobs', 1)
+        if fetch_jobs > 1 and self.work_queue is None and \
+                not kwargs.get('fake', False) and \
+                not kwargs.get('cache_only', False):
+            self.source_prefetcher = SourcePrefetcher(fetch_jobs)
+            for _, task in sorted(self.build_pq):
+                if self._should_prefetch(task) and \
+                        not self._binary_available(task, **kwargs):
+                    self.source_prefetcher.prefetch(task.pkg)
+
+        try:
+            self._install_tasks(**kwargs)
+        except BaseException:
+            # Do not leave concurrent builds running behind our back
+            self._terminate_builds()
+            for helper in self.helpers:
+                helper.terminate()
+            raise
+        finally:
+            # Every task is done, so the other workers only have to notice
+            if self.helpers:
+                self._reap_helpers(worker_join_timeout)
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+                self.prefetcher = None
+            if self.source_prefetcher is not None:
+                self.source_prefetcher.close()
+                self.source_prefetcher = None
+
+        # Cleanup, which includes releasing all of the read locks
+        self._cleanup_all_tasks()
+
+        if workers:
+            self._print_work_summary()
+            self.work_queue.remove()
+
+        if self.compiler_time_saved:
+            tty.msg('Cached compiler information saved {0} of compiler runs'
+                    .format(_hms(self.compiler_time_saved)))
+
+        # Ensure we properly report if the original/explicit pkg is failed
+        if self.pkg_id in self.failed:
+            msg = ('Installation of {0} failed.  Review log for details'
+                   .format(self.pkg_id))
+            raise InstallError(msg)
+
+    install.__doc__ += install_args_docstring
+
+    def _print_work_summary(self):
+        """Report the packages built by each worker sharing the work queue."""
+        summary = self.work_queue.summary()
+        lines = []
+        for worker, builds in sorted(summary.items()):
+            built = ', '.join(
+                '{0}{1} [{2}]'.format(
+                    name, ' (failed)' if status == STATUS_FAILED else '',
+                    _hms(seconds))
+                for name, status, seconds in builds)
+            lines.append('{0}: {1}'.format(worker, built))
+        tty.msg('Packages built by {0} workers'.format(len(summary)), *lines)
+
+    def _install_tasks(self, **kwargs):
+        """
+        Process the build tasks until the queue is empty and all of the
+        concurrent builds are done.
+
+        Args:"""
+
+        concurrent_builds = kwargs.get('concurrent_builds', 1)
+        fail_fast = kwargs.get('fail_fast', False)
+        keep_prefix = kwargs.get('keep_prefix', False)
+        keep_stage = kwargs.get('keep_stage', False)
+        restage = kwargs.get('restage', False)
+
         # Proceed with the installation
-        while self.build_pq:
+        while self.build_pq or self.building:
+            # Collect the concurrent builds that are done, waiting for one
+            # when there is no room for, or nothing ready for, another build.
+            if self.building:
+                block = len(self.building) >= concurrent_builds or not any(
+                    t.priority == 0 for t in self.build_tasks.values())
+                for pkg_id in self._wait_for_builds(block):
+                    self._run_task_step(
+                        self.building[pkg_id][0],
+                        lambda: self._finish_build(pkg_id),
+                        keep_prefix, fail_fast)
+                if block:
+                    continue
+
             task = self._pop_task()
             if task is None:
                 continue
@@ -1399,6 +1990,12 @@ def install(self, **kwargs):
 
                 continue
 
+            # Leave the spec to any other worker building it as long as this
+            # one has something else to do.
+            if self.work_queue is not None and not self._claim_task(task):
+                self._requeue_task(task)
+                continue
+
             # Attempt to get a write lock.  If we can't get the lock then
             # another process is likely (un)installing the spec or has
             # determined the spec has already been installed (though the
@@ -1417,6 +2014,10 @@ def install(self, **kwargs):
                 self._requeue_task(task)
                 continue
 
+            # Do not touch the stage while its sources are being fetched
+            if self.source_prefetcher is not None:
+                self._wait_for_sources(task)
+
             # Determine state of installation artifacts and adjust accordingly.
             self._prepare_for_install(task, keep_prefix, keep_stage,
                                       restage)
@@ -1461,8 +2062,22 @@ def install(self, **kwargs):
                 self._requeue_task(task)
                 continue
 
+            # Record this worker as building the spec, taking it over from
+            # any other worker that claimed it but no longer holds its lock.
+            if self.work_queue is not None and \
+                    spec.dag_hash() not in self.work_queue.claimed:
+                self.work_queue.claim(spec, force=True)
+
             # Proceed with the installation since we have an exclusive write
             # lock on the package.
+            if concurrent_builds > 1 and \
+                    pkg.spec.dag_hash() not in self.overwrite:
+                self._run_task_step(
+                    task,
+                    lambda: self._start_build(task, **kwargs),
+                    keep_prefix, fail_fast)
+                continue
+
             try:
                 if pkg.spec.dag_hash() in self.overwrite:
                     rec, _ = self._check_db(pkg.spec)
@@ -1504,16 +2119,7 @@ def install(self, **kwargs):
             except (Exception, SystemExit) as exc:
                 # Best effort installs suppress the exception and mark the
                 # package as a failure UNLESS this is the explicit package.
-                if (not isinstance(exc, spack.error.SpackError) or
-                    not exc.printed):
-                    # SpackErrors can be printed by the build process or at
-                    # lower levels -- skip printing if already printed.
-                    # TODO: sort out this and SpackEror.print_context()
-                    err = 'Failed to install {0} due to {1}: {2}'
-                    tty.error(
-                        err.format(pkg.name, exc.__class__.__name__, str(exc)))
-
-                self._update_failed(task, True, exc)
+                self._flag_install_failure(task, exc)
 
                 if fail_fast:
                     # The user requested the installation to terminate on
@@ -1539,16 +2145,7 @@ def install(self, **kwargs):
             # include downgrading the write to a read lock
             self._cleanup_task(pkg)
 
-        # Cleanup, which includes releasing all of the read locks
-        self._cleanup_all_tasks()
-
-        # Ensure we properly report if the original/explicit pkg is failed
-        if self.pkg_id in self.failed:
-            msg = ('Installation of {0} failed.  Review log for details'
-                   .format(self.pkg_id))
-            raise InstallError(msg)
-
-    install.__doc__ += install_args_docstring
+    _install_tasks.__doc__ += install_args_docstring
 
     # Helper method to "smooth" the transition from the
     # spack.package.PackageBase class
@@ -1660,15 +2257,49 @@ def build_process(pkg, kwargs):
 
     tty.debug('{0} Successfully installed {1}'
               .format(pre, pkg_id),
-              'Fetch: {0}.  Build: {1}.  Total: {2}.'
-              .format(_hms(pkg._fetch_time), _hms(build_time),
-                      _hms(pkg._total_time)))
+              'Environment setup: {0}.  Fetch: {1}.  Build: {2}.  '
+              'Total: {3}.'
+              .format(_hms(pkg._setup_time), _hms(pkg._fetch_time),
+                      _hms(build_time), _hms(pkg._total_time)))
     _print_installed_pkg(pkg.prefix)
 
     # preserve verbosity across runs
     return echo
 
 
+def extract_process(pkg, kwargs):
+    """Extract the package from its downloaded and verified binary package,
+    and relocate it.
+
+    This runs in a separate child process, started without setting up the
+    build environment of the package, so that independent packages can be
+    extracted side by side.  The parent process registers the package in the
+    database.
+    """
+    binary_spec, tarball, verified = kwargs['binary']
+    tty.msg('Extracting {0} from binary cache'.format(package_id(pkg)))
+    binary_distribution.extract_tarball(
+        binary_spec, tarball, allow_root=False,
+        unsigned=kwargs.get('unsigned', False), force=False,
+        verified=verified)
+
+
+def _install_worker(serialized_pkg, kwargs):
+    """Install the package as an additional worker sharing the work queue.
+
+    This runs in a separate process started by PackageInstaller.install().
+    """
+    pkg = serialized_pkg.restore()
+    installer = PackageInstaller(pkg)
+    installer.work_queue = WorkQueue(pkg.spec)
+    try:
+        installer.install(**kwargs)
+    except Exception as e:
+        tty.error('Worker {0} failed: {1}'
+                  .format(installer.work_queue.worker, str(e)))
+        sys.exit(1)
+
+
 class BuildTask(object):
     """Class for representing the build task for a package."""
 
@@ -1798,6 +2429,410 @@ def spec(self):
         return self.pkg.spec
 
 
+class BinaryPrefetcher(object):
+    """
+    Binary packages downloaded and verified in threads ahead of their
+    installation.
+
+    Binary packages are fetched in the order they are asked for, which the
+    installer makes the order of its build queue, so those of the packages
+    that are ready to be installed come first.  Since the extraction of a
+    package waits for its download only, downloads and signature checks
+    overlap with the extraction of the packages they do not depend on.
+
+    Everything is downloaded and unpacked in a directory of the prefetcher,
+    which is removed with whatever is left in it when the prefetcher is
+    closed.
+    """
+
+    def __init__(self, jobs, unsigned=False, full_hash_match=False):
+        """
+        Args:
+            jobs (int): number of binary packages fetched at the same time
+            unsigned (bool): ``True`` to skip signature checks
+            full_hash_match (bool): ``True`` to only accept binary packages
+                whose full hash matches the spec
+        """
+        self.unsigned = unsigned
+        self.full_hash_match = full_hash_match
+
+        # The index of the binary mirrors is shared by the threads, which
+        # look specs up under its lock, so make sure it is up to date
+        # before they start.
+        binary_distribution.binary_index.regenerate_spec_cache()
+
+        self.pool = ThreadPool(jobs)
+
+        # Pending or finished fetches, keyed on the spec's DAG hash
+        self.fetches = {}
+
+        self.path = tempfile.mkdtemp(
+            prefix='binaries-', dir=spack.stage.get_stage_root())
+
+    def _fetch(self, spec):
+        """Download and verify the binary package of the spec, if any.
+
+        This runs in one of the threads of the pool.
+        """
+        matches = binary_distribution.get_mirrors_for_spec(
+            spec, force=False, full_hash_match=self.full_hash_match)
+        if not matches:
+            return None
+
+        # As for sequential installs, any match will do.
+        preferred_mirrors = [match['mirror_url'] for match in matches]
+        binary_spec = matches[0]['spec']
+        download_dir = tempfile.mkdtemp(dir=self.path)
+        tarball = binary_distribution.download_tarball(
+            binary_spec, preferred_mirrors=preferred_mirrors,
+            path=download_dir)
+        # see #10063 : install from source if tarball doesn't exist
+        if tarball is None:
+            tty.msg('{0} exists in binary cache but with different hash'
+                    .format(spec.name))
+            return None
+
+        verified = binary_distribution.verify_tarball(
+            binary_spec, tarball, unsigned=self.unsigned,
+            tmp_root=download_dir)
+        return binary_spec, tarball, verified
+
+    def prefetch(self, spec):
+        """Start fetching the binary package of the spec.
+
+        Args:
+            spec (Spec): the concrete spec to be installed
+        """
+        dag_hash = spec.dag_hash()
+        if dag_hash not in self.fetches:
+            self.fetches[dag_hash] = self.pool.apply_async(
+                self._fetch, (spec,))
+
+    def get(self, spec):
+        """Wait for the binary package of the spec to be fetched.
+
+        Specs that were not prefetched are fetched now.
+
+        Args:
+            spec (Spec): the concrete spec to be installed
+
+        Return:
+            (tuple) the spec, path, and result of
+                ``binary_distribution.verify_tarball()`` for the binary
+                package, or ``None`` if there is no binary for the spec.
+
+        Raises:
+            Any error from downloading or verifying the binary package
+        """
+        self.prefetch(spec)
+        return self.fetches.pop(spec.dag_hash()).get()
+
+    def close(self):
+        """Stop fetching binary packages, and remove those not installed,
+        including the partial downloads."""
+        self.pool.terminate()
+        self.pool.join()
+        self.fetches.clear()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class SourcePrefetcher(object):
+    """
+    Sources of packages downloaded and checked in threads ahead of their
+    builds.
+
+    Each package is fetched as by ``PackageBase.do_fetch()``, so its
+    archive, resources and patches are left in its stage and in the source
+    cache, where the build of the package finds them.  The downloads from
+    each host are limited by ``fetch_strategy.max_downloads_per_host``.
+
+    Only URL downloads are prefetched: version control fetchers and archived
+    patches change the working directory of the whole process, so they are
+    left to the build.
+    """
+
+    def __init__(self, jobs):
+        """
+        Args:
+            jobs (int): number of packages fetched at the same time
+        """
+        self.pool = ThreadPool(jobs)
+
+        # Pending or finished fetches, keyed on the spec's DAG hash
+        self.fetches = {}
+
+        # Set when closing, so that the fetches not started are skipped
+        self.closed = False
+
+    @staticmethod
+    def _can_prefetch(pkg):
+        """Whether the package has sources to fetch which do not need the
+        user's confirmation, and which can be fetched in a thread."""
+        if not pkg.has_code or not pkg.stage.managed_by_spack:
+            return False
+
+        if not all(spack.fetch_strategy.thread_safe(s) for s in pkg.stage):
+            return False
+
+        # Archived patches are expanded in their stage directory
+        if any(getattr(patch, 'archive_sha256', None)
+               for patch in pkg.spec.patches):
+            return False
+
+        # Fetching versions without a checksum may prompt the user
+        checksum = spack.config.get('config:checksum')
+        return not checksum or pkg.version in pkg.versions
+
+    def _fetch(self, pkg):
+        if not self.closed:
+            pkg.do_fetch()
+
+    def prefetch(self, pkg):
+        """Start fetching the sources of the package, if they do not need
+        the user's confirmation.
+
+        Args:
+            pkg (PackageBase): the package of a concrete spec
+        """
+        dag_hash = pkg.spec.dag_hash()
+        if dag_hash not in self.fetches and self._can_prefetch(pkg):
+            self.fetches[dag_hash] = self.pool.apply_async(
+                self._fetch, (pkg,))
+
+    def wait(self, pkg):
+        """Wait for the sources of the package to be fetched.
+
+        Args:
+            pkg (PackageBase): the package of a concrete spec
+
+        Return:
+            (bool) ``True`` if the sources were prefetched, ``False`` if the
+                package was not prefetched and is still to be fetched
+
+        Raises:
+            Any error from fetching or checking the sources
+        """
+        fetch = self.fetches.get(pkg.spec.dag_hash())
+        if fetch is None:
+            return False
+
+        fetch.get()
+        return True
+
+    def close(self):
+        """Stop fetching sources.
+
+        The fetches not started yet are skipped, and the ones running are
+        waited for: the threads of the pool cannot be stopped, and would
+        leave partial downloads in the stages if the process exited first.
+        """
+        self.closed = True
+        self.pool.close()
+        self.pool.join()
+        self.fetches.clear()
+
+
+def _worker_alive(worker):
+    """
+    Determine if the worker of a work queue may still be running.
+
+    Only workers on this host can be checked; the others are assumed to be
+    running.
+
+    Args:
+        worker (str): the ``<hostname>:<pid>`` identifier of the worker
+    """
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname():
+        return True
+
+    try:
+        os.kill(int(pid), 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class WorkQueue(object):
+    """
+    Build tasks shared by the installers, or workers, cooperating on the
+    installation of a spec -- possibly from different nodes sharing the
+    install tree.
+
+    A worker claims a task in the queue before taking its prefix write lock,
+    so workers pick different packages to build instead of contending for the
+    same prefix locks.  The queue is a JSON file alongside the install
+    database, only accessed under its own lock, that also records which worker
+    built what.
+    """
+
+    def __init__(self, spec):
+        """
+        Args:
+            spec (Spec): the concrete spec whose installation is shared
+        """
+        self.path = spack.store.db.work_queue_path(spec)
+        fs.mkdirp(os.path.dirname(self.path))
+        self.lock = lk.Lock(self.path + '.lock',
+                            default_timeout=spack.store.db.db_lock_timeout,
+                            desc='work queue')
+
+        # Identifier of this worker
+        self.worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+        # DAG hashes of the specs claimed by this worker
+        self.claimed = set()
+
+    def _read(self):
+        """Return the tasks in the queue, keyed on their spec's DAG hash."""
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path) as f:
+            return sjson.load(f).get('tasks', {})
+
+    def tasks(self):
+        """Return a snapshot of the tasks in the queue."""
+        self.lock.acquire_read()
+        try:
+            return self._read()
+        finally:
+            self.lock.release_read()
+
+    @contextlib.contextmanager
+    def _update(self):
+        """Context manager to modify the tasks in the queue."""
+        self.lock.acquire_write()
+        try:
+            tasks = self._read()
+            yield tasks
+            with fs.write_tmp_and_move(self.path) as f:
+                sjson.dump({'tasks': tasks}, f)
+        finally:
+            self.lock.release_write()
+
+    def _claimed_elsewhere(self, task):
+        """True if the queued task is being built by another worker."""
+        return (task is not None and task['status'] == STATUS_INSTALLING and
+                task['worker'] != self.worker and
+                _worker_alive(task['worker']))
+
+    def claimed_elsewhere(self):
+        """Return the DAG hashes of the specs other workers are building."""
+        return set(dag_hash for dag_hash, task in self.tasks().items()
+                   if self._claimed_elsewhere(task))
+
+    def claim(self, spec, force=False):
+        """
+        Claim the spec for this worker to build.
+
+        Args:
+            spec (Spec): the concrete spec to be built
+            force (bool): ``True`` to take the spec over from another worker,
+                e.g., after acquiring its prefix write lock
+
+        Return:
+            True if the spec was claimed or another worker is done with it,
+            False if another worker is building it
+        """
+        dag_hash = spec.dag_hash()
+        with self._update() as tasks:
+            task = tasks.get(dag_hash)
+            if not force and task is not None:
+                if task['worker'] != self.worker and \
+                        task['status'] != STATUS_INSTALLING:
+                    # Keep the record of the work done by the other worker
+                    return True
+
+                if self._claimed_elsewhere(task):
+                    return False
+
+            tasks[dag_hash] = {
+                'name': spec.name,
+                'worker': self.worker,
+                'status': STATUS_INSTALLING,
+                'start': time.time(),
+            }
+
+        self.claimed.add(dag_hash)
+        return True
+
+    def release(self, spec):
+        """Give up this worker's claim on the spec, if any."""
+        dag_hash = spec.dag_hash()
+        if dag_hash not in self.claimed:
+            return
+
+        self.claimed.remove(dag_hash)
+        with self._update() as tasks:
+            task = tasks.get(dag_hash)
+            if task and task['worker'] == self.worker:
+                del tasks[dag_hash]
+
+    def finish(self, spec, status):
+        """
+        Record the outcome of this worker's build of the spec.
+
+        Args:
+            spec (Spec): the concrete spec that was built
+            status (str): ``STATUS_INSTALLED`` or ``STATUS_FAILED``
+        """
+        dag_hash = spec.dag_hash()
+        if dag_hash not in self.claimed:
+            return
+
+        self.claimed.remove(dag_hash)
+        with self._update() as tasks:
+            task = tasks.get(dag_hash)
+            if task and task['worker'] == self.worker:
+                task['status'] = status
+                task['end'] = time.time()
+
+    def requeue(self, worker):
+        """
+        Put the specs claimed by a worker that is gone back in the queue.
+
+        Args:
+            worker (str): the ``<hostname>:<pid>`` identifier of the worker
+
+        Return:
+            (list) DAG hashes of the specs that were requeued
+        """
+        with self._update() as tasks:
+            requeued = [dag_hash for dag_hash, task in tasks.items()
+                        if task['worker'] == worker and
+                        task['status'] == STATUS_INSTALLING]
+            for dag_hash in requeued:
+                del tasks[dag_hash]
+        return requeued
+
+    def remove(self):
+        """Remove the queue once the installation of its spec is over."""
+        self.lock.acquire_write()
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        finally:
+            self.lock.release_write()
+
+    def summary(self):
+        """
+        Return the packages built by each worker.
+
+        Return:
+            (dict) mapping each worker to a list of (name, status, seconds)
+                tuples ordered by the start of the builds
+        """
+        summary = {}
+        tasks = sorted(self.tasks().values(), key=lambda t: t['start'])
+        for task in tasks:
+            if 'end' in task:
+                summary.setdefault(task['worker'], []).append(
+                    (task['name'], task['status'],
+                     task['end'] - task['start']))
+        return summary
+
+
 class InstallError(spack.error.SpackError):
     """Raised when something goes wrong during install or uninstall."""
 
@@ -16,6 +16,7 @@
 import traceback
 import os.path
 import operator
+from multiprocessing.pool import ThreadPool
 
 import six
 
@@ -401,7 +402,7 @@ def get_matching_versions(specs, num_versions=1):
     return matching
 
 
-def create(path, specs, skip_unstable_versions=False):
+def create(path, specs, skip_unstable_versions=False, jobs=1):
     """Create a directory to be used as a spack mirror, and fill it with
     package archives.
 
@@ -412,6 +413,9 @@ def create(path, specs, skip_unstable_versions=False):
         skip_unstable_versions: if true, this skips adding resources when
             they do not have a stable archive checksum (as determined by
             ``fetch_strategy.stable_target``)
+        jobs: number of specs added to the mirror at the same time; the
+            downloads from each host are limited by
+            ``fetch_strategy.max_downloads_per_host``
 
     Return Value:
         Returns a tuple of lists: (present, mirrored, error)
@@ -423,6 +427,9 @@ def create(path, specs, skip_unstable_versions=False):
     This routine iterates through all known package versions, and
     it creates specs for those versions.  If the version satisfies any spec
     in the specs list, it is downloaded and added to the mirror.
+    Resources already in the mirror, and matching their checksum if they
+    have one, are not downloaded again, so an interrupted run can simply
+    be restarted.
     """
     parsed = url_util.parse(path)
     mirror_root = url_util.local_file_path(parsed)
@@ -448,13 +455,54 @@ def create(path, specs, skip_unstable_versions=False):
     mirror_stats = MirrorStats()
 
     # Iterate through packages and download all safe tarballs for each
+    if jobs <= 1:
+        for spec in specs:
+            mirror_stats.next_spec(spec)
+            _add_single_spec(spec, mirror_cache, mirror_stats)
+
+        return mirror_stats.stats()
+
+    # Load the packages here, as the repository is not safe to use from
+    # several threads.  Only the specs fetched by URL are added in threads,
+    # as the other fetchers change the working directory of the process.
+    concurrent, serial = [], []
     for spec in specs:
+        (concurrent if _thread_safe(spec) else serial).append(spec)
+
+    def add_spec(spec):
+        spec_stats = MirrorStats()
+        spec_stats.next_spec(spec)
+        _add_single_spec(spec, mirror_cache, spec_stats)
+        return spec_stats
+
+    if concurrent:
+        pool = ThreadPool(jobs)
+        try:
+            for spec_stats in pool.imap_unordered(add_spec, concurrent):
+                mirror_stats.merge(spec_stats)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for spec in serial:
         mirror_stats.next_spec(spec)
         _add_single_spec(spec, mirror_cache, mirror_stats)
 
     return mirror_stats.stats()
 
 
+def _thread_safe(spec):
+    """Whether the resources and patches of the spec can be added to the
+    mirror in a thread."""
+    try:
+        stages = list(spec.package.stage)
+        stages.extend(p.stage for p in spec.package.all_patches() if p.stage)
+    except Exception:
+        # Reported when the spec is added
+        return False
+    return all(fs.thread_safe(stage) for stage in stages)
+
+
 class MirrorStats(object):
     def __init__(self):
         self.present = {}
@@ -495,6 +543,17 @@ def added(self, resource):
     def error(self):
         self.errors.add(self.current_spec)
 
+    def merge(self, other):
+        """Add the statistics of specs added to the mirror by another thread.
+        """
+        other._tally_current_spec()
+        self._tally_current_spec()
+        for spec, count in other.present.items():
+            self.present[spec] = self.present.get(spec, 0) + count
+        for spec, count in other.new.items():
+            self.new[spec] = self.new.get(spec, 0) + count
+        self.errors.update(other.errors)
+
 
 def _add_single_spec(spec, mirror, mirror_stats):
     tty.msg("Adding package {pkg} to mirror".format(
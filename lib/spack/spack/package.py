@@ -659,6 +659,7 @@ def __init__(self, spec):
         self._fetcher = None
 
         # Set up timing variables
+        self._setup_time = 0.0
         self._fetch_time = 0.0
         self._total_time = 0.0
 
@@ -363,6 +363,17 @@ def patch_for_package(self, sha256, pkg):
 
     def update_package(self, pkg_fullname):
         # remove this package from any patch entries that reference it.
+        self.remove_package(pkg_fullname)
+
+        # update the index with per-package patch indexes
+        pkg = spack.repo.get(pkg_fullname)
+        partial_index = self._index_patches(pkg)
+        for sha256, package_to_patch in partial_index.items():
+            p2p = self.index.setdefault(sha256, {})
+            p2p.update(package_to_patch)
+
+    def remove_package(self, pkg_fullname):
+        """Remove all the patches owned by a package from the cache."""
         empty = []
         for sha256, package_to_patch in self.index.items():
             remove = []
@@ -380,13 +391,6 @@ def update_package(self, pkg_fullname):
         for sha256 in empty:
             del self.index[sha256]
 
-        # update the index with per-package patch indexes
-        pkg = spack.repo.get(pkg_fullname)
-        partial_index = self._index_patches(pkg)
-        for sha256, package_to_patch in partial_index.items():
-            p2p = self.index.setdefault(sha256, {})
-            p2p.update(package_to_patch)
-
     def update(self, other):
         """Update this cache with the contents of another."""
         for sha256, package_to_patch in other.index.items():
@@ -159,11 +159,14 @@ def __init__(self, specs=None, restrict=False):
 
             self.update(spec)
 
-    def update(self, spec):
+    def update(self, spec, provided=None):
         """Update the provider index with additional virtual specs.
 
         Args:
             spec: spec potentially providing additional virtual specs
+            provided (dict): virtual specs provided by the package of
+                ``spec``, as in ``PackageBase.provided``. By default they
+                are taken from the package class.
         """
         if not isinstance(spec, spack.spec.Spec):
             spec = spack.spec.Spec(spec)
@@ -174,7 +177,9 @@ def update(self, spec):
 
         assert not spec.virtual, "cannot update an index using a virtual spec"
 
-        pkg_provided = spec.package_class.provided
+        pkg_provided = provided
+        if pkg_provided is None:
+            pkg_provided = spec.package_class.provided
         for provided_spec, provider_specs in six.iteritems(pkg_provided):
             for provider_spec in provider_specs:
                 # TODO: fix this comment.
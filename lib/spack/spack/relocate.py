@@ -2,10 +2,17 @@
 # Spack Project Developers. See the top-level COPYRIGHT file for details.
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
+import mmap
+import multiprocessing
 import os
 import platform
 import re
 import shutil
+import stat
+import struct
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
+from ordereddict_backport import OrderedDict
 
 import llnl.util.lang
 import llnl.util.tty as tty
@@ -13,8 +20,10 @@
 import macholib.mach_o
 import spack.architecture
 import spack.cmd
+import spack.config
 import spack.repo
 import spack.spec
+import spack.util.elf
 import spack.util.executable as executable
 
 
@@ -101,7 +110,8 @@ def _patchelf():
 def _elf_rpaths_for(path):
     """Return the RPATHs for an executable or a library.
 
-    The RPATHs are obtained by ``patchelf --print-rpath PATH``.
+    The RPATHs are read from the dynamic section of the file, or obtained
+    by ``patchelf --print-rpath PATH`` if it cannot be parsed.
 
     Args:
         path (str): full path to the executable or library
@@ -109,6 +119,12 @@ def _elf_rpaths_for(path):
     Return:
         RPATHs as a list of strings.
     """
+    try:
+        return spack.util.elf.get_rpaths(path)
+    except (spack.util.elf.ElfParsingError, EnvironmentError,
+            UnicodeDecodeError) as e:
+        tty.debug('Cannot read the RPATHs of {0} [{1}]'.format(path, e))
+
     # If we're relocating patchelf itself, use it
     patchelf_path = path if path.endswith("/bin/patchelf") else _patchelf()
     patchelf = executable.Executable(patchelf_path)
@@ -124,6 +140,12 @@ def _elf_rpaths_for(path):
     return output.split(':') if output else []
 
 
+def _elf_rpaths_for_binaries(binaries):
+    """Return a dictionary mapping each binary passed as argument to its
+    RPATHs."""
+    return dict((binary, _elf_rpaths_for(binary)) for binary in binaries)
+
+
 def _make_relative(reference_file, path_root, paths):
     """Return a list where any path in ``paths`` that starts with
     ``path_root`` is made relative to the directory in which the
@@ -386,11 +408,28 @@ def macholib_get_paths(cur_path):
     return (rpaths, deps, ident)
 
 
+def _set_elf_rpaths_in_place(target, rpaths):
+    """Replace the original RPATH of the target with the paths passed as
+    arguments without running ``patchelf``, which is possible when the new
+    RPATH is not longer than the original one.
+
+    Returns:
+        True if the RPATH was replaced, False otherwise
+    """
+    try:
+        return spack.util.elf.set_rpaths_in_place(target, rpaths)
+    except (spack.util.elf.ElfParsingError, EnvironmentError,
+            UnicodeDecodeError) as e:
+        tty.debug('Cannot set the RPATHs of {0} [{1}]'.format(target, e))
+        return False
+
+
 def _set_elf_rpaths(target, rpaths):
     """Replace the original RPATH of the target with the paths passed
     as arguments.
 
-    This function uses ``patchelf`` to set RPATHs.
+    The RPATH is rewritten in place when it is long enough for the new
+    paths, otherwise this function uses ``patchelf`` to set RPATHs.
 
     Args:
         target: target executable. Must be an ELF object.
@@ -398,8 +437,11 @@ def _set_elf_rpaths(target, rpaths):
 
     Returns:
         A string concatenating the stdout and stderr of the call
-        to ``patchelf``
+        to ``patchelf``, empty if it was not needed
     """
+    if _set_elf_rpaths_in_place(target, rpaths):
+        return ''
+
     # Join the paths using ':' as a separator
     rpaths_str = ':'.join(rpaths)
 
@@ -424,6 +466,24 @@ def _set_elf_rpaths(target, rpaths):
     return output
 
 
+def _set_elf_rpaths_for_binaries(binaries_to_rpaths):
+    """Replace the RPATHs of many binaries, running ``patchelf`` only for
+    those whose RPATH cannot be rewritten in place.
+
+    Args:
+        binaries_to_rpaths (dict): maps each binary to its new RPATHs
+    """
+    remaining = [
+        (target, rpaths) for target, rpaths in binaries_to_rpaths.items()
+        if not _set_elf_rpaths_in_place(target, rpaths)
+    ]
+    if remaining:
+        tty.debug('Setting the RPATHs of {0} of {1} binaries with patchelf'
+                  .format(len(remaining), len(binaries_to_rpaths)))
+    for target, rpaths in remaining:
+        _set_elf_rpaths(target, rpaths)
+
+
 def needs_binary_relocation(m_type, m_subtype):
     """Returns True if the file with MIME type/subtype passed as arguments
     needs binary relocation, False otherwise.
@@ -449,6 +509,152 @@ def needs_text_relocation(m_type, m_subtype):
     return m_type == 'text'
 
 
+#: Minimum number of files for each process relocating files in parallel
+_files_per_process = 64
+
+
+def _prefix_regex(prefixes):
+    """Returns a regular expression matching any of the prefixes, as bytes.
+
+    The prefixes are arranged in a trie, so that the common leading part of
+    the paths is matched only once, and the longest prefix is preferred.
+    """
+    trie = {}
+    for prefix in prefixes:
+        node = trie
+        for i in range(len(prefix)):
+            node = node.setdefault(prefix[i:i + 1], {})
+        node[b''] = {}
+
+    def _regex(node):
+        alternatives = [re.escape(char) + _regex(child)
+                        for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return b''
+        if len(alternatives) == 1 and b'' not in node:
+            return alternatives[0]
+        regex = b'(?:' + b'|'.join(alternatives) + b')'
+        return regex + b'?' if b'' in node else regex
+
+    return _regex(trie)
+
+
+def _mapped_file(f):
+    """Returns a memory map of a file open for reading and writing, or None
+    if the file is empty."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0)
+
+
+def _relocate_text_files(files, prefix_to_prefix):
+    """Replace the old prefixes with the new ones in text files, where they
+    are at the beginning of a path, reading each file once.
+
+    Args:
+        files (list): text files to be relocated
+        prefix_to_prefix (dict): maps the old prefixes to the new ones,
+            encoded as bytes
+    """
+    prefixes = _prefix_regex(prefix_to_prefix)
+    prescan = re.compile(prefixes)
+    # Negative lookbehind for a character legal in a path
+    # Then a match group for any characters legal in a compiler flag
+    # Then the old prefix
+    # Then characters legal in a path
+    # Ensures we only match the old prefix if it's precedeed by a flag or
+    # by characters not legal in a path, but not if it's preceeded by other
+    # components of a path.
+    pattern = re.compile(
+        b'(?<![\\w\\-_/])([\\w\\-_]*?)(' + prefixes + b')([\\w\\-_/]*)')
+
+    def replace(match):
+        return (match.group(1) + prefix_to_prefix[match.group(2)] +
+                match.group(3))
+
+    for filename in files:
+        with open(filename, 'rb+') as f:
+            mapped = _mapped_file(f)
+            if mapped is None:
+                continue
+            with closing(mapped):
+                if not prescan.search(mapped):
+                    continue
+                data = mapped[:]
+
+            ndata = pattern.sub(replace, data)
+            if ndata != data:
+                f.write(ndata)
+                f.truncate()
+
+
+def _relocate_binary_files(files, prefix_to_prefix):
+    """Replace the old prefixes with the new ones in binary files, reading
+    each file once.
+
+    The new prefixes are padded on the left with ``os.sep`` to the length
+    of the old ones, so that the size of the files does not change.
+
+    Args:
+        files (list): binary files to be relocated
+        prefix_to_prefix (dict): maps the old prefixes to the new ones,
+            encoded as bytes
+    """
+    replacements = {}
+    for old, new in prefix_to_prefix.items():
+        if len(new) > len(old):
+            raise BinaryTextReplaceError(
+                old.decode('utf-8'), new.decode('utf-8'))
+        padding = os.sep.encode('utf-8') * (len(old) - len(new))
+        replacements[old] = padding + new
+    pattern = re.compile(_prefix_regex(prefix_to_prefix))
+
+    for filename in files:
+        with open(filename, 'rb+') as f:
+            mapped = _mapped_file(f)
+            if mapped is None:
+                continue
+            with closing(mapped):
+                matches = [(m.start(), m.group())
+                           for m in pattern.finditer(mapped)]
+                for start, old in matches:
+                    mapped[start:start + len(old)] = replacements[old]
+
+
+def _relocate_files_shard(args):
+    function, files, prefix_to_prefix = args
+    function(files, prefix_to_prefix)
+
+
+def _relocate_files(function, files, prefix_to_prefix):
+    """Relocate files with one of the functions above, spreading them over
+    a pool of processes when there are enough of them."""
+    # When a prefix has several replacements, the first one is used
+    encoded = OrderedDict()
+    for old, new in prefix_to_prefix:
+        if old != new:
+            encoded.setdefault(old.encode('utf-8'), new.encode('utf-8'))
+    prefix_to_prefix = encoded
+    if not files or not prefix_to_prefix:
+        return
+
+    jobs = min(spack.config.get('config:build_jobs', 16),
+               multiprocessing.cpu_count(),
+               len(files) // _files_per_process)
+    if jobs <= 1:
+        function(files, prefix_to_prefix)
+        return
+
+    shards = [(function, files[i::jobs], prefix_to_prefix)
+              for i in range(jobs)]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pool.map(_relocate_files_shard, shards)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 def _replace_prefix_text(filename, old_dir, new_dir):
     """Replace all the occurrences of the old install prefix with a
     new install prefix in text files that are utf-8 encoded.
@@ -458,24 +664,7 @@ def _replace_prefix_text(filename, old_dir, new_dir):
         old_dir (str): directory to be searched in the file
         new_dir (str): substitute for the old directory
     """
-    # TODO: cache regexes globally to speedup computation
-    with open(filename, 'rb+') as f:
-        data = f.read()
-        f.seek(0)
-        # Replace old_dir with new_dir if it appears at the beginning of a path
-        # Negative lookbehind for a character legal in a path
-        # Then a match group for any characters legal in a compiler flag
-        # Then old_dir
-        # Then characters legal in a path
-        # Ensures we only match the old_dir if it's precedeed by a flag or by
-        # characters not legal in a path, but not if it's preceeded by other
-        # components of a path.
-        old_bytes = old_dir.encode('utf-8')
-        pat = b'(?<![\\w\\-_/])([\\w\\-_]*?)%s([\\w\\-_/]*)' % old_bytes
-        repl = b'\\1%s\\2' % new_dir.encode('utf-8')
-        ndata = re.sub(pat, repl, data)
-        f.write(ndata)
-        f.truncate()
+    _relocate_files(_relocate_text_files, [filename], [(old_dir, new_dir)])
 
 
 def _replace_prefix_bin(filename, old_dir, new_dir):
@@ -490,31 +679,7 @@ def _replace_prefix_bin(filename, old_dir, new_dir):
         old_dir (str): directory to be searched in the file
         new_dir (str): substitute for the old directory
     """
-    def replace(match):
-        occurances = match.group().count(old_dir.encode('utf-8'))
-        olen = len(old_dir.encode('utf-8'))
-        nlen = len(new_dir.encode('utf-8'))
-        padding = (olen - nlen) * occurances
-        if padding < 0:
-            return data
-        return match.group().replace(
-            old_dir.encode('utf-8'),
-            os.sep.encode('utf-8') * padding + new_dir.encode('utf-8')
-        )
-
-    with open(filename, 'rb+') as f:
-        data = f.read()
-        f.seek(0)
-        original_data_len = len(data)
-        pat = re.compile(old_dir.encode('utf-8'))
-        if not pat.search(data):
-            return
-        ndata = pat.sub(replace, data)
-        if not len(ndata) == original_data_len:
-            raise BinaryStringReplacementError(
-                filename, original_data_len, len(ndata))
-        f.write(ndata)
-        f.truncate()
+    _relocate_files(_relocate_binary_files, [filename], [(old_dir, new_dir)])
 
 
 def relocate_macho_binaries(path_names, old_layout_root, new_layout_root,
@@ -629,8 +794,8 @@ def relocate_elf_binaries(binaries, orig_root, new_root,
                           new_prefixes, rel, orig_prefix, new_prefix):
     """Relocate the binaries passed as arguments by changing their RPATHs.
 
-    Use patchelf to get the original RPATHs and then replace them with
-    rpaths in the new directory layout.
+    Read the original RPATHs and then replace them with rpaths in the new
+    directory layout.
 
     New RPATHs are determined from a dictionary mapping the prefixes in the
     old directory layout to the prefixes in the new directory layout if the
@@ -647,8 +812,8 @@ def relocate_elf_binaries(binaries, orig_root, new_root,
         orig_prefix (str): prefix where the executable was originally located
         new_prefix (str): prefix where we want to relocate the executable
     """
-    for new_binary in binaries:
-        orig_rpaths = _elf_rpaths_for(new_binary)
+    binaries_to_rpaths = {}
+    for new_binary, orig_rpaths in _elf_rpaths_for_binaries(binaries).items():
         # TODO: Can we deduce `rel` from the original RPATHs?
         if rel:
             # Get the file path in the original prefix
@@ -671,12 +836,14 @@ def relocate_elf_binaries(binaries, orig_root, new_root,
             )
             # check to see if relative rpaths are changed before rewriting
             if sorted(new_rpaths) != sorted(orig_rpaths):
-                _set_elf_rpaths(new_binary, new_rpaths)
+                binaries_to_rpaths[new_binary] = new_rpaths
         else:
             new_rpaths = _transform_rpaths(
                 orig_rpaths, orig_root, new_prefixes
             )
-            _set_elf_rpaths(new_binary, new_rpaths)
+            binaries_to_rpaths[new_binary] = new_rpaths
+
+    _set_elf_rpaths_for_binaries(binaries_to_rpaths)
 
 
 def make_link_relative(new_links, orig_links):
@@ -723,13 +890,16 @@ def make_elf_binaries_relative(new_binaries, orig_binaries, orig_layout_root):
         orig_layout_root (str): path to be used as a base for making
             RPATHs relative
     """
+    all_orig_rpaths = _elf_rpaths_for_binaries(new_binaries)
+    binaries_to_rpaths = {}
     for new_binary, orig_binary in zip(new_binaries, orig_binaries):
-        orig_rpaths = _elf_rpaths_for(new_binary)
+        orig_rpaths = all_orig_rpaths[new_binary]
         if orig_rpaths:
-            new_rpaths = _make_relative(
+            binaries_to_rpaths[new_binary] = _make_relative(
                 orig_binary, orig_layout_root, orig_rpaths
             )
-            _set_elf_rpaths(new_binary, new_rpaths)
+
+    _set_elf_rpaths_for_binaries(binaries_to_rpaths)
 
 
 def raise_if_not_relocatable(binaries, allow_root):
@@ -813,21 +983,21 @@ def relocate_text(
     # sbang was a bash script, and it lived in the spack prefix. It is
     # now a POSIX script that lives in the install prefix. Old packages
     # will have the old sbang location in their shebangs.
-    import spack.hooks.sbang as sbang
+    #
+    # Hooks are loaded as modules that are not attributes of spack.hooks,
+    # which ``import spack.hooks.sbang as sbang`` requires on Python 2.
+    from spack.hooks.sbang import sbang_shebang_line
     orig_sbang = '#!/bin/bash {0}/bin/sbang'.format(orig_spack)
-    new_sbang = sbang.sbang_shebang_line()
-
-    # Do relocations on text that refers to the install tree
-    for filename in files:
-        _replace_prefix_text(filename, orig_install_prefix, new_install_prefix)
-        for orig_dep_prefix, new_dep_prefix in new_prefixes.items():
-            _replace_prefix_text(filename, orig_dep_prefix, new_dep_prefix)
-        _replace_prefix_text(filename, orig_layout_root, new_layout_root)
+    new_sbang = sbang_shebang_line()
 
-        # Point old packages at the new sbang location. Packages that
-        # already use the new sbang location will already have been
-        # handled by the prior call to _replace_prefix_text
-        _replace_prefix_text(filename, orig_sbang, new_sbang)
+    # Do relocations on text that refers to the install tree. Point old
+    # packages at the new sbang location: packages that already use the
+    # new sbang location are handled by the replacement of the layout root.
+    prefix_to_prefix = [(orig_install_prefix, new_install_prefix)]
+    prefix_to_prefix.extend(new_prefixes.items())
+    prefix_to_prefix.append((orig_layout_root, new_layout_root))
+    prefix_to_prefix.append((orig_sbang, new_sbang))
+    _relocate_files(_relocate_text_files, files, prefix_to_prefix)
 
 
 def relocate_text_bin(
@@ -857,11 +1027,13 @@ def relocate_text_bin(
     if not new_prefix_is_shorter and len(binaries) > 0:
         raise BinaryTextReplaceError(orig_install_prefix, new_install_prefix)
 
-    for binary in binaries:
-        for old_dep_prefix, new_dep_prefix in new_prefixes.items():
-            if len(new_dep_prefix) <= len(old_dep_prefix):
-                _replace_prefix_bin(binary, old_dep_prefix, new_dep_prefix)
-        _replace_prefix_bin(binary, orig_install_prefix, new_install_prefix)
+    prefix_to_prefix = [
+        (old_dep_prefix, new_dep_prefix)
+        for old_dep_prefix, new_dep_prefix in new_prefixes.items()
+        if len(new_dep_prefix) <= len(old_dep_prefix)
+    ]
+    prefix_to_prefix.append((orig_install_prefix, new_install_prefix))
+    _relocate_files(_relocate_binary_files, binaries, prefix_to_prefix)
 
     # Note: Replacement of spack directory should not be done. This causes
     # an incorrect replacement path in the case where the install root is a
@@ -980,23 +1152,162 @@ def is_binary(filename):
     return False
 
 
-@llnl.util.lang.memoized
-def mime_type(filename):
-    """Returns the mime type and subtype of a file.
+#: Bytes that never appear in text files, as for the ``file`` command
+_non_text_bytes = bytes(bytearray(
+    list(range(0x00, 0x07)) + list(range(0x0e, 0x1b)) +
+    list(range(0x1c, 0x20)) + [0x7f]))
+
+#: Number of bytes the ``file`` command reads to tell text from binary
+_header_size = 64 * 1024
+
+#: MIME subtypes of the ELF file types
+_elf_subtypes = {
+    1: 'x-object', 2: 'x-executable', 3: 'x-sharedlib', 4: 'x-coredump'
+}
+
+#: Magic numbers of 32 and 64 bit Mach-O files in either byte order
+_macho_magics = (b'\xfe\xed\xfa\xce', b'\xfe\xed\xfa\xcf',
+                 b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe')
+
+#: MIME types of common binary data files, by magic number
+_data_magics = (
+    (b'\x1f\x8b', ('application', 'gzip')),
+    (b'BZh', ('application', 'x-bzip2')),
+    (b'\xfd7zXZ\x00', ('application', 'x-xz')),
+    (b'\x89PNG\r\n\x1a\n', ('image', 'png')),
+    (b'%PDF-', ('application', 'pdf')),
+)
+
+#: MIME subtypes of scripts, by interpreter
+_script_subtypes = {
+    'sh': 'x-shellscript', 'bash': 'x-shellscript', 'dash': 'x-shellscript',
+    'ksh': 'x-shellscript', 'zsh': 'x-shellscript', 'csh': 'x-shellscript',
+    'tcsh': 'x-shellscript', 'python': 'x-script.python', 'perl': 'x-perl',
+}
+
+
+def _script_subtype(header):
+    """Returns the MIME subtype of a script from its shebang line."""
+    words = header[2:].split(b'\n', 1)[0].decode('utf-8', 'replace').split()
+    if words and os.path.basename(words[0]) == 'env':
+        words = [w for w in words[1:] if not w.startswith('-')]
+    if not words:
+        return 'plain'
+
+    interpreter = re.match(r'[^\d.]*', os.path.basename(words[0])).group(0)
+    return _script_subtypes.get(interpreter, 'plain')
+
+
+def _mime_type_from_header(filename):
+    """Returns the MIME type and subtype of a file from its first bytes,
+    like ``file -b -h --mime-type``.
+
+    Only ELF and Mach-O binaries, ar archives, text files, scripts and a
+    few common data formats are recognized: for other files, None is
+    returned.
 
     Args:
         filename: file to be analyzed
-
-    Returns:
-        Tuple containing the MIME type and subtype
     """
+    try:
+        st = os.lstat(filename)
+        if stat.S_ISLNK(st.st_mode):
+            return 'inode', 'symlink'
+        if stat.S_ISDIR(st.st_mode):
+            return 'inode', 'directory'
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        if st.st_size == 0:
+            return 'inode', 'x-empty'
+        with open(filename, 'rb') as f:
+            header = f.read(_header_size)
+    except (IOError, OSError):
+        return None
+
+    if header.startswith(b'\x7fELF') and len(header) >= 18:
+        byte_order = '<' if header[5:6] == b'\x01' else '>'
+        e_type = struct.unpack(byte_order + 'H', header[16:18])[0]
+        subtype = _elf_subtypes.get(e_type)
+        return ('application', subtype) if subtype else None
+
+    if header[:4] in _macho_magics:
+        return 'application', 'x-mach-binary'
+
+    # Universal binaries share their magic number with Java class files,
+    # which have a much larger number where the number of archs would be
+    if header[:4] == b'\xca\xfe\xba\xbe' and len(header) >= 8:
+        narchs = struct.unpack('>I', header[4:8])[0]
+        return ('application', 'x-mach-binary') if narchs < 32 else None
+
+    if header.startswith(b'!<arch>\n'):
+        return 'application', 'x-archive'
+
+    if len(header.translate(None, _non_text_bytes)) < len(header):
+        for magic, m_type in _data_magics:
+            if header.startswith(magic):
+                return m_type
+
+        # Python bytecode starts with a version dependent number and CRLF
+        if header[2:4] == b'\r\n':
+            return 'application', 'x-bytecode.python'
+        return None
+
+    if header.startswith(b'#!'):
+        return 'text', _script_subtype(header)
+    return 'text', 'plain'
+
+
+def _file_mime_type(filename):
+    """Returns the MIME type and subtype of a file using ``file``."""
     file_cmd = executable.Executable('file')
     output = file_cmd(
         '-b', '-h', '--mime-type', filename, output=str, error=str)
-    tty.debug('[MIME_TYPE] {0} -> {1}'.format(filename, output.strip()))
     # In corner cases the output does not contain a subtype prefixed with a /
     # In those cases add the / so the tuple can be formed.
     if '/' not in output:
         output += '/'
     split_by_slash = output.strip().split('/')
     return split_by_slash[0], "/".join(split_by_slash[1:])
+
+
+@llnl.util.lang.memoized
+def mime_type(filename):
+    """Returns the mime type and subtype of a file.
+
+    Common file types are recognized from the first bytes of the file, the
+    ``file`` command is run only for the others.
+
+    Args:
+        filename: file to be analyzed
+
+    Returns:
+        Tuple containing the MIME type and subtype
+    """
+    m_type = _mime_type_from_header(filename) or _file_mime_type(filename)
+    tty.debug('[MIME_TYPE] {0} -> {1}'.format(filename, '/'.join(m_type)))
+    return m_type
+
+
+def mime_types(filenames, jobs=None):
+    """Returns the mime type and subtype of many files, analyzing them with
+    several threads.
+
+    Args:
+        filenames (list): files to be analyzed
+        jobs (int): number of threads, ``build_jobs`` from the configuration
+            by default
+
+    Returns:
+        Dictionary mapping each file to its MIME type and subtype
+    """
+    jobs = min(jobs or spack.config.get('config:build_jobs', 16),
+               len(filenames))
+    if jobs <= 1:
+        return dict((f, mime_type(f)) for f in filenames)
+
+    pool = ThreadPool(jobs)
+    try:
+        return dict(zip(filenames, pool.map(mime_type, filenames)))
+    finally:
+        pool.close()
+        pool.join()
@@ -10,6 +10,7 @@
 import functools
 import inspect
 import itertools
+import multiprocessing
 import os
 import re
 import shutil
@@ -39,6 +40,7 @@
 import spack.util.imp as simp
 import spack.provider_index
 import spack.util.path
+import spack.util.package_metadata
 import spack.util.naming as nm
 
 #: Super-namespace for all packages.
@@ -231,17 +233,38 @@ def update_package(self, pkg_name):
             pkg_name (str): name of the package to be removed from the index
 
         """
-        package = path.get(pkg_name)
+        metadata = spack.util.package_metadata.get_metadata(pkg_name)
 
         # Remove the package from the list of packages, if present
+        self.remove_package(pkg_name)
+
+        # Add it again under the appropriate tags
+        for tag in metadata.tags:
+            tag = tag.lower()
+            self._tag_dict[tag].append(metadata.name)
+
+    def remove_package(self, pkg_name):
+        """Removes a package from the tag index.
+
+        Args:
+            pkg_name (str): name of the package to be removed, with or
+                without its namespace
+        """
+        # Tags are stored with the short package name
+        pkg_name = pkg_name.rpartition('.')[2]
         for pkg_list in self._tag_dict.values():
             if pkg_name in pkg_list:
                 pkg_list.remove(pkg_name)
 
-        # Add it again under the appropriate tags
-        for tag in getattr(package, 'tags', []):
-            tag = tag.lower()
-            self._tag_dict[tag].append(package.name)
+    def merge(self, other):
+        """Merge another tag index into this one.
+
+        Args:
+            other (TagIndex): tag index to be merged
+        """
+        for tag, pkgs in other.items():
+            pkg_list = self._tag_dict[tag]
+            pkg_list.extend(p for p in pkgs if p not in pkg_list)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -271,6 +294,17 @@ def needs_update(self, pkg):
         """
         return False
 
+    def sources_mtime(self):
+        """Latest modification time of files besides the package files
+        that the whole index depends on.
+
+        Returns:
+            (float): the modification time, or ``0`` if the index only
+                depends on the package files. The whole index is rebuilt
+                when this is later than the time it was written.
+        """
+        return 0
+
     @abc.abstractmethod
     def read(self, stream):
         """Read this index from a provided file object."""
@@ -279,6 +313,14 @@ def read(self, stream):
     def update(self, pkg_fullname):
         """Update the index in memory with information about a package."""
 
+    @abc.abstractmethod
+    def remove(self, pkg_fullname):
+        """Remove information about a package from the index in memory."""
+
+    @abc.abstractmethod
+    def merge(self, other):
+        """Merge the index of another indexer of the same type into ours."""
+
     @abc.abstractmethod
     def write(self, stream):
         """Write the index to a file object."""
@@ -289,12 +331,21 @@ class TagIndexer(Indexer):
     def _create(self):
         return TagIndex()
 
+    def sources_mtime(self):
+        return spack.util.package_metadata.sources_mtime()
+
     def read(self, stream):
         self.index = TagIndex.from_json(stream)
 
     def update(self, pkg_fullname):
         self.index.update_package(pkg_fullname)
 
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, other):
+        self.index.merge(other.index)
+
     def write(self, stream):
         self.index.to_json(stream)
 
@@ -304,12 +355,22 @@ class ProviderIndexer(Indexer):
     def _create(self):
         return spack.provider_index.ProviderIndex()
 
+    def sources_mtime(self):
+        return spack.util.package_metadata.sources_mtime()
+
     def read(self, stream):
         self.index = spack.provider_index.ProviderIndex.from_json(stream)
 
     def update(self, pkg_fullname):
+        metadata = spack.util.package_metadata.get_metadata(pkg_fullname)
+        self.index.remove_provider(pkg_fullname)
+        self.index.update(pkg_fullname, provided=metadata.provided_specs)
+
+    def remove(self, pkg_fullname):
         self.index.remove_provider(pkg_fullname)
-        self.index.update(pkg_fullname)
+
+    def merge(self, other):
+        self.index.merge(other.index)
 
     def write(self, stream):
         self.index.to_json(stream)
@@ -336,6 +397,64 @@ def write(self, stream):
     def update(self, pkg_fullname):
         self.index.update_package(pkg_fullname)
 
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, other):
+        self.index.update(other.index)
+
+
+class MetadataIndexer(Indexer):
+    """Lifecycle methods for statically extracted package metadata."""
+    def _create(self):
+        return spack.util.package_metadata.PackageMetadataIndex()
+
+    def sources_mtime(self):
+        return spack.util.package_metadata.sources_mtime()
+
+    def read(self, stream):
+        self.index = spack.util.package_metadata.PackageMetadataIndex.\
+            from_json(stream)
+
+    def update(self, pkg_fullname):
+        self.index.update_package(pkg_fullname)
+
+    def remove(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname)
+
+    def merge(self, other):
+        self.index.merge(other.index)
+
+    def write(self, stream):
+        self.index.to_json(stream)
+
+
+def _index_packages(args):
+    """Build partial indexes for a shard of packages in a worker process.
+
+    Arguments:
+        args (tuple): ``(indexer_types, pkg_fullnames)``, where
+            ``indexer_types`` is a list of ``(name, indexer class)`` pairs
+
+    Returns:
+        (dict): serialized partial index for each indexer name
+    """
+    indexer_types, pkg_fullnames = args
+
+    partials = {}
+    with spack.util.package_metadata.reuse_records():
+        for name, indexer_cls in indexer_types:
+            indexer = indexer_cls()
+            indexer.create()
+            for pkg_fullname in pkg_fullnames:
+                indexer.update(pkg_fullname)
+
+            stream = six.StringIO()
+            indexer.write(stream)
+            partials[name] = stream.getvalue()
+
+    return partials
+
 
 class RepoIndex(object):
     """Container class that manages a set of Indexers for a Repo.
@@ -379,11 +498,26 @@ def __getitem__(self, name):
             raise KeyError('no such index: %s' % name)
 
         if name not in self.indexes:
-            self._build_all_indexes()
+            self._build_all_indexes(name=name)
 
         return self.indexes[name]
 
-    def _build_all_indexes(self):
+    def update(self, jobs=1):
+        """Bring all the indexes up to date.
+
+        Arguments:
+            jobs (int): number of worker processes used to load stale
+                packages. With more than one job, packages are sharded
+                across a process pool and the partial indexes are merged
+                back into the cached ones.
+
+        Returns:
+            (list): names of the packages that were reindexed
+        """
+        self.indexes = {}
+        return self._build_all_indexes(jobs)
+
+    def _build_all_indexes(self, jobs=1, name=None):
         """Build all the indexes at once.
 
         We regenerate *all* indexes whenever *any* index needs an update,
@@ -392,25 +526,110 @@ def _build_all_indexes(self):
         rather only pay that cost once rather than on several
         invocations.
 
+        If nothing needs an update and ``name`` is given, only that index
+        is read from the cache.
         """
-        for name, indexer in self.indexers.items():
-            self.indexes[name] = self._build_index(name, indexer)
+        needs_update = dict(
+            (n, self._needs_update(n)) for n in self.indexers
+        )
+        stale = set(itertools.chain.from_iterable(needs_update.values()))
+        stale = [x for x in self.checker if x in stale]
+
+        indexers = self.indexers
+        if not stale and name is not None:
+            indexers = {name: self.indexers[name]}
+
+        partials = None
+        if jobs > 1 and len(stale) > 1:
+            partials = self._index_in_parallel(stale, jobs)
+
+        with spack.util.package_metadata.reuse_records():
+            for n, indexer in indexers.items():
+                if partials is None:
+                    index = self._build_index(n, indexer, needs_update[n])
+                else:
+                    index = self._build_index(
+                        n, indexer, stale, partials[n])
+                self.indexes[n] = index
 
-    def _build_index(self, name, indexer):
-        """Determine which packages need an update, and update indexes."""
+        return stale
 
-        # Filename of the provider index cache (we assume they're all json)
-        cache_filename = '{0}/{1}-index.json'.format(name, self.namespace)
+    def _cache_filename(self, name):
+        # Filename of the index cache (we assume they're all json)
+        return '{0}/{1}-index.json'.format(name, self.namespace)
 
-        # Compute which packages needs to be updated in the cache
+    def _needs_update(self, name):
+        """Names of the packages that changed since the index was written."""
         misc_cache = spack.caches.misc_cache
-        index_mtime = misc_cache.mtime(cache_filename)
+        index_mtime = misc_cache.mtime(self._cache_filename(name))
+
+        if self.indexers[name].sources_mtime() > index_mtime:
+            return list(self.checker)
 
-        needs_update = [
+        return [
             x for x, sinfo in self.checker.items()
             if sinfo.st_mtime > index_mtime
         ]
 
+    def _index_in_parallel(self, pkg_names, jobs):
+        """Index packages in a pool of worker processes.
+
+        Returns a dictionary mapping each indexer name to an indexer
+        holding the merged partial index for ``pkg_names``, or ``None``
+        if packages can't be indexed in parallel on this platform.
+        """
+        # Workers rely on inheriting the configured repositories, so
+        # they must be forked from this process rather than spawned.
+        get_start_method = getattr(
+            multiprocessing, 'get_start_method', lambda: 'fork')
+        if get_start_method() != 'fork':
+            tty.debug('Cannot index packages in parallel with the "{0}" '
+                      'start method'.format(get_start_method()))
+            return None
+
+        jobs = min(jobs, len(pkg_names))
+        fullnames = ['%s.%s' % (self.namespace, x) for x in pkg_names]
+        indexer_types = [
+            (name, type(indexer)) for name, indexer in self.indexers.items()
+        ]
+
+        # Contiguous shards keep the merged indexes in the same order
+        # a sequential build would produce
+        size = (len(fullnames) + jobs - 1) // jobs
+        shards = [
+            (indexer_types, fullnames[i:i + size])
+            for i in range(0, len(fullnames), size)
+        ]
+
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(_index_packages, shards)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        partials = {}
+        for name, indexer_cls in indexer_types:
+            partial = indexer_cls()
+            partial.create()
+            for result in results:
+                shard = indexer_cls()
+                shard.read(six.StringIO(result[name]))
+                partial.merge(shard)
+            partials[name] = partial
+
+        return partials
+
+    def _build_index(self, name, indexer, needs_update, partial=None):
+        """Update an index with the packages that need an update.
+
+        If ``partial`` is given, it is an indexer already holding the
+        up-to-date entries for ``needs_update``, which are merged into the
+        cached index instead of loading each package here.
+        """
+        cache_filename = self._cache_filename(name)
+        misc_cache = spack.caches.misc_cache
+
         index_existed = misc_cache.init_entry(cache_filename)
         if index_existed and not needs_update:
             # If the index exists and doesn't need an update, read it
@@ -424,7 +643,13 @@ def _build_index(self, name, indexer):
 
                 for pkg_name in needs_update:
                     namespaced_name = '%s.%s' % (self.namespace, pkg_name)
-                    indexer.update(namespaced_name)
+                    if partial is None:
+                        indexer.update(namespaced_name)
+                    else:
+                        indexer.remove(namespaced_name)
+
+                if partial is not None:
+                    indexer.merge(partial)
 
                 indexer.write(new)
 
@@ -653,6 +878,11 @@ def get_pkg_class(self, pkg_name):
         """Find a class for the spec's package and return the class object."""
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
+    def get_pkg_metadata(self, pkg_name, cached=False):
+        """Get the metadata of a package, without importing it if possible.
+        """
+        return self.repo_for_pkg(pkg_name).get_pkg_metadata(pkg_name, cached)
+
     @autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -747,6 +977,7 @@ def check(condition, msg):
 
         # Indexes for this repository, computed lazily
         self._repo_index = None
+        self._metadata_repo_index = None
 
         # make sure the namespace for packages in this repo exists.
         self._create_namespace()
@@ -938,20 +1169,52 @@ def index(self):
         """Construct the index for this repo lazily."""
         if self._repo_index is None:
             self._repo_index = RepoIndex(self._pkg_checker, self.namespace)
-            self._repo_index.add_indexer('providers', ProviderIndexer())
-            self._repo_index.add_indexer('tags', TagIndexer())
             self._repo_index.add_indexer('patches', PatchIndexer())
         return self._repo_index
 
+    @property
+    def metadata_repo_index(self):
+        """Construct the indexes built from package metadata lazily.
+
+        This is separate from ``index`` so that building the metadata,
+        provider and tag indexes does not require importing every
+        package in the repo.
+        """
+        if self._metadata_repo_index is None:
+            self._metadata_repo_index = RepoIndex(
+                self._pkg_checker, self.namespace)
+            self._metadata_repo_index.add_indexer(
+                'metadata', MetadataIndexer())
+            self._metadata_repo_index.add_indexer(
+                'providers', ProviderIndexer())
+            self._metadata_repo_index.add_indexer('tags', TagIndexer())
+        return self._metadata_repo_index
+
+    def update_indexes(self, jobs=1):
+        """Bring all the indexes of this repo up to date.
+
+        Returns:
+            (list): names of the packages that were reindexed
+        """
+        updated = set()
+        for repo_index in (self.index, self.metadata_repo_index):
+            updated.update(repo_index.update(jobs=jobs))
+        return sorted(updated)
+
     @property
     def provider_index(self):
         """A provider index with names *specific* to this repo."""
-        return self.index['providers']
+        return self.metadata_repo_index['providers']
+
+    @property
+    def metadata_index(self):
+        """Index of package metadata extracted from package files."""
+        return self.metadata_repo_index['metadata']
 
     @property
     def tag_index(self):
         """Index of tags and which packages they're defined on."""
-        return self.index['tags']
+        return self.metadata_repo_index['tags']
 
     @property
     def patch_index(self):
@@ -1087,6 +1350,28 @@ def get_pkg_class(self, pkg_name):
 
         return cls
 
+    def get_pkg_metadata(self, pkg_name, cached=False):
+        """Get the ``PackageMetadata`` record of a package.
+
+        This only imports packages whose metadata can't be extracted
+        statically. With ``cached=True``, records come from the metadata
+        index, which is faster when looking up many packages, and
+        packages are only imported when the index is out of date.
+        """
+        namespace, _, pkg_name = pkg_name.rpartition('.')
+        if namespace and (namespace != self.namespace):
+            raise InvalidNamespaceError('Invalid namespace for %s repo: %s'
+                                        % (self.namespace, namespace))
+
+        if not self.exists(pkg_name):
+            raise UnknownPackageError(pkg_name, self)
+
+        if cached:
+            return self.metadata_index[pkg_name]
+
+        return spack.util.package_metadata.get_metadata(
+            '%s.%s' % (self.namespace, pkg_name), repo=self)
+
     def __str__(self):
         return "[Repo '%s' at '%s']" % (self.namespace, self.root)
 
@@ -73,6 +73,10 @@
             'misc_cache': {'type': 'string'},
             'connect_timeout': {'type': 'integer', 'minimum': 0},
             'verify_ssl': {'type': 'boolean'},
+            'url_fetch_method': {
+                'type': 'string',
+                'enum': ['curl', 'native']
+            },
             'suppress_gpg_warnings': {'type': 'boolean'},
             'install_missing_compilers': {'type': 'boolean'},
             'debug': {'type': 'boolean'},
@@ -83,6 +87,11 @@
             'build_jobs': {'type': 'integer', 'minimum': 1},
             'ccache': {'type': 'boolean'},
             'db_lock_timeout': {'type': 'integer', 'minimum': 1},
+            'db_lazy_load': {'type': 'boolean'},
+            'db_format': {
+                'type': 'string',
+                'enum': ['json', 'journal']
+            },
             'package_lock_timeout': {
                 'anyOf': [
                     {'type': 'integer', 'minimum': 1},
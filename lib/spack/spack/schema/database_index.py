@@ -52,6 +52,7 @@
                     },
                 },
                 'version': {'type': 'string'},
+                'index_id': {'type': 'string'},
             }
         },
     },
@@ -476,7 +476,8 @@ def print_errors(errors):
             try:
                 fetcher.stage = self
                 self.fetcher = fetcher
-                self.fetcher.fetch()
+                with fs.download_slot(fetcher):
+                    self.fetcher.fetch()
                 break
             except spack.fetch_strategy.NoCacheError:
                 # Don't bother reporting when something is not cached.
@@ -568,17 +569,17 @@ def cache_mirror(self, mirror, stats):
             not fs.stable_target(self.default_fetcher)):
             return
 
-        absolute_storage_path = os.path.join(
-            mirror.root, self.mirror_paths.storage_path)
+        storage_path = self.mirror_paths.storage_path
+        absolute_storage_path = os.path.join(mirror.root, storage_path)
 
-        if os.path.exists(absolute_storage_path):
-            stats.already_existed(absolute_storage_path)
-        else:
-            self.fetch()
-            self.check()
-            mirror.store(
-                self.fetcher, self.mirror_paths.storage_path)
-            stats.added(absolute_storage_path)
+        with mirror.lock(storage_path):
+            if mirror.contains(self.default_fetcher, storage_path):
+                stats.already_existed(absolute_storage_path)
+            else:
+                self.fetch()
+                self.check()
+                mirror.store(self.fetcher, storage_path)
+                stats.added(absolute_storage_path)
 
         mirror.symlink(self.mirror_paths)
 
@@ -15,6 +15,10 @@
 import spack.repo
 import spack.store
 import spack.binary_distribution as bindist
+import spack.database
+import spack.hash_types as ht
+import spack.util.spack_json as sjson
+import spack.version
 import spack.cmd.buildcache as buildcache
 import spack.cmd.install as install
 import spack.cmd.uninstall as uninstall
@@ -22,6 +26,7 @@
 from spack.main import SpackCommand
 import spack.mirror
 import spack.util.gpg
+from llnl.util.filesystem import mkdirp
 from spack.directory_layout import YamlDirectoryLayout
 from spack.spec import Spec
 
@@ -622,3 +627,166 @@ def test_spec_needs_rebuild(install_mockery_mutable_config, mock_packages,
     rebuild = bindist.needs_rebuild(s, mirror_url, rebuild_on_errors=True)
 
     assert rebuild
+
+
+def test_specs_needing_rebuild(mock_packages, config, monkeypatch, tmpdir):
+    """Check a few thousand specs against a mirror whose index is not up to
+    date, and make sure that only the specs the index cannot tell about are
+    checked against their spec.yaml files"""
+    num_specs = 2000
+    libelf = Spec('libelf').concretized()
+    specs = []
+    for i in range(num_specs):
+        spec = libelf.copy(caches=False)
+        spec.versions = spack.version.VersionList(['1.%d' % i])
+        specs.append(spec)
+
+    # Some specs were never built, some were pushed after the index was
+    # generated, and some were rebuilt since then or need to be rebuilt.
+    unbuilt = set(range(0, num_specs, 100))
+    pushed_later = set(range(num_specs - 100, num_specs)) - unbuilt
+    rebuilt = set(range(25, num_specs - 100, 100))
+    outdated = set(range(50, num_specs - 100, 100))
+
+    mirror_dir = tmpdir.join('mirror')
+    cache_prefix = bindist.build_cache_prefix(str(mirror_dir))
+    mkdirp(cache_prefix)
+    installs = {}
+    for i, spec in enumerate(specs):
+        if i in unbuilt:
+            continue
+        full_hash = spec.full_hash()
+        spec_yaml = spec.to_yaml(hash=ht.build_hash)
+        if i in outdated:
+            spec_yaml = spec_yaml.replace(full_hash, fake_full_hash(spec))
+        spec_yaml_path = os.path.join(
+            cache_prefix, bindist.tarball_name(spec, '.spec.yaml'))
+        with open(spec_yaml_path, 'w') as f:
+            f.write(spec_yaml)
+
+        if i not in pushed_later:
+            node = spec.node_dict_with_hashes(hash=ht.build_hash)
+            if i in rebuilt or i in outdated:
+                node[spec.name]['full_hash'] = fake_full_hash(spec)
+            installs[spec.dag_hash()] = {'spec': node, 'ref_count': 0}
+
+    index = sjson.dump({'database': {'installs': installs, 'version': '5'}})
+    with open(os.path.join(cache_prefix, 'index.json'), 'w') as f:
+        f.write(index)
+    with open(os.path.join(cache_prefix, 'index.json.hash'), 'w') as f:
+        f.write(bindist.compute_hash(index))
+
+    monkeypatch.setattr(bindist, 'binary_index', bindist.BinaryCacheIndex(
+        str(tmpdir.join('index_cache'))))
+
+    checked = []
+    needs_rebuild = bindist.needs_rebuild
+
+    def _needs_rebuild(spec, *args):
+        checked.append(spec.dag_hash())
+        return needs_rebuild(spec, *args)
+
+    monkeypatch.setattr(bindist, 'needs_rebuild', _needs_rebuild)
+
+    mirror_url = 'file://{0}'.format(mirror_dir)
+    rebuilds = bindist.specs_needing_rebuild(
+        specs, mirror_url, rebuild_on_errors=True)
+
+    assert rebuilds == dict(
+        (spec.dag_hash(), i in unbuilt or i in outdated)
+        for i, spec in enumerate(specs))
+    not_indexed = unbuilt | pushed_later | rebuilt | outdated
+    assert sorted(checked) == sorted(specs[i].dag_hash() for i in not_indexed)
+
+
+def test_built_spec_lookup_table(mock_packages, config, tmpdir):
+    """Make sure the lookup table of a cached index is enough to know which
+    specs are on a mirror, and that only the specs that are looked up are
+    read from the index"""
+    libdwarf = Spec('libdwarf').concretized()
+    libelf = libdwarf['libelf']
+
+    mirror_dir = tmpdir.join('mirror')
+    cache_prefix = bindist.build_cache_prefix(str(mirror_dir))
+    mkdirp(cache_prefix)
+    db = spack.database.Database(
+        None, db_dir=str(tmpdir.join('db')),
+        enable_transaction_locking=False,
+        record_fields=['spec', 'ref_count'])
+    db._add(libdwarf, None)
+    with open(os.path.join(cache_prefix, 'index.json'), 'w') as f:
+        db._write_to_file(f)
+    with open(os.path.join(cache_prefix, 'index.json')) as f:
+        index_hash = bindist.compute_hash(f.read())
+    with open(os.path.join(cache_prefix, 'index.json.hash'), 'w') as f:
+        f.write(index_hash)
+
+    mirror_url = 'file://{0}'.format(mirror_dir)
+    index_cache_root = str(tmpdir.join('index_cache'))
+    with spack.config.override('mirrors', {'test': mirror_url}):
+        bindist.BinaryCacheIndex(index_cache_root).update()
+
+        # The lookup table is stored along with the cached index, and a new
+        # index reads it instead of the specs
+        binary_index = bindist.BinaryCacheIndex(index_cache_root)
+        binary_index.regenerate_spec_cache()
+        cache_key = binary_index._local_index_cache[mirror_url]['index_path']
+        assert index_hash[:10] in cache_key
+        assert os.path.exists(os.path.join(
+            index_cache_root, 'indices',
+            binary_index._lookup_table_keys(cache_key)[0]))
+        assert not binary_index._mirrors_for_spec
+        assert binary_index._associated_indices == [(mirror_url, cache_key)]
+
+        results = binary_index.find_built_spec(libdwarf)
+        assert [r['mirror_url'] for r in results] == [mirror_url]
+        assert results[0]['spec'] == libdwarf
+        assert results[0]['spec']._full_hash == libdwarf.full_hash()
+        assert list(binary_index._mirrors_for_spec) == [libdwarf.dag_hash()]
+
+        specs = binary_index.get_all_built_specs()
+        assert sorted(specs) == sorted([libdwarf, libelf])
+
+
+def test_lookup_tables_of_identical_indices(mock_packages, config, tmpdir):
+    """Make sure that mirrors with the same index have their own lookup
+    tables, so that removing one mirror doesn't break the other"""
+    libdwarf = Spec('libdwarf').concretized()
+
+    db = spack.database.Database(
+        None, db_dir=str(tmpdir.join('db')),
+        enable_transaction_locking=False,
+        record_fields=['spec', 'ref_count'])
+    db._add(libdwarf, None)
+
+    mirrors = {}
+    for name in ('first', 'second'):
+        mirror_dir = tmpdir.join(name)
+        cache_prefix = bindist.build_cache_prefix(str(mirror_dir))
+        mkdirp(cache_prefix)
+        with open(os.path.join(cache_prefix, 'index.json'), 'w') as f:
+            db._write_to_file(f)
+        with open(os.path.join(cache_prefix, 'index.json')) as f:
+            index_hash = bindist.compute_hash(f.read())
+        with open(os.path.join(cache_prefix, 'index.json.hash'), 'w') as f:
+            f.write(index_hash)
+        mirrors[name] = 'file://{0}'.format(mirror_dir)
+
+    binary_index = bindist.BinaryCacheIndex(str(tmpdir.join('index_cache')))
+    with spack.config.override('mirrors', mirrors):
+        binary_index.update()
+        results = binary_index.find_built_spec(libdwarf)
+        assert sorted(r['mirror_url'] for r in results) == sorted(
+            mirrors.values())
+
+    second = {'second': mirrors['second']}
+    with spack.config.override('mirrors', second):
+        binary_index.update()
+        results = binary_index.find_built_spec(libdwarf)
+        assert [r['mirror_url'] for r in results] == [mirrors['second']]
+
+        binary_index = bindist.BinaryCacheIndex(
+            str(tmpdir.join('index_cache')))
+        binary_index.regenerate_spec_cache()
+        results = binary_index.find_built_spec(libdwarf)
+        assert [r['mirror_url'] for r in results] == [mirrors['second']]
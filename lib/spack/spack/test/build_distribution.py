@@ -5,11 +5,16 @@
 
 import pytest
 
+import hashlib
+import io
 import os
 import os.path
+import tarfile
+from contextlib import closing
 
 import spack.spec
 import spack.binary_distribution
+import spack.util.spack_yaml as syaml
 
 install = spack.main.SpackCommand('install')
 
@@ -39,3 +44,46 @@ def test_build_tarball_overwrite(
 
         with pytest.raises(spack.binary_distribution.NoOverwriteException):
             spack.binary_distribution.build_tarball(spec, '.', unsigned=True)
+
+
+def test_build_tarball_contents(install_mockery, monkeypatch, tmpdir):
+    spec = spack.spec.Spec('trivial-install-test-package').concretized()
+    spec.package.do_install(fake=True)
+
+    prefix = spec.prefix
+    with open(prefix.bin.join('data'), 'w') as f:
+        f.write('data\n' * 100000)
+    os.link(prefix.bin.join('data'), prefix.bin.join('hardlink'))
+    os.symlink(prefix.bin.join('data'), prefix.bin.join('symlink'))
+
+    spack.binary_distribution.build_tarball(
+        spec, str(tmpdir), rel=True, unsigned=True, jobs=2)
+
+    # The .spack archive holds the compressed tarball and the spec file
+    spackfile = os.path.join(
+        spack.binary_distribution.build_cache_prefix(str(tmpdir)),
+        spack.binary_distribution.tarball_path_name(spec, '.spack'))
+    with closing(tarfile.open(spackfile)) as tar:
+        assert tar.getnames() == [
+            spack.binary_distribution.tarball_name(spec, '.tar.gz'),
+            spack.binary_distribution.tarball_name(spec, '.spec.yaml')]
+        tarball = tar.extractfile(tar.getmembers()[0]).read()
+        spec_dict = syaml.load(tar.extractfile(tar.getmembers()[1]).read())
+
+    checksum = spec_dict['binary_cache_checksum']['hash']
+    assert hashlib.sha256(tarball).hexdigest() == checksum
+
+    root = os.path.basename(prefix)
+    with closing(tarfile.open(fileobj=io.BytesIO(tarball))) as tar:
+        data = tar.getmember(os.path.join(root, 'bin', 'data'))
+        assert tar.extractfile(data).read() == b'data\n' * 100000
+        assert tar.getmember(os.path.join(root, 'bin', 'hardlink')).islnk()
+
+        # absolute links in the store are made relative with rel=True
+        symlink = tar.getmember(os.path.join(root, 'bin', 'symlink'))
+        assert symlink.linkname == 'data'
+
+        buildinfo = syaml.load(tar.extractfile(
+            os.path.join(root, '.spack', 'binary_distribution')).read())
+        assert buildinfo['relative_rpaths']
+        assert buildinfo['relocate_links'] == ['bin/symlink']
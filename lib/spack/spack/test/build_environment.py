@@ -5,6 +5,8 @@
 
 import os
 import platform
+import select
+import signal
 
 import pytest
 
@@ -339,3 +341,21 @@ def test_setting_dtags_based_on_config(
 
         dtags_to_add = modifications['SPACK_DTAGS_TO_ADD'][0]
         assert dtags_to_add.value == expected_flag
+
+
+def test_build_process_killed_child(config, mock_packages):
+    """A child that dies without sending a result must not hang the parent.
+    """
+    pkg = spack.spec.Spec('a').concretized().package
+
+    def _killed(pkg, kwargs):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    build = spack.build_environment.spawn_build_process(
+        pkg, _killed, {}, forward_stdin=False, setup=False)
+
+    # The parent's end of the pipe reports EOF once the child is gone
+    assert select.select([build], [], [], 60)[0]
+    with pytest.raises(spack.build_environment.InstallError,
+                       match='exited with code'):
+        build.complete()
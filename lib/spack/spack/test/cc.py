@@ -619,3 +619,17 @@ def test_filter_enable_new_dtags(wrapper_flags):
         result = cc(*(test_args + ['-Wl,--enable-new-dtags']), output=str)
         result = result.strip().split('\n')
         assert '-Wl,--enable-new-dtags' not in result
+
+
+def test_flags_are_not_globbed(tmpdir):
+    """Ensure wildcards in flags and paths are passed through as they are."""
+    tmpdir.ensure('match.h')
+    with tmpdir.as_cwd():
+        with set_env(SPACK_CFLAGS='-W* -DVAR=*.h',
+                     SPACK_INCLUDE_DIRS='*'):
+            check_args(
+                cc, ['-c', 'foo.c'],
+                [real_cc] +
+                ['-W*', '-DVAR=*.h'] +
+                ['-I*'] +
+                ['-c', 'foo.c'])
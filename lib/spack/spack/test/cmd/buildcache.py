@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import errno
+import multiprocessing
 import platform
 import os
 
@@ -174,3 +175,89 @@ def test_update_key_index(tmpdir, mutable_mock_env_path,
     mirror('rm', 'test-mirror')
 
     assert 'index.json' in key_dir_list
+
+
+def test_buildcache_create_concurrent(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+    """Ensure that buildcache create -j packages all specs and updates the
+    index once they are all in the mirror"""
+    monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: 4)
+    install('--fake', 'libdwarf')
+
+    buildcache('create', '-j', '4', '-d', str(tmpdir), '--unsigned',
+               '--rebuild-index', 'libdwarf')
+
+    with open(os.path.join(str(tmpdir), 'build_cache', 'index.json')) as f:
+        index = f.read()
+    for spec in Spec('libdwarf').concretized().traverse():
+        tarball_path = spack.binary_distribution.tarball_path_name(
+            spec, '.spack')
+        assert os.path.exists(
+            os.path.join(str(tmpdir), 'build_cache', tarball_path))
+        assert spec.dag_hash() in index
+
+
+def test_update_index_incremental(
+        install_mockery, mock_fetch, monkeypatch, tmpdir):
+    """Ensure that update-index --incremental only fetches the new or
+    changed spec files and drops the specs whose files were removed"""
+    install('--fake', 'libdwarf')
+    libdwarf = Spec('libdwarf').concretized()
+    libelf = libdwarf['libelf']
+
+    build_cache = os.path.join(str(tmpdir), 'build_cache')
+    buildcache('create', '-d', str(tmpdir), '--unsigned', '--only',
+               'package', '/' + libelf.dag_hash())
+    buildcache('update-index', '-d', str(tmpdir))
+
+    fetched = []
+    read_spec_yaml = spack.binary_distribution._read_spec_yaml_from_url
+
+    def _read_spec_yaml_from_url(url):
+        fetched.append(url)
+        return read_spec_yaml(url)
+
+    monkeypatch.setattr(spack.binary_distribution, '_read_spec_yaml_from_url',
+                        _read_spec_yaml_from_url)
+
+    buildcache('create', '-d', str(tmpdir), '--unsigned', '--only',
+               'package', '/' + libdwarf.dag_hash())
+    buildcache('update-index', '--incremental', '-d', str(tmpdir))
+    assert [os.path.basename(url) for url in fetched] == [
+        spack.binary_distribution.tarball_name(libdwarf, '.spec.yaml')]
+    with open(os.path.join(build_cache, 'index.json')) as f:
+        index = f.read()
+    assert libdwarf.dag_hash() in index
+    assert libelf.dag_hash() in index
+
+    # Removing the spec file of a package removes it from the index
+    del fetched[:]
+    os.remove(os.path.join(build_cache, spack.binary_distribution.tarball_name(
+        libdwarf, '.spec.yaml')))
+    buildcache('update-index', '--incremental', '-d', str(tmpdir))
+    assert not fetched
+    with open(os.path.join(build_cache, 'index.json')) as f:
+        index = f.read()
+    assert libdwarf.dag_hash() not in index
+    assert libelf.dag_hash() in index
+
+    # A spec pushed again keeps its DAG hash, but its spec file is fetched
+    # again for the new full hash
+    libelf_yaml = os.path.join(build_cache, spack.binary_distribution.
+                               tarball_name(libelf, '.spec.yaml'))
+    with open(libelf_yaml) as f:
+        contents = f.read()
+    full_hash = libelf.full_hash()
+    assert full_hash in contents
+    with open(libelf_yaml, 'w') as f:
+        f.write(contents.replace(full_hash, 'a' * len(full_hash)))
+    mtime = os.stat(libelf_yaml).st_mtime + 10
+    os.utime(libelf_yaml, (mtime, mtime))
+
+    buildcache('update-index', '--incremental', '-d', str(tmpdir))
+    assert [os.path.basename(url) for url in fetched] == [
+        os.path.basename(libelf_yaml)]
+    with open(os.path.join(build_cache, 'index.json')) as f:
+        index = f.read()
+    assert full_hash not in index
+    assert 'a' * len(full_hash) in index
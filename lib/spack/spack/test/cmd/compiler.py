@@ -9,7 +9,10 @@
 import pytest
 
 import llnl.util.filesystem
+import spack.caches
+import spack.compilers
 import spack.main
+import spack.util.file_cache
 import spack.version
 
 compiler = spack.main.SpackCommand('compiler')
@@ -282,3 +285,41 @@ def test_compiler_find_path_order(
         'f77': str(clangdir.join('first_in_path', 'gfortran-8')),
         'fc': str(clangdir.join('first_in_path', 'gfortran-8')),
     }
+
+
+def test_compiler_find_uses_detection_cache(tmpdir, monkeypatch):
+    cache = spack.util.file_cache.FileCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(spack.caches, 'detection_cache',
+                        lambda name: spack.caches.DetectionCache(cache, name))
+
+    # Each run of the compilers is logged
+    log = tmpdir.join('runs.log')
+    bin_dir = tmpdir.ensure('bin', dir=True)
+    for name in ('gcc', 'g++'):
+        script = bin_dir.join(name)
+        script.write("""\
+#!/bin/sh
+echo "$0" >> {0}
+echo 9.3.0
+""".format(log))
+        script.chmod(0o755)
+
+    def detected_specs():
+        compilers = spack.compilers.find_compilers([str(bin_dir)])
+        return set(str(c.spec) for c in compilers)
+
+    assert detected_specs() == set(['gcc@9.3.0'])
+    runs = len(log.readlines())
+    assert runs > 0
+
+    # Nothing changed, so no compiler is run again
+    assert detected_specs() == set(['gcc@9.3.0'])
+    assert len(log.readlines()) == runs
+
+    # Only the compiler that changed is run again
+    gxx = str(bin_dir.join('g++'))
+    st = os.stat(gxx)
+    os.utime(gxx, (st.st_atime, st.st_mtime + 10))
+    assert detected_specs() == set(['gcc@9.3.0'])
+    assert all(line.strip() == gxx for line in log.readlines()[runs:])
+    assert len(log.readlines()) > runs
@@ -6,6 +6,8 @@
 import os.path
 
 import spack
+import spack.caches
+import spack.util.file_cache
 from spack.spec import Spec
 from spack.cmd.external import ExternalPackageEntry
 from spack.main import SpackCommand
@@ -242,3 +244,39 @@ def test_new_entries_are_reported_correctly(
     # has been found
     output = external('find', 'gcc')
     assert 'No new external packages detected' in output
+
+
+def test_find_external_uses_detection_cache(
+        mock_executable, tmpdir, monkeypatch):
+    cache = spack.util.file_cache.FileCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(spack.caches, 'detection_cache',
+                        lambda name: spack.caches.DetectionCache(cache, name))
+
+    # Each run of the executables is logged
+    log = tmpdir.join('runs.log')
+    output = 'echo run >> {0}\necho "cmake version {1}"'
+    cmake_path1 = mock_executable(
+        'cmake', output=output.format(log, '1.foo'), subdir=('base1', 'bin'))
+    cmake_path2 = mock_executable(
+        'cmake', output=output.format(log, '3.17.2'), subdir=('base2', 'bin'))
+    system_path_to_exe = {cmake_path1: 'cmake', cmake_path2: 'cmake'}
+
+    def detected_specs():
+        pkg_to_entries = spack.cmd.external._get_external_packages(
+            [spack.repo.get('cmake')], system_path_to_exe)
+        return sorted(e.spec for e in pkg_to_entries['cmake'])
+
+    expected = [Spec('cmake@1.foo'), Spec('cmake@3.17.2')]
+    assert detected_specs() == expected
+    runs = len(log.readlines())
+    assert runs == 2
+
+    # Nothing changed, so nothing is run again
+    assert detected_specs() == expected
+    assert len(log.readlines()) == runs
+
+    # Only the executable that changed is run again
+    st = os.stat(cmake_path2)
+    os.utime(cmake_path2, (st.st_atime, st.st_mtime + 10))
+    assert detected_specs() == expected
+    assert len(log.readlines()) == runs + 1
@@ -0,0 +1,45 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import os
+
+import pytest
+
+import spack.caches
+import spack.fetch_strategy
+import spack.main
+import spack.package
+import spack.spec
+
+fetch = spack.main.SpackCommand('fetch')
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.parametrize('jobs', ['1', '4'])
+def test_fetch_dependencies(
+        jobs, install_mockery, mock_fetch_per_package, monkeypatch, tmpdir):
+    cache = spack.fetch_strategy.FsCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(spack.caches, 'fetch_cache', cache)
+
+    fetch('-D', '-j', jobs, 'mpileaks')
+
+    spec = spack.spec.Spec('mpileaks').concretized()
+    for s in spec.traverse():
+        stage = s.package.stage[0]
+        assert os.path.isfile(stage.archive_file)
+        assert os.path.isfile(
+            os.path.join(cache.root, stage.mirror_paths.storage_path))
+
+
+def test_fetch_jobs_error(install_mockery, monkeypatch):
+    def fail(pkg, mirror_only=False):
+        raise spack.fetch_strategy.FetchError(
+            'Cannot fetch {0}'.format(pkg.name))
+
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fetch', fail)
+
+    with pytest.raises(spack.fetch_strategy.FetchError,
+                       match='Cannot fetch libelf'):
+        fetch('-j', '4', 'libelf')
@@ -89,6 +89,53 @@ def test_mirror_skip_unstable(tmpdir_factory, mock_packages, config,
             set(['trivial-pkg-with-valid-hash']))
 
 
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_mirror_create_resumes(tmpdir_factory, mock_packages, config,
+                               source_for_pkg_with_hash, jobs):
+    mirror_dir = str(tmpdir_factory.mktemp('mirror-dir'))
+    spec = spack.spec.Spec('trivial-pkg-with-valid-hash').concretized()
+    mirror_paths = spack.mirror.mirror_archive_paths(
+        spec.package.fetcher[0], os.path.join(spec.name, 'archive'))
+    archive = os.path.join(mirror_dir, mirror_paths.storage_path)
+
+    present, mirrored, error = spack.mirror.create(
+        mirror_dir, [spec], jobs=jobs)
+    assert (present, mirrored, error) == ([], [spec], [])
+
+    # Archives which are in the mirror and match their checksum are kept
+    present, mirrored, error = spack.mirror.create(
+        mirror_dir, [spec], jobs=jobs)
+    assert (present, mirrored, error) == ([spec], [], [])
+
+    # Corrupted ones are fetched again
+    with open(archive, 'w') as f:
+        f.write('corrupted')
+
+    present, mirrored, error = spack.mirror.create(
+        mirror_dir, [spec], jobs=jobs)
+    assert (present, mirrored, error) == ([], [spec], [])
+    with open(archive) as f:
+        assert f.read() == spec.package.hashed_content
+
+
+def test_mirror_stats_merge():
+    a, b = spack.spec.Spec('a'), spack.spec.Spec('b')
+
+    stats = spack.mirror.MirrorStats()
+    stats.next_spec(a)
+    stats.added('/mirror/a-1.tar.gz')
+
+    other = spack.mirror.MirrorStats()
+    other.next_spec(b)
+    other.already_existed('/mirror/b-1.tar.gz')
+    other.next_spec(a)
+    other.error()
+
+    stats.merge(other)
+    present, new, errors = stats.stats()
+    assert present == [b] and new == [a] and errors == [a]
+
+
 class MockMirrorArgs(object):
     def __init__(self, specs=None, all=False, file=None,
                  versions_per_spec=None, dependencies=False,
@@ -19,6 +19,8 @@
 import spack.compilers as compilers
 import spack.spec
 import spack.util.environment
+import spack.util.file_cache
+import spack.version
 
 from spack.compiler import Compiler
 from spack.util.executable import ProcessError
@@ -960,3 +962,81 @@ def prepare_executable(name):
     # Test that null entries don't fail
     compiler.cc = None
     compiler.verify_executables()
+
+
+@pytest.fixture()
+def compiler_info_cache(tmpdir, monkeypatch):
+    """Compiler info cache in a temporary directory."""
+    cache = spack.compiler.CompilerInfoCache(
+        spack.util.file_cache.FileCache(str(tmpdir.join('cache'))))
+    monkeypatch.setattr(spack.compiler, 'info_cache', cache)
+    return cache
+
+
+def test_compiler_info_cache(
+        working_env, monkeypatch, tmpdir, compiler_info_cache):
+    # Compiler recording its runs
+    runs = tmpdir.join('runs')
+    gcc = tmpdir.join('gcc')
+    gcc.write("""#!/bin/sh
+echo run >> {0}
+echo "4.4.4"
+""".format(runs))
+    fs.set_executable(str(gcc))
+
+    link_paths = []
+
+    def _get_compiler_link_paths(compiler, paths):
+        link_paths.append(paths)
+        return []
+
+    monkeypatch.setattr(
+        Compiler, '_get_compiler_link_paths', _get_compiler_link_paths)
+
+    def new_compiler():
+        return spack.compilers.get_compilers([{'compiler': {
+            'spec': 'gcc@foo',
+            'paths': {'cc': str(gcc), 'cxx': None, 'f77': None, 'fc': None},
+            'flags': {},
+            'operating_system': 'fake',
+            'target': 'fake',
+            'modules': [],
+            'environment': {},
+            'extra_rpaths': [],
+        }}])[0]
+
+    # The compiler only runs the first time
+    for _ in range(3):
+        compiler = new_compiler()
+        assert compiler.real_version == spack.version.Version('4.4.4')
+        assert compiler.implicit_rpaths() == []
+    assert len(runs.readlines()) == 1
+    assert len(link_paths) == 1
+    assert compiler_info_cache.time_saved > 0
+
+    # It runs again once its entry is removed
+    compiler_info_cache.remove(compiler)
+    compiler = new_compiler()
+    compiler.real_version
+    compiler.implicit_rpaths()
+    assert len(runs.readlines()) == 2
+    assert len(link_paths) == 2
+
+    # ... or once it was updated
+    gcc.write(gcc.read().replace('4.4.4', '4.8.5'))
+    compiler = new_compiler()
+    assert compiler.real_version == spack.version.Version('4.8.5')
+    assert len(runs.readlines()) == 3
+
+    # Other processes use the cache too
+    other = spack.compiler.CompilerInfoCache(compiler_info_cache.file_cache)
+    monkeypatch.setattr(spack.compiler, 'info_cache', other)
+    assert new_compiler().real_version == spack.version.Version('4.8.5')
+    assert len(runs.readlines()) == 3
+
+
+def test_compiler_info_cache_missing_executable(compiler_info_cache):
+    compiler = Compiler(
+        spack.spec.CompilerSpec('gcc@4.4.4'), 'fake', 'fake',
+        ['/does/not/exist/gcc', None])
+    assert compiler_info_cache.key(compiler) is None
@@ -6,20 +6,25 @@
 import collections
 import contextlib
 import errno
+import hashlib
 import inspect
 import itertools
 import os
 import os.path
 import shutil
 import tempfile
+import threading
 import xml.etree.ElementTree
 
 import py
 import pytest
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
 
 from llnl.util.filesystem import mkdirp, remove_linked_tree
 
 import spack.architecture
+import spack.compiler
 import spack.compilers
 import spack.config
 import spack.caches
@@ -32,6 +37,9 @@
 import spack.platforms.test
 import spack.repo
 import spack.stage
+import spack.util.crypto
+import spack.util.download
+import spack.util.environment
 import spack.util.executable
 import spack.util.gpg
 import spack.subprocess_context
@@ -177,6 +185,20 @@ def reset_compiler_cache():
     spack.compilers._compiler_cache = {}
 
 
+@pytest.fixture(scope='function', autouse=True)
+def reset_sourcing_cache(monkeypatch):
+    """Ensure that files sourced by a test are not reused by others."""
+    monkeypatch.setattr(spack.util.environment, '_sourcing_cache', {})
+
+
+@pytest.fixture(scope='function', autouse=True)
+def disable_detection_cache(monkeypatch):
+    """Ensure that compilers and externals detected by a test are not
+    taken from the results of previous runs."""
+    monkeypatch.setattr(spack.caches, 'detection_cache',
+                        lambda name: spack.caches.DetectionCache(None, name))
+
+
 @pytest.fixture(scope='function', autouse=True)
 def mock_stage(tmpdir_factory, monkeypatch, request):
     """Establish the temporary build_stage for the mock archive."""
@@ -682,7 +704,12 @@ def disable_compiler_execution(monkeypatch, request):
 
         @pytest.mark.enable_compiler_link_paths
 
-    If a test is marked in that way this is a no-op."""
+    If a test is marked in that way this is a no-op.
+
+    In any case, the results of compiler runs are not cached across tests.
+    """
+    monkeypatch.setattr(
+        spack.compiler, 'info_cache', spack.compiler.CompilerInfoCache(None))
     if 'enable_compiler_link_paths' not in request.keywords:
         # Compiler.determine_implicit_rpaths actually runs the compiler. So
         # replace that function with a noop that simulates finding no implicit
@@ -746,6 +773,113 @@ def mock_fetch(mock_archive, monkeypatch):
         spack.package.PackageBase, 'fetcher', mock_fetcher)
 
 
+@pytest.fixture()
+def mock_fetch_per_package(tmpdir, monkeypatch):
+    """Give each package a fetcher of its own archive, at a file:// URL, so
+    that packages can be fetched at the same time."""
+    archives = tmpdir.mkdir('archives')
+
+    def fetcher(pkg):
+        archive = archives.join('{0}.tar.gz'.format(pkg.name))
+        if not archive.exists():
+            source = archives.ensure(pkg.name, 'configure')
+            source.write('# {0}\n'.format(pkg.name))
+            with archives.as_cwd():
+                tar = spack.util.executable.which('tar', required=True)
+                tar('-czf', str(archive), pkg.name)
+
+        digest = spack.util.crypto.checksum(hashlib.sha256, str(archive))
+        composite = FetchStrategyComposite()
+        composite.append(URLFetchStrategy('file://' + str(archive), digest))
+        return composite
+
+    monkeypatch.setattr(
+        spack.package.PackageBase, 'fetcher', property(fetcher))
+
+
+class MockHTTPServer(ThreadingMixIn, HTTPServer):
+    """Local HTTP/1.1 server of in-memory files, which supports range
+    requests and keep-alive connections, and records what it is asked."""
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), MockHTTPRequestHandler)
+        self.files = {}
+        self.redirects = {}
+        self.accept_ranges = True
+
+        #: Number of connections made to the server
+        self.connections = 0
+
+        #: (path, Range header) of each request
+        self.requests = []
+
+    def url(self, path):
+        return 'http://127.0.0.1:{0}{1}'.format(self.server_port, path)
+
+
+class MockHTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        range_header = self.headers.get('Range')
+        server.requests.append((self.path, range_header))
+
+        if self.path in server.redirects:
+            return self._respond(
+                302, headers=[('Location', server.redirects[self.path])])
+
+        data = server.files.get(self.path)
+        if data is None:
+            return self._respond(404, b'Not found')
+
+        if not range_header or not server.accept_ranges:
+            return self._respond(200, data)
+
+        start, _, end = range_header[len('bytes='):].partition('-')
+        start = int(start)
+        end = int(end) if end else len(data) - 1
+        if start >= len(data):
+            return self._respond(416, headers=[
+                ('Content-Range', 'bytes */{0}'.format(len(data)))])
+
+        return self._respond(206, data[start:end + 1], headers=[
+            ('Content-Range',
+             'bytes {0}-{1}/{2}'.format(start, end, len(data)))])
+
+
+@pytest.fixture()
+def mock_http_server():
+    """Local HTTP server whose files are set by the test."""
+    server = MockHTTPServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    spack.util.download.pool.clear()
+    server.shutdown()
+    server.server_close()
+
+
 class MockLayout(object):
     def __init__(self, root):
         self.root = root
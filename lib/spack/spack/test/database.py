@@ -24,6 +24,7 @@
 import llnl.util.lock as lk
 from llnl.util.tty.colify import colify
 
+import spack.config
 import spack.repo
 import spack.store
 import spack.database
@@ -902,3 +903,179 @@ def _raise(db, spec):
     with pytest.raises(Exception):
         with spack.store.db.prefix_write_lock(s):
             assert False
+
+
+@pytest.mark.parametrize('query', [
+    'mpileaks', 'mpi', 'mpich@3.0.4', 'callpath ^mpich2', 'libelf@0.8.13:',
+    '%gcc', '%gcc@4.5.0', 'arch=test-debian6-x86_64', 'target=x86_64',
+    'mpileaks~debug', '+debug', 'externaltest', 'not-a-package'
+])
+def test_query_index_matches_scan(database, monkeypatch, query):
+    """Queries narrowed down by the query index must give the same
+    results, in the same order, as testing every record in the database."""
+    with database.read_transaction():
+        indexed = database._query(query, installed=any)
+
+    monkeypatch.setattr(
+        spack.database._QueryIndex, 'candidates', lambda self, spec: None
+    )
+    with database.read_transaction():
+        assert indexed == database._query(query, installed=any)
+
+
+def test_query_index_in_sync_after_remove_and_add(mutable_database):
+    assert len(mutable_database.query('mpileaks')) == 3
+    index = mutable_database._query_index
+
+    spec = mutable_database.remove('mpileaks ^mpich')
+    assert mutable_database._query_index is index
+    assert spec.dag_hash() not in index.by_name['mpileaks']
+    assert len(mutable_database.query('mpileaks')) == 2
+
+    mutable_database.add(spec, spack.store.layout)
+    assert spec.dag_hash() in index.by_name['mpileaks']
+    assert len(mutable_database.query('mpileaks')) == 3
+
+
+@pytest.fixture()
+def lazy_db(database):
+    """A lazily loaded copy of the mock database."""
+    with spack.config.override('config:db_lazy_load', True):
+        db = spack.database.Database(database.root)
+    with db.read_transaction():
+        pass
+    return db
+
+
+def test_lazy_load_reads_specs_on_access(database, lazy_db):
+    records = lazy_db._data
+    assert not any(rec.spec_loaded for rec in records.values())
+
+    # Reading a spec only reads its own dependencies
+    spec = database.query_one('mpileaks ^zmpi')
+    lazy_spec = lazy_db.get_by_hash_local(spec.dag_hash())[0]
+    loaded = set(k for k, rec in records.items() if rec.spec_loaded)
+    assert loaded == set(s.dag_hash() for s in spec.traverse(deptype=(
+        'link', 'run')))
+    assert lazy_spec.concrete
+    assert lazy_spec.eq_dag(spec)
+
+    # Queries by name don't read unrelated specs
+    assert len(lazy_db.query_local('callpath', installed=any)) == 3
+    externaltest = database.query_one('externaltest')
+    assert not records[externaltest.dag_hash()].spec_loaded
+
+    # Queries give the same results as an eagerly read database
+    for query in ('mpileaks', 'mpi', '%gcc', '+debug', 'libelf ^libdwarf'):
+        assert (lazy_db.query_local(query, installed=any) ==
+                database.query_local(query, installed=any))
+
+
+def test_lazy_load_dependents(database, lazy_db):
+    relatives = lazy_db.installed_relatives('callpath ^mpich', 'parents')
+    assert relatives == database.installed_relatives(
+        'callpath ^mpich', 'parents')
+    assert len(relatives) == 1
+
+
+def test_lazy_load_write_unread_records(mutable_database, tmpdir):
+    with open(mutable_database._index_path) as f:
+        original = json.load(f)['database']['installs']
+
+    with spack.config.override('config:db_lazy_load', True):
+        lazy_db = spack.database.Database(mutable_database.root)
+
+    # Unread records are written as they were read
+    with lazy_db.read_transaction():
+        with open(str(tmpdir.join('index.json')), 'w') as f:
+            lazy_db._write_to_file(f)
+    with open(str(tmpdir.join('index.json'))) as f:
+        assert json.load(f)['database']['installs'] == original
+
+    lazy_db.remove('mpileaks ^mpich')
+    eager_db = spack.database.Database(mutable_database.root)
+    assert len(eager_db.query_local('mpileaks')) == 2
+    with eager_db.read_transaction():
+        eager_db._check_ref_counts()
+
+
+@pytest.fixture()
+def journal_db(mutable_database):
+    """A copy of the mock database that appends changes to a journal."""
+    with spack.config.override('config:db_format', 'journal'):
+        db = spack.database.Database(mutable_database.root)
+
+    # Reindexing migrates the database to the journal format
+    db.reindex(spack.store.layout)
+    assert not os.path.exists(db._journal_path)
+    with open(db._index_path) as f:
+        index = f.read()
+    yield db, index
+
+
+def test_journal_appends_changes(mutable_database, journal_db):
+    db, index = journal_db
+    db.remove('mpileaks ^mpich')
+    db.update_explicit('externaltool', True)
+
+    # The index file is untouched, and each transaction is a journal entry
+    with open(db._index_path) as f:
+        assert f.read() == index
+    with open(db._journal_path) as f:
+        assert len(f.readlines()) == 2
+
+    # Changes are seen when reading the index file and its journal
+    other_db = spack.database.Database(mutable_database.root)
+    assert other_db.query('mpileaks ^mpich', installed=any) == []
+    assert len(other_db.query('mpileaks')) == 2
+    assert other_db.get_record('externaltool').explicit
+    with other_db.read_transaction():
+        other_db._check_ref_counts()
+
+
+def test_journal_compaction(mutable_database, journal_db, monkeypatch):
+    db, index = journal_db
+    monkeypatch.setattr(spack.database, '_journal_min_length', 0)
+    records = len(db.query(installed=any))
+
+    # The journal is merged into the index once it has more records
+    for explicit in [True, False] * records + [True]:
+        db.update_explicit('externaltool', explicit)
+    with open(db._journal_path) as f:
+        assert len(f.readlines()) <= records
+    with open(db._index_path) as f:
+        assert f.read() != index
+
+    other_db = spack.database.Database(mutable_database.root)
+    assert other_db.get_record('externaltool').explicit
+
+
+def test_journal_ignores_stale_and_incomplete_entries(
+        mutable_database, journal_db):
+    db, _ = journal_db
+    db.update_explicit('externaltool', True)
+    with open(db._journal_path) as f:
+        entry = json.loads(f.read())
+
+    # Entries for another index file are ignored, as is an incomplete entry
+    stale_entry = dict(entry, index_id='stale')
+    with open(db._journal_path, 'w') as f:
+        f.write(json.dumps(stale_entry) + '\n')
+        f.write(json.dumps(entry)[:-10])
+
+    other_db = spack.database.Database(mutable_database.root)
+    assert not other_db.get_record('externaltool').explicit
+
+    # The incomplete entry is dropped when the database is next written
+    other_db.update_explicit('externaltool', True)
+    assert not os.path.exists(db._journal_path)
+    assert db.get_record('externaltool').explicit
+
+
+def test_reindex_migrates_to_json(mutable_database, journal_db):
+    db, _ = journal_db
+    db.update_explicit('externaltool', True)
+
+    mutable_database.reindex(spack.store.layout)
+    assert not os.path.exists(db._journal_path)
+    assert db.get_record('externaltool').explicit
@@ -7,6 +7,7 @@
 
 import pytest
 import spack.util.environment as environment
+import spack.util.executable
 from spack.paths import spack_root
 from spack.util.environment import EnvironmentModifications
 from spack.util.environment import RemovePath, PrependPath, AppendPath
@@ -448,3 +449,73 @@ def test_blacklist_lmod_variables():
     # Check that variables related to lmod are not in there
     modifications = env.group_by_name()
     assert not any(x.startswith('LMOD_') for x in modifications)
+
+
+@pytest.fixture
+def shell_invocations(monkeypatch):
+    """Record the commands run by the shells sourcing files."""
+    invocations = []
+    call = spack.util.executable.Executable.__call__
+
+    def _call(exe, *args, **kwargs):
+        invocations.append(args)
+        return call(exe, *args, **kwargs)
+
+    monkeypatch.setattr(spack.util.executable.Executable, '__call__', _call)
+    return invocations
+
+
+def test_sourcing_files_in_batch(tmpdir, working_env, shell_invocations):
+    scripts = []
+    for i in range(5):
+        script = tmpdir.join('setup{0}.sh'.format(i))
+        script.write('export SETUP_CHAIN="$SETUP_CHAIN:{0}"\n'.format(i))
+        scripts.append(str(script))
+    os.environ.pop('SETUP_CHAIN', None)
+
+    # By default each file is sourced by its own shell...
+    env = environment.environment_after_sourcing_files(*scripts)
+    assert env['SETUP_CHAIN'] == ':0:1:2:3:4'
+    assert len(shell_invocations) == 5
+
+    # ... and all of them by a single shell in batch mode
+    batched = environment.environment_after_sourcing_files(
+        *scripts, batch=True)
+    assert batched['SETUP_CHAIN'] == env['SETUP_CHAIN']
+    assert len(shell_invocations) == 6
+
+    # Files are not cached unless asked to
+    environment.environment_after_sourcing_files(*scripts, batch=True)
+    assert len(shell_invocations) == 7
+
+
+def test_sourcing_files_is_cached(tmpdir, working_env, shell_invocations):
+    script = tmpdir.join('setup.sh')
+    script.write('export SETUP_CHAIN="$SETUP_CHAIN:0"\n')
+    script = str(script)
+    os.environ.pop('SETUP_CHAIN', None)
+
+    # The empty environment files are compared to is sourced once
+    for _ in range(10):
+        modifications = EnvironmentModifications.from_sourcing_file(script)
+        assert 'SETUP_CHAIN' in modifications.group_by_name()
+    assert len(shell_invocations) == 1 + 10
+
+    # Files are sourced once if asked to
+    for _ in range(10):
+        env = environment.environment_after_sourcing_files(
+            script, cache=True)
+        assert env['SETUP_CHAIN'] == ':0'
+    assert len(shell_invocations) == 11 + 1
+
+    # Files are sourced again if their contents change...
+    tmpdir.join('setup.sh').write('export SETUP_CHAIN="$SETUP_CHAIN:1"\n')
+    env = environment.environment_after_sourcing_files(script, cache=True)
+    assert env['SETUP_CHAIN'] == ':1'
+    assert len(shell_invocations) == 11 + 2
+
+    # ... or if the environment they are sourced in changes
+    os.environ['SETUP_CHAIN'] = 'start'
+    env = environment.environment_after_sourcing_files(script, cache=True)
+    assert env['SETUP_CHAIN'] == 'start:1'
+    assert len(shell_invocations) == 11 + 3
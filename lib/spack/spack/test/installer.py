@@ -3,18 +3,24 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import glob
 import os
 import py
 import pytest
+import socket
+import threading
 
 import llnl.util.filesystem as fs
 import llnl.util.tty as tty
 import llnl.util.lock as ulk
 
 import spack.binary_distribution
+import spack.build_environment
 import spack.compilers
 import spack.directory_layout as dl
+import spack.fetch_strategy
 import spack.installer as inst
+import spack.package
 import spack.package_prefs as prefs
 import spack.repo
 import spack.spec
@@ -964,3 +970,277 @@ def test_install_skip_patch(install_mockery, mock_fetch):
     installer.install(fake=False, skip_patch=True)
 
     assert 'b' in installer.installed
+
+
+def test_install_concurrent_builds(install_mockery, monkeypatch):
+    """Test concurrent fake builds honor the DAG and run side by side."""
+    spec, installer = create_installer('dtbuild1')
+
+    events = []
+    spawn_build_process = spack.build_environment.spawn_build_process
+    finish_build = installer._finish_build
+
+    def _spawn_build_process(pkg, *args, **kwargs):
+        events.append(('start', pkg.name, len(installer.building)))
+        return spawn_build_process(pkg, *args, **kwargs)
+
+    def _finish_build(pkg_id):
+        events.append(('finish', installer.building[pkg_id][0].pkg.name,
+                       len(installer.building)))
+        finish_build(pkg_id)
+
+    monkeypatch.setattr(spack.build_environment, 'spawn_build_process',
+                        _spawn_build_process)
+    monkeypatch.setattr(installer, '_finish_build', _finish_build)
+
+    installer.install(fake=True, concurrent_builds=3)
+
+    for s in spec.traverse():
+        assert s.package.installed
+
+    # The three independent dependencies were started before any build
+    # finished, with one more build running each time
+    deps = set(dep.name for dep in spec.dependencies())
+    assert len(deps) == 3
+    assert set(name for _, name, _ in events[:3]) == deps
+    assert [(kind, running) for kind, _, running in events[:3]] == [
+        ('start', 0), ('start', 1), ('start', 2)]
+
+    # Packages are only built after all of their dependencies
+    order = [(kind, name) for kind, name, _ in events]
+    for s in spec.traverse():
+        for dep in s.dependencies():
+            assert (order.index(('finish', dep.name)) <
+                    order.index(('start', s.name)))
+
+
+def test_install_concurrent_from_cache(install_mockery, monkeypatch, tmpdir):
+    """Test binary packages are fetched ahead and extracted concurrently."""
+    fetched = []
+
+    def _fetch(prefetcher, spec):
+        fetched.append(spec.name)
+        return None if spec.name == 'dtbuild1' else (spec, 'tarball', None)
+
+    def _extract(spec, filename, **kwargs):
+        # Runs in the extraction process, so report through files
+        spack.store.layout.create_install_directory(spec)
+        inst._do_fake_install(spec.package)
+        tmpdir.join(spec.name).write(filename)
+
+    monkeypatch.setattr(inst.BinaryPrefetcher, '_fetch', _fetch)
+    monkeypatch.setattr(spack.binary_distribution, 'extract_tarball',
+                        _extract)
+
+    spec, installer = create_installer('dtbuild1')
+
+    running = []
+    spawn_build_process = spack.build_environment.spawn_build_process
+
+    def _spawn_build_process(pkg, *args, **kwargs):
+        running.append(len(installer.building))
+        return spawn_build_process(pkg, *args, **kwargs)
+
+    monkeypatch.setattr(spack.build_environment, 'spawn_build_process',
+                        _spawn_build_process)
+
+    installer.install(fake=True, concurrent_builds=3)
+
+    # Every binary package was asked for once
+    assert sorted(fetched) == sorted(s.name for s in spec.traverse())
+    for s in spec.traverse():
+        assert s.package.installed
+        assert spack.store.db.get_record(s).installed
+
+    # There is no binary for the root, which is built from source
+    assert not spec.package.installed_from_binary_cache
+    assert not tmpdir.join(spec.name).exists()
+
+    # The three dependencies were extracted side by side
+    assert running[:3] == [0, 1, 2]
+    for dep in spec.dependencies():
+        assert dep.package.installed_from_binary_cache
+        assert tmpdir.join(dep.name).read() == 'tarball'
+
+
+def test_install_prefetch_sources(
+        install_mockery, mock_fetch_per_package, monkeypatch):
+    """Test the sources of the packages to build are fetched ahead."""
+    fetched = []
+    do_fetch = spack.package.PackageBase.do_fetch
+
+    def _fetch(pkg, mirror_only=False):
+        # Builds run in their own processes, so only prefetches are recorded
+        fetched.append((pkg.name, threading.current_thread().name))
+        do_fetch(pkg, mirror_only)
+
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fetch', _fetch)
+
+    spec, installer = create_installer('libdwarf')
+    installer.install(fetch_jobs=2)
+
+    assert sorted(name for name, _ in fetched) == ['libdwarf', 'libelf']
+    assert all(thread != 'MainThread' for _, thread in fetched)
+    for s in spec.traverse():
+        assert s.package.installed
+
+
+def test_source_prefetcher_url_only(install_mockery):
+    """Test only URL downloads are prefetched, since the other fetchers
+    change the working directory of the process."""
+    libelf = spack.spec.Spec('libelf').concretized()
+    assert inst.SourcePrefetcher._can_prefetch(libelf.package)
+
+    git_test = spack.spec.Spec('git-test').concretized()
+    assert not inst.SourcePrefetcher._can_prefetch(git_test.package)
+
+
+def test_source_prefetcher_close(
+        install_mockery, mock_fetch_per_package, monkeypatch):
+    """Test closing the prefetcher lets the running fetch finish and skips
+    the fetches not started."""
+    started = threading.Event()
+    release = threading.Event()
+    fetched = []
+
+    def _fetch(pkg, mirror_only=False):
+        started.set()
+        release.wait(10)
+        fetched.append(pkg.name)
+
+    monkeypatch.setattr(spack.package.PackageBase, 'do_fetch', _fetch)
+
+    libdwarf = spack.spec.Spec('libdwarf').concretized()
+    prefetcher = inst.SourcePrefetcher(1)
+    prefetcher.prefetch(libdwarf['libelf'].package)
+    prefetcher.prefetch(libdwarf.package)
+    assert started.wait(10)
+
+    closing = threading.Thread(target=prefetcher.close)
+    closing.start()
+    release.set()
+    closing.join(10)
+    assert not closing.is_alive()
+    assert fetched == ['libelf']
+
+
+def test_install_workers_share_tasks(install_mockery, monkeypatch, tmpdir):
+    """Test workers sharing a work queue build every package only once."""
+    fake_install = inst._do_fake_install
+
+    def _fake_install(pkg):
+        fake_install(pkg)
+        tmpdir.join(pkg.name).write(str(os.getpid()) + '\n', mode='a')
+
+    summaries = []
+
+    def _print_work_summary(installer):
+        summaries.append(installer.work_queue.summary())
+
+    monkeypatch.setattr(inst, '_do_fake_install', _fake_install)
+    monkeypatch.setattr(inst.PackageInstaller, '_print_work_summary',
+                        _print_work_summary)
+
+    spec, installer = create_installer('dtbuild1')
+    installer.install(fake=True, workers=3)
+
+    names = sorted(s.name for s in spec.traverse())
+    for name in names:
+        assert len(tmpdir.join(name).readlines()) == 1
+
+    # The summary accounts for every build, whichever worker did it
+    summary = summaries[0]
+    built = sorted(name for builds in summary.values()
+                   for name, status, _ in builds)
+    assert built == names
+    assert not installer.helpers
+
+    # The queue is gone with the installation, so the next one starts over
+    assert not os.path.exists(spack.store.db.work_queue_path(spec))
+
+
+def test_install_workers_dead_helper(install_mockery, monkeypatch, capfd):
+    """Test the specs claimed by a worker that died are built by another."""
+    def _dead_worker(serialized_pkg, kwargs):
+        spec = serialized_pkg.restore().spec
+        queue = inst.WorkQueue(spec)
+        for s in spec.traverse():
+            queue.claim(s)
+        os._exit(3)
+
+    monkeypatch.setattr(inst, '_install_worker', _dead_worker)
+
+    spec, installer = create_installer('dtbuild1')
+    installer.install(fake=True, workers=2)
+
+    for s in spec.traverse():
+        assert s.package.installed
+    assert not installer.helpers
+    assert 'exited with code 3' in capfd.readouterr()[1]
+
+
+def test_work_queue_claims(install_mockery):
+    """Test claiming specs in the work queue from several workers."""
+    spec = spack.spec.Spec('a').concretized()
+    queue, other = inst.WorkQueue(spec), inst.WorkQueue(spec)
+    other.worker = 'other-host:1'
+
+    assert other.claim(spec)
+    assert not queue.claim(spec)
+    assert queue.claimed_elsewhere() == set([spec.dag_hash()])
+
+    # Releasing the spec lets another worker claim it
+    other.release(spec)
+    assert queue.claim(spec)
+    assert not other.claim(spec)
+    assert not queue.claimed_elsewhere()
+
+    # The claims of the workers that are gone are ignored
+    queue.finish(spec, inst.STATUS_FAILED)
+    dead = inst.WorkQueue(spec)
+    dead.worker = '{0}:{1}'.format(socket.gethostname(), 2 ** 22 + 1)
+    assert dead.claim(spec, force=True)
+    assert queue.claim(spec)
+
+    queue.finish(spec, inst.STATUS_INSTALLED)
+    summary = queue.summary()
+    assert list(summary) == [queue.worker]
+    assert summary[queue.worker][0][:2] == ('a', inst.STATUS_INSTALLED)
+
+    # The claims of a worker known to be gone are put back in the queue
+    other.worker = 'other-host:2'
+    b = spack.spec.Spec('b').concretized()
+    assert other.claim(b)
+    assert other.requeue(other.worker) == [b.dag_hash()]
+    assert queue.claim(b)
+
+    queue.remove()
+    assert not queue.tasks()
+
+
+def test_binary_prefetcher_close(install_mockery, monkeypatch):
+    """Test closing the prefetcher removes what it downloaded, including
+    the downloads that did not finish."""
+    spec = spack.spec.Spec('a').concretized()
+
+    def _get_mirrors_for_spec(spec, **kwargs):
+        return [{'mirror_url': 'file:///mirror', 'spec': spec}]
+
+    def _interrupted_download(spec, preferred_mirrors=None, path=None):
+        py.path.local(path).join('partial.spack').write('partial')
+        raise spack.fetch_strategy.FetchError('Download interrupted')
+
+    monkeypatch.setattr(spack.binary_distribution.binary_index,
+                        'regenerate_spec_cache', lambda: None)
+    monkeypatch.setattr(spack.binary_distribution, 'get_mirrors_for_spec',
+                        _get_mirrors_for_spec)
+    monkeypatch.setattr(spack.binary_distribution, 'download_tarball',
+                        _interrupted_download)
+
+    prefetcher = inst.BinaryPrefetcher(2, unsigned=True)
+    prefetcher.prefetch(spec)
+    prefetcher.fetches[spec.dag_hash()].wait()
+    assert glob.glob(os.path.join(prefetcher.path, '*', 'partial.spack'))
+
+    prefetcher.close()
+    assert not os.path.exists(prefetcher.path)
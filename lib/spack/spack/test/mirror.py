@@ -6,6 +6,7 @@
 import filecmp
 import os
 import pytest
+import threading
 
 import spack.repo
 import spack.mirror
@@ -47,7 +48,7 @@ def set_up_package(name, repository, url_attr):
     pkg.versions[v][url_attr] = repository.url
 
 
-def check_mirror():
+def check_mirror(jobs=1):
     with Stage('spack-mirror-test') as stage:
         mirror_root = os.path.join(stage.path, 'test-mirror')
         # register mirror with spack config
@@ -55,7 +56,7 @@ def check_mirror():
         with spack.config.override('mirrors', mirrors):
             with spack.config.override('config:checksum', False):
                 specs = [Spec(x).concretized() for x in repos]
-                spack.mirror.create(mirror_root, specs)
+                spack.mirror.create(mirror_root, specs, jobs=jobs)
 
             # Stage directory exists
             assert os.path.isdir(mirror_root)
@@ -114,6 +115,29 @@ def test_git_mirror(mock_git_repository):
     repos.clear()
 
 
+@pytest.mark.skipif(
+    not which('git'), reason='requires git to be installed')
+def test_git_and_url_mirror_jobs(
+        mock_git_repository, mock_archive, monkeypatch):
+    """Only URL downloads are added to a mirror in threads, since version
+    control fetchers change the working directory of the process."""
+    set_up_package('git-test', mock_git_repository, 'git')
+    set_up_package('trivial-install-test-package', mock_archive, 'url')
+
+    threads = {}
+    add_single_spec = spack.mirror._add_single_spec
+
+    def _add_single_spec(spec, mirror, mirror_stats):
+        threads[spec.name] = threading.current_thread().name
+        add_single_spec(spec, mirror, mirror_stats)
+
+    monkeypatch.setattr(spack.mirror, '_add_single_spec', _add_single_spec)
+    check_mirror(jobs=2)
+    assert threads['git-test'] == 'MainThread'
+    assert threads['trivial-install-test-package'] != 'MainThread'
+    repos.clear()
+
+
 @pytest.mark.skipif(
     not which('svn') or not which('svnadmin'),
     reason='requires subversion to be installed')
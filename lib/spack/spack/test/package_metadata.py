@@ -0,0 +1,153 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import pytest
+
+import spack.caches
+import spack.fetch_strategy as fs
+import spack.package
+import spack.paths
+import spack.repo
+import spack.util.file_cache
+from spack.util.package_metadata import (
+    extract_metadata, possible_dependencies, PackageMetadata,
+    DynamicMetadataError)
+
+
+def _static_metadata(name):
+    repo = spack.repo.path.repo_for_pkg(name)
+    return extract_metadata(
+        name, repo.namespace, repo.filename_for_package_name(name))
+
+
+def _dependency_types(metadata):
+    return dict(
+        (name, sorted(tuple(c['type']) for c in conds))
+        for name, conds in metadata.dependencies.items())
+
+
+def _fetcher(pkg_or_metadata, version):
+    try:
+        if isinstance(pkg_or_metadata, PackageMetadata):
+            fetcher = pkg_or_metadata.fetcher(version)
+        else:
+            fetcher = fs.for_package_version(pkg_or_metadata, version)
+    except fs.FetchError as e:
+        return str(e)
+    return str(fetcher)
+
+
+def test_static_metadata_matches_package_class(mutable_mock_repo):
+    static = 0
+    for name in spack.repo.path.all_package_names():
+        try:
+            metadata = _static_metadata(name)
+        except DynamicMetadataError:
+            continue
+        static += 1
+
+        pkg_cls = spack.repo.path.get_pkg_class(name)
+        expected = PackageMetadata.from_package_class(pkg_cls)
+
+        assert metadata.fullname == expected.fullname
+        assert metadata.doc == expected.doc
+        assert metadata.homepage == expected.homepage
+        assert metadata.maintainers == expected.maintainers
+        assert metadata.tags == expected.tags
+        assert metadata.build_system_class == expected.build_system_class
+        assert metadata.phases == expected.phases
+        assert metadata.versions == expected.versions
+        assert sorted(metadata.dependencies) == sorted(expected.dependencies)
+        assert list(metadata.dependencies) == list(expected.dependencies)
+        assert _dependency_types(metadata) == _dependency_types(expected)
+        assert metadata.provided_specs == pkg_cls.provided
+        assert len(metadata.conflicts) == len(expected.conflicts)
+        assert (sorted(p['url_or_filename'] for p in metadata.patches) ==
+                sorted(p['url_or_filename'] for p in expected.patches))
+
+        if metadata.fetch_attrs is not None:
+            pkg = spack.repo.path.get(name)
+            assert metadata.has_code == pkg.has_code
+            for v in metadata.versions if pkg.has_code else []:
+                assert _fetcher(metadata, v) == _fetcher(pkg, v)
+
+    # Most mock packages should not need to be imported
+    assert static > 100
+
+
+@pytest.mark.parametrize('body', [
+    'def url_for_version(self, version):\n        return self.url',
+    'url = "http://www.example.com/" + "a-1.0.tar.gz"',
+    '@property\n    def git(self):\n        return None',
+])
+def test_computed_fetch_attrs(mock_packages, tmpdir, body):
+    package_py = tmpdir.join('package.py')
+    package_py.write("""\
+from spack import *
+
+
+class A(Package):
+    url = "http://www.example.com/a-1.0.tar.gz"
+
+    version('1.0', '0123456789abcdef0123456789abcdef')
+
+    {0}
+""".format(body))
+    metadata = extract_metadata('a', 'builtin.mock', str(package_py))
+    assert metadata.fetch_attrs is None
+
+
+def test_possible_dependencies_from_metadata(mock_packages):
+    for name in ('mpileaks', 'dtbuild1', 'mpi'):
+        for kwargs in ({}, {'transitive': False},
+                       {'expand_virtuals': False}, {'deptype': 'link'}):
+            assert (possible_dependencies(name, **kwargs) ==
+                    spack.package.possible_dependencies(name, **kwargs))
+
+
+@pytest.mark.parametrize('name', [
+    'multivalue-variant',  # variant values computed by a function
+    'simple-inheritance',  # inherits directives from another package
+])
+def test_dynamic_metadata(mock_packages, name):
+    with pytest.raises(DynamicMetadataError):
+        _static_metadata(name)
+
+
+def test_metadata_index_imports_dynamic_packages_only(
+        mock_packages, tmpdir, monkeypatch):
+    cache = spack.util.file_cache.FileCache(str(tmpdir))
+    monkeypatch.setattr(spack.caches, 'misc_cache', cache)
+
+    imported = []
+    get_pkg_module = spack.repo.Repo._get_pkg_module
+
+    def _get_pkg_module(repo, pkg_name):
+        imported.append(pkg_name)
+        return get_pkg_module(repo, pkg_name)
+    monkeypatch.setattr(spack.repo.Repo, '_get_pkg_module', _get_pkg_module)
+
+    repo = spack.repo.Repo(spack.paths.mock_packages_path)
+    monkeypatch.setattr(spack.repo.path, 'repos', [repo])
+
+    mpileaks = repo.get_pkg_metadata('mpileaks', cached=True)
+    assert 'mpi' in mpileaks.dependencies_of_type('link')
+    assert 'mpileaks' not in imported
+
+    multivalue = repo.get_pkg_metadata(
+        'builtin.mock.multivalue-variant', cached=True)
+    assert multivalue.variants['foo']['multi']
+    assert 'multivalue-variant' in imported
+
+    # The index is read back from the cache without importing anything
+    del imported[:]
+    repo = spack.repo.Repo(spack.paths.mock_packages_path)
+    assert repo.get_pkg_metadata('multivalue-variant', cached=True).versions
+    assert repo.provider_index.providers_for('mpi')
+    assert repo.tag_index is not None
+    assert not imported
+
+    with pytest.raises(spack.repo.UnknownPackageError):
+        repo.get_pkg_metadata('not-a-package')
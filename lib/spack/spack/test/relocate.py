@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 import collections
+import multiprocessing
 import os.path
 import platform
 import re
@@ -18,6 +19,7 @@
 import spack.spec
 import spack.store
 import spack.tengine
+import spack.util.elf
 import spack.util.executable
 
 
@@ -447,3 +449,137 @@ def test_relocate_text_old_sbang(tmpdir, sbang_line):
     )
 
     assert expected == open(str(path)).read()
+
+
+@pytest.mark.parametrize('content,expected', [
+    (b'\x7fELF\x02\x01\x01' + b'\x00' * 9 + b'\x02\x00',
+     'application/x-executable'),
+    (b'\x7fELF\x02\x01\x01' + b'\x00' * 9 + b'\x03\x00',
+     'application/x-sharedlib'),
+    (b'\x7fELF\x01\x02\x01' + b'\x00' * 9 + b'\x00\x01',
+     'application/x-object'),
+    (b'\xcf\xfa\xed\xfe\x07\x00\x00\x01', 'application/x-mach-binary'),
+    (b'\xca\xfe\xba\xbe\x00\x00\x00\x02', 'application/x-mach-binary'),
+    (b'!<arch>\n', 'application/x-archive'),
+    (b'\x1f\x8b\x08\x00', 'application/gzip'),
+    (b'#!/bin/bash\necho hello\n', 'text/x-shellscript'),
+    (b'#!/usr/bin/env python3\nprint(1)\n', 'text/x-script.python'),
+    (b'caf\xc3\xa9 au lait\n', 'text/plain'),
+    (b'', 'inode/x-empty'),
+])
+def test_mime_type_from_header(tmpdir, content, expected):
+    path = tmpdir.join('file')
+    path.write(content, mode='wb')
+    assert spack.relocate.mime_type(str(path)) == tuple(expected.split('/'))
+
+
+def test_mime_type_fallback(tmpdir, monkeypatch):
+    # Unknown binary data is left to the file command
+    path = tmpdir.join('data')
+    path.write(b'\x00\x01\x02\x03', mode='wb')
+    monkeypatch.setattr(spack.relocate, '_file_mime_type',
+                        lambda f: ('application', 'octet-stream'))
+
+    mime_types = spack.relocate.mime_types([str(path)], jobs=2)
+    assert mime_types == {str(path): ('application', 'octet-stream')}
+
+
+def test_relocate_text_many_prefixes(tmpdir, monkeypatch):
+    # Relocate with several processes, one file each
+    monkeypatch.setattr(spack.relocate, '_files_per_process', 1)
+    monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: 2)
+
+    root = '/orig/layout/root'
+    prefixes = dict(('{0}/dep{1}'.format(root, i), '/new/dep{0}'.format(i))
+                    for i in range(10))
+    files = []
+    for i in range(2):
+        path = tmpdir.join('file{0}'.format(i))
+        path.write('-L{0}/dep1/lib -I{0}/dep10/include {0}/pkg/bin\n'
+                   '/not{0}/dep2\n'.format(root))
+        files.append(str(path))
+
+    spack.relocate.relocate_text(
+        files, root, '/new/root', root + '/pkg', '/new/pkg',
+        '/orig/spack', spack.paths.spack_root, prefixes)
+
+    for path in files:
+        assert open(path).read() == (
+            '-L/new/dep1/lib -I/new/dep10/include /new/pkg/bin\n'
+            '/not/orig/layout/root/dep2\n')
+
+
+def test_relocate_text_bin_padding(tmpdir):
+    old_prefix, new_prefix = '/orig/prefix/pkg', '/new/pkg'
+    dep_prefix, new_dep_prefix = '/orig/prefix/dep', '/dep'
+    path = tmpdir.join('binary')
+    path.write(b'\x00/orig/prefix/pkg/lib:/orig/prefix/dep/lib\x00'
+               b'/orig/prefix/other\x00', mode='wb')
+
+    spack.relocate.relocate_text_bin(
+        [str(path)], old_prefix, new_prefix, None, None,
+        {dep_prefix: new_dep_prefix, old_prefix: new_prefix})
+
+    # The new prefixes are padded to keep the length of the old ones
+    assert path.read(mode='rb') == (
+        b'\x00' + b'/' * 8 + b'/new/pkg/lib:' + b'/' * 12 + b'/dep/lib\x00'
+        b'/orig/prefix/other\x00')
+
+
+@pytest.mark.requires_executables('gcc')
+@pytest.mark.skipif(
+    platform.system().lower() != 'linux',
+    reason='implementation for MacOS still missing'
+)
+def test_set_elf_rpaths_in_place(hello_world, monkeypatch):
+    executable = hello_world(rpaths=['/opt/orig/prefix/lib', '/usr/lib64'])
+    assert spack.relocate._elf_rpaths_for(str(executable)) == [
+        '/opt/orig/prefix/lib', '/usr/lib64']
+
+    # Shorter RPATHs are written without patchelf
+    def _no_patchelf(*args, **kwargs):
+        raise AssertionError('patchelf should not be used')
+    monkeypatch.setattr(spack.relocate, '_patchelf', _no_patchelf)
+
+    spack.relocate._set_elf_rpaths_for_binaries(
+        {str(executable): ['/opt/new/lib', '$ORIGIN/../lib']})
+    assert spack.relocate._elf_rpaths_for(str(executable)) == [
+        '/opt/new/lib', '$ORIGIN/../lib']
+    assert 'Hello world!' in spack.util.executable.Executable(
+        str(executable))(output=str)
+
+    # Longer ones need patchelf
+    assert not spack.relocate._set_elf_rpaths_in_place(
+        str(executable), ['/a/much/longer/path/than/before/lib'])
+
+
+@pytest.mark.requires_executables('gcc')
+@pytest.mark.skipif(
+    platform.system().lower() != 'linux',
+    reason='implementation for MacOS still missing'
+)
+def test_set_elf_rpaths_in_place_shared_strings(hello_world, monkeypatch):
+    executable = hello_world(rpaths=['/opt/orig/prefix/lib'])
+    with open(str(executable), 'rb') as f:
+        elf_file = spack.util.elf.ElfFile(f)
+        names = set(elf_file._string(i)
+                    for i in elf_file._string_references())
+        rpath = elf_file.rpath_entries()[0].value
+
+    # Symbol names share the string table with the RPATH
+    assert b'printf' in names
+
+    # Another string overlapping with the RPATH keeps it from being
+    # rewritten in place
+    monkeypatch.setattr(spack.util.elf.ElfFile, '_string_references',
+                        lambda self: [rpath + len('/opt/orig/')])
+    assert not spack.util.elf.set_rpaths_in_place(
+        str(executable), ['/opt/new/lib'])
+
+    # So does a string table whose users cannot all be parsed
+    monkeypatch.setattr(spack.util.elf.ElfFile, '_string_references',
+                        lambda self: None)
+    assert not spack.util.elf.set_rpaths_in_place(
+        str(executable), ['/opt/new/lib'])
+    assert spack.util.elf.get_rpaths(str(executable)) == [
+        '/opt/orig/prefix/lib']
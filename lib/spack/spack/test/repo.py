@@ -6,8 +6,11 @@
 import os
 import pytest
 
+import spack.caches
 import spack.repo
 import spack.paths
+import spack.util.file_cache
+import spack.util.package_metadata
 
 
 @pytest.fixture()
@@ -67,3 +70,39 @@ def test_repo_invisibles(mutable_mock_repo, extra_repo):
     with open(os.path.join(extra_repo.root, 'packages', '.invisible'), 'w'):
         pass
     extra_repo.all_package_names()
+
+
+def test_repo_index_parallel_update(mutable_mock_repo, tmpdir, monkeypatch):
+    def build_index(cache_dir, jobs):
+        cache = spack.util.file_cache.FileCache(str(tmpdir.join(cache_dir)))
+        monkeypatch.setattr(spack.caches, 'misc_cache', cache)
+
+        repo = spack.repo.Repo(spack.paths.mock_packages_path)
+        updated = repo.update_indexes(jobs=jobs)
+        assert sorted(updated) == sorted(repo.all_package_names())
+
+        # Read the indexes back from the cache files
+        repo = spack.repo.Repo(spack.paths.mock_packages_path)
+        return (repo.provider_index,
+                dict(repo.tag_index),
+                repo.patch_index.index)
+
+    assert build_index('parallel', 4) == build_index('sequential', 1)
+
+
+def test_repo_index_rebuilt_when_sources_change(
+        mutable_mock_repo, tmpdir, monkeypatch):
+    cache = spack.util.file_cache.FileCache(str(tmpdir))
+    monkeypatch.setattr(spack.caches, 'misc_cache', cache)
+
+    repo = spack.repo.Repo(spack.paths.mock_packages_path)
+    repo.update_indexes()
+    assert not repo.metadata_repo_index._needs_update('providers')
+
+    # A change to a build system base class affects every package
+    index_mtime = cache.mtime(
+        repo.metadata_repo_index._cache_filename('providers'))
+    monkeypatch.setattr(spack.util.package_metadata, 'sources_mtime',
+                        lambda: index_mtime + 1)
+    assert (sorted(repo.metadata_repo_index._needs_update('providers')) ==
+            repo.all_package_names())
@@ -89,3 +89,38 @@ def test_yaml_aliases():
 
     # ensure no YAML aliases appear in syaml dumps.
     assert '*id' not in string
+
+
+@pytest.mark.parametrize('data', [
+    syaml.syaml_dict(),
+    syaml.syaml_dict([('a', syaml.syaml_dict()), ('b', []), ('c', ())]),
+    syaml.syaml_dict([('version', '1.2.3'), ('hash', '2abcdfe7ij')]),
+    syaml.syaml_dict([('flags', ['-O3', '-g -Wall', '-DX=1']),
+                      ('paths', ['/usr/bin', 'C:\\Program Files'])]),
+    syaml.syaml_dict([(k, k) for k in (
+        'true', 'True', 'TRUE', 'false', 'null', 'Null', '~', 'yes', 'no',
+        'on', 'off', 'y', 'n', '.inf', '.nan', 'nan', '0x1f', '0o17', '0b1',
+        '1e3', '2e7', '2e7abc', '1_000', '12:30:00', '2001-12-14', '', ' ',
+        '*', '&a', '!a', '@a', '%a', '`a', '?', '-', '-a', 'a:b', 'a: b',
+        'a #b', 'a#b', 'x,y', '[a', '{a', "it's", '"a"', 'a\\b', '\xe9'
+    )]),
+    syaml.syaml_dict([('a', None), ('b', True), ('c', 1), ('d', 1.5),
+                      (2, [None, False, 0, -0.0])]),
+    syaml.syaml_dict([('a', 'multi\nline'), ('b', ['multi\nline'])]),
+    syaml.syaml_dict([('a', {'z': 1, 'y': syaml.syaml_dict([('x', [])])})]),
+])
+def test_dump_flow_matches_dump(data):
+    assert syaml.dump_flow(data) == syaml.dump(data, default_flow_style=True)
+
+
+def test_dump_flow_ruamel_types():
+    data = syaml.load_config("""\
+a:
+  - 1
+  - 2
+b: {c: d}
+""")
+    expected = syaml.dump(data, default_flow_style=True)
+    assert syaml.dump_flow(data) == expected
+    assert syaml.dump_flow(syaml.syaml_dict([('k', data)])) == \
+        syaml.dump(syaml.syaml_dict([('k', data)]), default_flow_style=True)
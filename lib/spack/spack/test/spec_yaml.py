@@ -211,6 +211,30 @@ def test_ordered_read_not_required_for_consistent_dag_hash(
         assert spec.full_hash() == round_trip_reversed_json_spec.full_hash()
 
 
+@pytest.mark.parametrize('hash', [
+    ht.dag_hash, ht.build_hash, ht.full_hash
+])
+def test_node_dict_flow_dump_matches_yaml(mock_packages, config, hash):
+    """The text hashed for each node must be the same as the YAML that
+    previous versions of Spack hashed."""
+    checked = 0
+    for name in repo.path.all_package_names():
+        try:
+            spec = Spec(name).concretized()
+            node_dicts = [node.to_node_dict(hash=hash)
+                          for node in spec.traverse()]
+        except Exception:
+            # Some mock packages are broken on purpose
+            continue
+
+        for node_dict in node_dicts:
+            assert syaml.dump_flow(node_dict) == syaml.dump(
+                node_dict, default_flow_style=True)
+            checked += 1
+
+    assert checked > 100
+
+
 @pytest.mark.parametrize("module", [
     spack.spec,
     spack.architecture,
@@ -4,9 +4,12 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import collections
+import hashlib
 import os
 import pytest
 import sys
+import threading
+import time
 
 from llnl.util.filesystem import working_dir, is_exe
 import llnl.util.tty as tty
@@ -252,3 +255,84 @@ def _which(*args, **kwargs):
             out = stage.fetch()
 
         assert err_fmt.format('curl') in out
+
+
+def test_download_slots_per_host(monkeypatch):
+    """Ensure concurrent downloads from the same host are bounded."""
+    monkeypatch.setattr(fs, 'max_downloads_per_host', 2)
+    monkeypatch.setattr(fs, '_host_slots', {})
+
+    # Each download waits for as many downloads from its host as should
+    # be able to run at the same time, so that the most downloads running
+    # does not depend on how the threads are scheduled
+    expected = {'a.example.com': 2, 'b.example.com': 2, 'local': 4}
+    running = collections.defaultdict(int)
+    most = collections.defaultdict(int)
+    cond = threading.Condition()
+    deadline = time.time() + 10
+
+    def download(url):
+        host = url.split('/')[2] or 'local'
+        with fs.download_slot(fs.URLFetchStrategy(url=url)):
+            with cond:
+                running[host] += 1
+                most[host] = max(most[host], running[host])
+                cond.notify_all()
+                while most[host] < expected[host] and time.time() < deadline:
+                    cond.wait(0.1)
+                running[host] -= 1
+
+    urls = ['https://a.example.com/{0}.tar.gz'.format(i) for i in range(4)]
+    urls += ['https://b.example.com/{0}.tar.gz'.format(i) for i in range(4)]
+    urls += ['file:///tmp/{0}.tar.gz'.format(i) for i in range(4)]
+    threads = [threading.Thread(target=download, args=(url,)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Local files are not limited
+    assert most == expected
+
+
+@pytest.mark.parametrize('method', ['curl', 'native'])
+def test_url_fetch_method(method, mock_http_server, tmpdir, config):
+    """Fetch an archive from an HTTP server with curl, or in process."""
+    data = b'archive contents'
+    mock_http_server.files['/archive.tar.gz'] = data
+
+    fetcher = fs.URLFetchStrategy(
+        mock_http_server.url('/archive.tar.gz'),
+        checksum=hashlib.sha256(data).hexdigest())
+    with spack.config.override('config:url_fetch_method', method):
+        with Stage(fetcher, path=str(tmpdir)):
+            fetcher.fetch()
+            with open(fetcher.archive_file, 'rb') as f:
+                assert f.read() == data
+            fetcher.check()
+
+
+def test_native_fetch_checks_while_downloading(
+        mock_http_server, tmpdir, config, monkeypatch):
+    """The checksum of an archive downloaded in process is computed while
+    downloading it, not by reading it again."""
+    data = b'archive contents'
+    mock_http_server.files['/archive.tar.gz'] = data
+
+    def read_again(*args, **kwargs):
+        raise AssertionError('the archive was read again')
+
+    monkeypatch.setattr(crypto, 'checksum', read_again)
+
+    fetcher = fs.URLFetchStrategy(
+        mock_http_server.url('/archive.tar.gz'),
+        checksum=hashlib.sha256(b'other contents').hexdigest())
+    with spack.config.override('config:url_fetch_method', 'native'):
+        with Stage(fetcher, path=str(tmpdir)):
+            fetcher.fetch()
+            with pytest.raises(fs.ChecksumError):
+                fetcher.check()
+
+    assert mock_http_server.requests == [
+        ('/archive.tar.gz', 'bytes=0-0'), ('/archive.tar.gz', None)]
+    assert mock_http_server.connections == 1
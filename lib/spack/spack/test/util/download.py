@@ -0,0 +1,140 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import hashlib
+import socket
+
+import pytest
+
+import spack.util.download as download
+
+data = b''.join(b'%d\n' % i for i in range(100000))
+
+
+def test_fetch_reuses_connections(mock_http_server, tmpdir):
+    for i in range(5):
+        mock_http_server.files['/archive-{0}.tar.gz'.format(i)] = data
+
+    for i in range(5):
+        path = str(tmpdir.join('archive-{0}.tar.gz'.format(i)))
+        hasher = hashlib.sha256()
+        download.fetch(
+            mock_http_server.url('/archive-{0}.tar.gz'.format(i)), path,
+            hasher=hasher)
+
+        with open(path, 'rb') as f:
+            assert f.read() == data
+        assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+    assert mock_http_server.connections == 1
+
+
+@pytest.mark.parametrize('accept_ranges,partial', [
+    (True, data[:1000]),
+    (False, b'garbage'),
+], ids=['ranges', 'no-ranges'])
+def test_fetch_resumes(mock_http_server, tmpdir, accept_ranges, partial):
+    mock_http_server.files['/archive.tar.gz'] = data
+    mock_http_server.accept_ranges = accept_ranges
+
+    path = tmpdir.join('archive.tar.gz')
+    path.write_binary(partial)
+
+    hasher = hashlib.sha256()
+    download.fetch(
+        mock_http_server.url('/archive.tar.gz'), str(path), hasher=hasher)
+
+    range_header = 'bytes={0}-'.format(len(partial))
+    assert mock_http_server.requests == [('/archive.tar.gz', range_header)]
+    assert path.read_binary() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize('partial', [
+    data,
+    data + b'garbage',
+], ids=['complete', 'larger'])
+def test_fetch_restarts_past_the_end(mock_http_server, tmpdir, partial):
+    mock_http_server.files['/archive.tar.gz'] = data
+
+    path = tmpdir.join('archive.tar.gz')
+    path.write_binary(partial)
+
+    hasher = hashlib.sha256()
+    download.fetch(
+        mock_http_server.url('/archive.tar.gz'), str(path), hasher=hasher)
+
+    # What was downloaded may not be the file, so it is downloaded again
+    range_header = 'bytes={0}-'.format(len(partial))
+    assert mock_http_server.requests == [
+        ('/archive.tar.gz', range_header), ('/archive.tar.gz', None)]
+    assert path.read_binary() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_fetch_follows_redirects(mock_http_server, tmpdir):
+    mock_http_server.files['/archive.tar.gz'] = data
+    mock_http_server.redirects['/latest.tar.gz'] = '/archive.tar.gz'
+
+    path = tmpdir.join('archive.tar.gz')
+    download.fetch(mock_http_server.url('/latest.tar.gz'), str(path))
+
+    assert path.read_binary() == data
+    assert mock_http_server.connections == 1
+
+
+def test_fetch_not_found(mock_http_server, tmpdir):
+    with pytest.raises(download.DownloadError) as e:
+        download.fetch(mock_http_server.url('/missing.tar.gz'),
+                       str(tmpdir.join('missing.tar.gz')))
+    assert e.value.status == 404
+
+
+def test_fetch_local_file(tmpdir):
+    source = tmpdir.join('source.tar.gz')
+    source.write_binary(data)
+
+    path = tmpdir.join('archive.tar.gz')
+    hasher = hashlib.sha256()
+    download.fetch('file://' + str(source), str(path), hasher=hasher)
+
+    assert path.read_binary() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_exists(mock_http_server, tmpdir):
+    mock_http_server.files['/archive.tar.gz'] = data
+    source = tmpdir.ensure('source.tar.gz')
+
+    assert download.exists(mock_http_server.url('/archive.tar.gz'))
+    assert not download.exists(mock_http_server.url('/missing.tar.gz'))
+    assert download.exists('file://' + str(source))
+    assert not download.exists('file://' + str(tmpdir.join('missing')))
+
+    assert mock_http_server.requests[0] == ('/archive.tar.gz', 'bytes=0-0')
+    assert mock_http_server.connections == 1
+
+
+class ClosedConnection(object):
+    """Connection closed by the server while it was idle in the pool."""
+
+    def request(self, *args, **kwargs):
+        raise socket.error('Connection reset by peer')
+
+    def close(self):
+        pass
+
+
+def test_stale_connection_is_replaced(mock_http_server, tmpdir):
+    mock_http_server.files['/archive.tar.gz'] = data
+
+    url = mock_http_server.url('/archive.tar.gz')
+    key = download._Request(url, {}, 10, True).key
+    download.pool.release(key, ClosedConnection())
+
+    path = tmpdir.join('archive.tar.gz')
+    download.fetch(url, str(path))
+
+    assert path.read_binary() == data
@@ -5,7 +5,12 @@
 
 import re
 import os
+import struct
+import sys
+import zlib
 from itertools import product
+from multiprocessing.pool import ThreadPool
+
 from spack.util.executable import which
 
 # Supported archive extensions.
@@ -64,3 +69,118 @@ def extension(path):
         if re.search(suffix, path):
             return t
     return None
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object compressing its data to the gzip format with
+    several threads.
+
+    Like ``pigz``, the data is cut into blocks that are deflated separately
+    and concatenated into a single gzip member, so the output can be read by
+    any gzip implementation.  zlib releases the GIL while compressing, so the
+    blocks are really compressed in parallel.
+    """
+
+    #: Size of the blocks deflated by each thread
+    block_size = 128 * 1024
+
+    #: Size of the window of preceding data used to deflate a block
+    window_size = 32 * 1024
+
+    def __init__(self, fileobj, jobs=1, compresslevel=6):
+        """
+        Args:
+            fileobj (file): binary file object the gzip data is written to,
+                which is not closed by ``close()``
+            jobs (int): number of threads compressing the data
+            compresslevel (int): zlib compression level from 1 to 9
+        """
+        self.fileobj = fileobj
+        self.jobs = max(1, jobs)
+        self.compresslevel = compresslevel
+        self.closed = False
+
+        self._pool = ThreadPool(self.jobs) if self.jobs > 1 else None
+        self._pending = None
+        self._buffer = []
+        self._buffered = 0
+        self._history = b''
+        self._crc = 0
+        self._size = 0
+
+        # Header without file name or modification time, for reproducibility
+        self.fileobj.write(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')
+
+    def _deflate(self, block_and_history):
+        block, history = block_and_history
+        args = (self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        if history and sys.version_info >= (3, 3):
+            compressor = zlib.compressobj(*args, zdict=history)
+        else:
+            compressor = zlib.compressobj(*args)
+
+        # A sync flush ends the block on a byte boundary without ending the
+        # deflate stream, so blocks can be concatenated
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _write_pending(self):
+        if self._pending is not None:
+            for data in self._pending.get():
+                self.fileobj.write(data)
+            self._pending = None
+
+    def _compress(self, final=False):
+        data = b''.join(self._buffer)
+        end = len(data) if final else len(data) - len(data) % self.block_size
+        self._buffer = [data[end:]]
+        self._buffered = len(data) - end
+
+        blocks = []
+        for start in range(0, end, self.block_size):
+            block = data[start:start + self.block_size]
+            blocks.append((block, self._history))
+            self._history = block[-self.window_size:]
+
+        # Compress these blocks while the caller produces the next ones
+        self._write_pending()
+        if self._pool is not None:
+            self._pending = self._pool.map_async(self._deflate, blocks)
+        else:
+            for block in blocks:
+                self.fileobj.write(self._deflate(block))
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed file')
+
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size * self.jobs:
+            self._compress()
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        self._compress(final=True)
+        self._write_pending()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+        # Empty final block, then the CRC and size of the uncompressed data
+        compressor = zlib.compressobj(
+            self.compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.fileobj.write(compressor.flush())
+        self.fileobj.write(struct.pack(
+            '<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,379 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""In-process downloads, used instead of ``curl`` when
+``config:url_fetch_method`` is ``native``.
+
+HTTP(S) connections are kept alive in a pool and reused by the following
+downloads from the same host, which saves the process spawn and the TLS
+handshake that each ``curl`` run costs.  Interrupted downloads are resumed
+with range requests, like ``curl -C -`` does, and the downloaded data can
+be hashed while it is written, so that it need not be read again to check
+its checksum.
+
+Only the standard library is used.  URLs whose scheme is not http or https
+(e.g. ``file://`` or ``ftp://``) are read with ``urlopen``.
+"""
+import os
+import shutil
+import socket
+import ssl
+import threading
+
+from six.moves import http_client
+import six.moves.urllib.parse as urllib_parse
+import six.moves.urllib.request as urllib_request
+from six.moves.urllib.error import URLError
+
+import spack.error
+
+#: Size of the chunks in which responses are read and written
+chunk_size = 2 ** 16
+
+#: Maximum number of redirects followed for a request
+max_redirects = 10
+
+#: Maximum number of idle connections kept alive for each host
+max_idle_per_host = 4
+
+_redirect_codes = (301, 302, 303, 307, 308)
+
+
+class DownloadError(spack.error.SpackError):
+    """Raised when a download fails."""
+
+    def __init__(self, url, msg, status=None):
+        super(DownloadError, self).__init__(
+            "Failed to download {0}".format(url), msg)
+        self.url = url
+
+        #: HTTP status of the failed request, if any
+        self.status = status
+
+
+class ConnectionPool(object):
+    """Idle HTTP(S) connections, keyed on the scheme, host and port they
+    connect to, and on the proxy and SSL settings they use.
+
+    Connections are taken out of the pool for a request and given back
+    once its response has been read entirely, so the pool can be shared
+    by threads.
+    """
+
+    def __init__(self, max_idle=max_idle_per_host):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take an idle connection for the key out of the pool.
+
+        Return:
+            (http_client.HTTPConnection) the connection, or ``None`` if
+                there is no idle connection for the key
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def release(self, key, connection):
+        """Give a connection whose last response was read entirely back to
+        the pool, or close it if the pool is full."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        """Close all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+#: Connections reused by all downloads
+pool = ConnectionPool()
+
+
+def _proxy_for(parsed_url):
+    """URL of the proxy to use for the URL, from the environment, or
+    ``None``."""
+    host = parsed_url.hostname or ''
+    if urllib_request.proxy_bypass(host):
+        return None
+    return urllib_request.getproxies().get(parsed_url.scheme)
+
+
+def _ssl_context(verify_ssl):
+    """SSL context for HTTPS connections, or ``None`` if this Python
+    cannot create one (before 2.7.9), which does not verify certificates.
+    """
+    if not hasattr(ssl, 'create_default_context'):
+        return None
+    if verify_ssl:
+        return ssl.create_default_context()  # novm
+    return ssl._create_unverified_context()
+
+
+class _Request(object):
+    """A request sent on a connection of the pool, whose connection goes
+    back to the pool once the response has been read."""
+
+    def __init__(self, url, headers, timeout, verify_ssl):
+        parsed = urllib_parse.urlparse(url)
+        proxy = _proxy_for(parsed)
+
+        self.key = (parsed.scheme, parsed.netloc, proxy, verify_ssl)
+        self.url = url
+        self.parsed = parsed
+        self.proxy = proxy
+        self.headers = headers
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+
+        self.connection = None
+        self.response = None
+
+    def _connect(self):
+        """Open a new connection for the request."""
+        https = self.parsed.scheme == 'https'
+        kwargs = {'timeout': self.timeout or None}
+        context = _ssl_context(self.verify_ssl) if https else None
+        if context is not None:
+            kwargs['context'] = context
+
+        if self.proxy:
+            proxy = urllib_parse.urlparse(self.proxy)
+            address = proxy.netloc.rpartition('@')[2]
+        else:
+            address = self.parsed.netloc
+
+        if https:
+            connection = http_client.HTTPSConnection(address, **kwargs)
+        else:
+            connection = http_client.HTTPConnection(address, **kwargs)
+
+        if self.proxy and https:
+            connection.set_tunnel(
+                self.parsed.hostname, self.parsed.port or 443)
+
+        # Like curl's --connect-timeout, the timeout only applies to
+        # establishing the connection
+        connection.connect()
+        connection.sock.settimeout(None)
+        return connection
+
+    @property
+    def _target(self):
+        """What to ask the server (or the proxy) for."""
+        if self.proxy and self.parsed.scheme == 'http':
+            return self.url
+        target = self.parsed.path or '/'
+        if self.parsed.query:
+            target += '?' + self.parsed.query
+        return target
+
+    def send(self, method='GET'):
+        """Send the request and read the status and headers of the response.
+
+        A connection from the pool may have been closed by the server since
+        its last use, in which case the request is sent again on a new one.
+        """
+        while True:
+            connection = pool.acquire(self.key)
+            reused = connection is not None
+            try:
+                if not reused:
+                    connection = self._connect()
+                connection.request(method, self._target, headers=self.headers)
+                self.response = connection.getresponse()
+                self.connection = connection
+                return self.response
+            except (http_client.HTTPException, socket.error):
+                if connection is not None:
+                    connection.close()
+                if not reused:
+                    raise
+
+    def close(self):
+        """Give the connection back to the pool if the response was read
+        entirely, and close it otherwise."""
+        if self.connection is None:
+            return
+        if self.response.isclosed() and not self.response.will_close:
+            pool.release(self.key, self.connection)
+        else:
+            self.connection.close()
+        self.connection = None
+
+    def discard(self):
+        """Read the rest of the response, so the connection can be reused,
+        and give the connection back to the pool."""
+        self.response.read()
+        self.close()
+
+
+def _open(url, headers, timeout, verify_ssl):
+    """Send a GET request, following redirects.
+
+    Return:
+        (_Request) the request whose response is not a redirect
+    """
+    for _ in range(max_redirects + 1):
+        request = _Request(url, headers, timeout, verify_ssl)
+        response = request.send()
+        location = response.getheader('Location')
+        if response.status not in _redirect_codes or not location:
+            return request
+
+        request.discard()
+        url = urllib_parse.urljoin(url, location)
+
+    raise DownloadError(url, "Too many redirects")
+
+
+def _hash_file(path, hasher):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+
+
+def _copy(source, path, mode, hasher):
+    """Write the data read from the source to the file, updating the hasher
+    if there is one."""
+    with open(path, mode) as f:
+        if hasher is None:
+            shutil.copyfileobj(source, f, chunk_size)
+            return
+
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            hasher.update(chunk)
+            f.write(chunk)
+
+
+def _fetch_with_urlopen(url, path, hasher, timeout):
+    """Download a URL that is not HTTP(S), e.g. a local file."""
+    try:
+        response = urllib_request.urlopen(url, timeout=timeout or None)
+    except (URLError, IOError, OSError) as e:
+        raise DownloadError(url, str(e))
+
+    try:
+        _copy(response, path, 'wb', hasher)
+    finally:
+        response.close()
+
+    headers = getattr(response, 'headers', None)
+    return headers.get('Content-Type') if headers else None
+
+
+def fetch(url, path, hasher=None, resume=True, headers=None,
+          timeout=10, verify_ssl=True):
+    """Download a URL to a file.
+
+    Args:
+        url (str): the URL to download
+        path (str): file to download it to
+        hasher: hash object (e.g. from ``hashlib``) updated with the
+            contents of the file, which can then be checked without
+            reading the file again
+        resume (bool): if the file exists, ask the server for the rest of
+            it only, like ``curl -C -``.  The file is downloaded from
+            scratch if the server does not support range requests, or if
+            the file is not longer than what was already downloaded.
+        headers (dict): additional headers to send with the requests
+        timeout (int): timeout, in seconds, to establish connections (0
+            means no timeout)
+        verify_ssl (bool): whether to verify the certificates of servers
+
+    Return:
+        (str) the content type of the response, if any
+
+    Raises:
+        DownloadError: if the URL cannot be downloaded
+    """
+    parsed = urllib_parse.urlparse(url)
+    if parsed.scheme not in ('http', 'https'):
+        return _fetch_with_urlopen(url, path, hasher, timeout)
+
+    request_headers = dict(headers or {})
+    offset = 0
+    if resume and os.path.isfile(path):
+        offset = os.path.getsize(path)
+    if offset:
+        request_headers['Range'] = 'bytes={0}-'.format(offset)
+
+    try:
+        request = _open(url, request_headers, timeout, verify_ssl)
+    except (http_client.HTTPException, socket.error) as e:
+        raise DownloadError(url, str(e))
+
+    try:
+        response = request.response
+        status = response.status
+        if offset and status == 416:
+            # The file is no longer than what was downloaded, but what was
+            # downloaded may be larger or different: download it again
+            request.discard()
+            mode = None
+        elif offset and status == 206:
+            mode = 'ab'
+        elif status == 200:
+            mode = 'wb'
+        else:
+            raise DownloadError(
+                url, "HTTP error {0}: {1}".format(status, response.reason),
+                status=status)
+
+        if mode is not None:
+            if hasher is not None and mode == 'ab':
+                _hash_file(path, hasher)
+
+            try:
+                _copy(response, path, mode, hasher)
+            except (http_client.HTTPException, socket.error) as e:
+                raise DownloadError(url, str(e))
+
+            return response.getheader('Content-Type')
+    finally:
+        request.close()
+
+    return fetch(url, path, hasher=hasher, resume=False, headers=headers,
+                 timeout=timeout, verify_ssl=verify_ssl)
+
+
+def exists(url, timeout=10, verify_ssl=True):
+    """Whether the URL can be downloaded.
+
+    The first byte of HTTP(S) URLs is requested on a pooled connection,
+    like ``curl -r 0-0`` does.
+    """
+    parsed = urllib_parse.urlparse(url)
+    if parsed.scheme == 'file':
+        return os.path.isfile(urllib_request.url2pathname(parsed.path))
+
+    if parsed.scheme not in ('http', 'https'):
+        try:
+            urllib_request.urlopen(url, timeout=timeout or None).close()
+            return True
+        except (URLError, IOError, OSError):
+            return False
+
+    try:
+        request = _open(url, {'Range': 'bytes=0-0'}, timeout, verify_ssl)
+    except (DownloadError, http_client.HTTPException, socket.error):
+        return False
+
+    try:
+        request.discard()
+    except (http_client.HTTPException, socket.error):
+        pass
+    return request.response.status < 400
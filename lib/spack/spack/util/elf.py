@@ -0,0 +1,275 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Read and rewrite the RPATH of ELF files without running ``patchelf``.
+
+Only the dynamic section, the dynamic string table and the tables referring
+to it are parsed. The RPATH can be rewritten in place when the new string fits
+in the space of the old one and no other string overlaps with it, which is the
+common case when relocating to a shorter prefix; otherwise ``patchelf`` is
+needed to grow the string table.
+"""
+import collections
+import struct
+
+import spack.error
+
+#: Segment types
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+#: Dynamic section tags
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+#: Section types
+SHT_STRTAB = 3
+SHT_DYNAMIC = 6
+SHT_DYNSYM = 11
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERNEED = 0x6ffffffe
+
+#: Dynamic section tags whose value is an offset in the string table
+_string_tags = (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH)
+
+#: Layout of the ELF header after e_ident, program headers, section headers
+#: and dynamic entries for 32 and 64 bit files
+_formats = {
+    1: ('HHIIIIIHHHHHH', 'IIIIIIII', 'IIIIIIIIII', 'iI'),
+    2: ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'IIQQQQIIQQ', 'qQ'),
+}
+
+#: Fields of a dynamic entry, with the offset of the entry in the file
+DynamicEntry = collections.namedtuple('DynamicEntry', 'tag value offset')
+
+#: Fields of a section header used here
+Section = collections.namedtuple(
+    'Section', 'type offset size link info entsize')
+
+
+class ElfFile(object):
+    """Dynamic section and string table of an ELF file."""
+
+    def __init__(self, f):
+        """Parse the ELF file open in binary mode in f.
+
+        Raises:
+            ElfParsingError: if the file is not a valid ELF file
+        """
+        self.f = f
+        ident = self._read(0, 16)
+        if ident[:4] != b'\x7fELF' or ident[4:5] not in (b'\x01', b'\x02'):
+            raise ElfParsingError('not an ELF file')
+        elf_class = ord(ident[4:5])
+        self.byte_order = '<' if ident[5:6] == b'\x01' else '>'
+        header_fmt, phdr_fmt, shdr_fmt, dyn_fmt = _formats[elf_class]
+        self.dyn_fmt = self.byte_order + dyn_fmt
+
+        header = self._unpack(header_fmt, 16)
+        phoff, phentsize, phnum = header[4], header[8], header[9]
+        shoff, shentsize, shnum = header[5], header[10], header[11]
+        program_headers = [
+            self._unpack(phdr_fmt, phoff + i * phentsize)
+            for i in range(phnum)
+        ]
+        if elf_class == 1:
+            # p_type, p_offset, p_vaddr, p_paddr, p_filesz, ...
+            segments = [(p[0], p[1], p[2], p[4]) for p in program_headers]
+        else:
+            # p_type, p_flags, p_offset, p_vaddr, p_paddr, p_filesz, ...
+            segments = [(p[0], p[2], p[3], p[5]) for p in program_headers]
+
+        self.loads = [s[1:] for s in segments if s[0] == PT_LOAD]
+
+        # sh_type, sh_offset, sh_size, sh_link, sh_info, sh_entsize
+        self.sections = []
+        for i in range(shnum if shoff else 0):
+            sh = self._unpack(shdr_fmt, shoff + i * shentsize)
+            self.sections.append(Section(*(sh[1:2] + sh[4:8] + sh[9:10])))
+        self.entries = []
+        dynamic = [s for s in segments if s[0] == PT_DYNAMIC]
+        if dynamic:
+            _, offset, _, size = dynamic[0]
+            entry_size = struct.calcsize(self.dyn_fmt)
+            for entry_offset in range(offset, offset + size, entry_size):
+                tag, value = self._unpack(dyn_fmt, entry_offset)
+                if tag == DT_NULL:
+                    break
+                self.entries.append(DynamicEntry(tag, value, entry_offset))
+
+        self.strtab, self.strsz = None, 0
+        tags = dict((e.tag, e.value) for e in self.entries)
+        if DT_STRTAB in tags:
+            self.strtab = self._file_offset(tags[DT_STRTAB])
+            self.strsz = tags.get(DT_STRSZ, 0)
+
+    def _read(self, offset, size):
+        self.f.seek(offset)
+        data = self.f.read(size)
+        if len(data) != size:
+            raise ElfParsingError('unexpected end of file')
+        return data
+
+    def _unpack(self, fmt, offset):
+        fmt = self.byte_order + fmt
+        return struct.unpack(fmt, self._read(offset, struct.calcsize(fmt)))
+
+    def _file_offset(self, address):
+        """Offset in the file of a virtual address."""
+        for offset, vaddr, filesz in self.loads:
+            if vaddr <= address < vaddr + filesz:
+                return address - vaddr + offset
+        raise ElfParsingError(
+            'address {0:#x} is not in a loaded segment'.format(address))
+
+    def _string(self, index):
+        """Null-terminated string at an index of the string table."""
+        if self.strtab is None or not 0 <= index < self.strsz:
+            raise ElfParsingError('invalid string table index')
+        data = self._read(self.strtab + index, self.strsz - index)
+        return data.split(b'\0', 1)[0]
+
+    def _string_references(self):
+        """Indexes in the dynamic string table used by the symbol and symbol
+        version tables.
+
+        Returns:
+            A list of indexes, or None if the tables referring to the string
+            table cannot all be found or parsed.
+        """
+        dynstr = [i for i, sh in enumerate(self.sections)
+                  if sh.type == SHT_STRTAB and sh.offset == self.strtab]
+        if not dynstr:
+            return None
+
+        indexes = []
+        for sh in self.sections:
+            if sh.link != dynstr[0] or sh.type == SHT_DYNAMIC:
+                # The dynamic entries are checked separately
+                continue
+
+            if sh.type == SHT_DYNSYM and sh.entsize:
+                # st_name is the first field of a symbol
+                for offset in range(sh.offset, sh.offset + sh.size,
+                                    sh.entsize):
+                    indexes.append(self._unpack('I', offset)[0])
+
+            elif sh.type == SHT_GNU_VERNEED:
+                offset = sh.offset
+                for _ in range(sh.info):
+                    _, cnt, vn_file, aux, vn_next = self._unpack(
+                        'HHIII', offset)
+                    indexes.append(vn_file)
+                    aux_offset = offset + aux
+                    for _ in range(cnt):
+                        _, _, _, vna_name, aux_next = self._unpack(
+                            'IHHII', aux_offset)
+                        indexes.append(vna_name)
+                        aux_offset += aux_next
+                    offset += vn_next
+
+            elif sh.type == SHT_GNU_VERDEF:
+                offset = sh.offset
+                for _ in range(sh.info):
+                    _, _, _, cnt, _, aux, vd_next = self._unpack(
+                        'HHHHIII', offset)
+                    aux_offset = offset + aux
+                    for _ in range(cnt):
+                        vda_name, aux_next = self._unpack('II', aux_offset)
+                        indexes.append(vda_name)
+                        aux_offset += aux_next
+                    offset += vd_next
+
+            else:
+                # Some other table refers to the string table
+                return None
+
+        return indexes
+
+    def rpath_entries(self):
+        """The DT_RUNPATH and DT_RPATH entries, in this order."""
+        return sorted((e for e in self.entries
+                       if e.tag in (DT_RPATH, DT_RUNPATH)),
+                      key=lambda e: e.tag != DT_RUNPATH)
+
+    def rpaths(self):
+        """The paths in the RUNPATH or, if there is none, in the RPATH."""
+        entries = self.rpath_entries()
+        if not entries:
+            return []
+        rpath = self._string(entries[0].value).decode('utf-8')
+        return rpath.split(':') if rpath else []
+
+    def set_rpaths_in_place(self, rpaths):
+        """Overwrite the current RPATH or RUNPATH with the paths passed as
+        arguments, and make it an RPATH like ``patchelf --force-rpath``.
+
+        The file must be open for reading and writing.
+
+        Returns:
+            True if the paths were written, False if the file has no RPATH,
+            both an RPATH and a RUNPATH, the new string does not fit in the
+            space of the old one, or other strings may overlap with it.
+        """
+        entries = self.rpath_entries()
+        if len(entries) != 1:
+            return False
+        entry = entries[0]
+
+        old = self._string(entry.value)
+        new = ':'.join(rpaths).encode('utf-8')
+        if len(new) > len(old):
+            return False
+
+        # The linker may share the end of the string with other strings,
+        # e.g., names of libraries, symbols or symbol versions
+        others = self._string_references()
+        if others is None:
+            return False
+        others.extend(e.value for e in self.entries
+                      if e is not entry and e.tag in _string_tags)
+
+        start, end = entry.value, entry.value + len(old)
+        if any(start <= other <= end for other in others):
+            return False
+
+        self.f.seek(self.strtab + start)
+        self.f.write(new + b'\0' * (len(old) - len(new)))
+        if entry.tag != DT_RPATH:
+            self.f.seek(entry.offset)
+            self.f.write(struct.pack(self.dyn_fmt, DT_RPATH, entry.value))
+        return True
+
+
+def get_rpaths(path):
+    """Return the RPATHs of an ELF file, as ``patchelf --print-rpath``.
+
+    Raises:
+        ElfParsingError: if the file is not a valid ELF file
+    """
+    with open(path, 'rb') as f:
+        return ElfFile(f).rpaths()
+
+
+def set_rpaths_in_place(path, rpaths):
+    """Replace the RPATH of an ELF file in place, if the new one fits.
+
+    Returns:
+        True if the RPATH was replaced, False if ``patchelf`` is needed
+
+    Raises:
+        ElfParsingError: if the file is not a valid ELF file
+    """
+    with open(path, 'rb+') as f:
+        return ElfFile(f).set_rpaths_in_place(rpaths)
+
+
+class ElfParsingError(spack.error.SpackError):
+    """Raised when a file cannot be parsed as an ELF file."""
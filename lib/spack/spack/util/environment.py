@@ -6,6 +6,7 @@
 """Utilities for setting and modifying environment variables."""
 import collections
 import contextlib
+import hashlib
 import inspect
 import json
 import os
@@ -582,6 +583,10 @@ def from_sourcing_file(filename, *arguments, **kwargs):
                 variables (default: []). has precedence over blacklist.
             clean (bool): in addition to removing empty entries,
                 also remove duplicate entries (default: False).
+            cache (bool): reuse the environment computed earlier by this
+                process when sourcing a file with the same contents in the
+                same environment. Files sourced by the file are not
+                checked for changes (default: False)
         """
         # Check if the file actually exists
         if not os.path.isfile(filename):
@@ -889,10 +894,39 @@ def preserve_environment(*variables):
             del os.environ[var]
 
 
+#: Environments computed by ``environment_after_sourcing_files`` in this
+#: process, keyed on the contents of the files, their arguments, the shell
+#: command and the initial environment. Files sourced in turn by those
+#: files are not part of the key.
+_sourcing_cache = {}
+
+
+def _sourcing_cache_key(files, environment, shell_args):
+    """Key of the environment after sourcing files, or ``None`` if one of
+    the files cannot be read."""
+    hashed_files = []
+    for file_and_args in files:
+        try:
+            with open(file_and_args[0], 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+        hashed_files.append((digest,) + tuple(file_and_args[1:]))
+
+    environment_hash = hashlib.sha256(json.dumps(
+        sorted(environment.items())).encode('utf-8')).hexdigest()
+    return tuple(hashed_files), environment_hash, shell_args
+
+
 def environment_after_sourcing_files(*files, **kwargs):
     """Returns a dictionary with the environment that one would have
     after sourcing the files passed as argument.
 
+    The environment after sourcing only ``os.devnull``, which
+    :py:meth:`EnvironmentModifications.from_sourcing_file` compares each
+    file to, is cached for the lifetime of the process. Other files are
+    cached only if ``cache`` is set.
+
     Args:
         *files: each item can either be a string containing the path
             of the file to be sourced or a sequence, where the first element
@@ -908,6 +942,16 @@ def environment_after_sourcing_files(*files, **kwargs):
             (default: ``&> /dev/null``)
         concatenate_on_success (str): operator used to execute a command
             only when the previous command succeeds (default: ``&&``)
+        batch (bool): source all the files in a single shell, as one would
+            in a terminal, rather than each file in its own shell, which
+            only sees the variables exported by the previous ones
+            (default: False)
+        cache (bool): reuse the environment computed earlier by this
+            process for files with the same contents and arguments in the
+            same initial environment. Only the files passed as argument are
+            hashed: a change to a file they source is not detected, so use
+            it only for files that source nothing that may change
+            (default: False)
     """
     # Set the shell executable that will be used to source files
     shell_cmd = kwargs.get('shell', '/bin/bash')
@@ -915,13 +959,18 @@ def environment_after_sourcing_files(*files, **kwargs):
     source_command = kwargs.get('source_command', 'source')
     suppress_output = kwargs.get('suppress_output', '&> /dev/null')
     concatenate_on_success = kwargs.get('concatenate_on_success', '&&')
+    batch = kwargs.get('batch', False)
+    cache = kwargs.get('cache', False)
 
     shell = executable.Executable(' '.join([shell_cmd, shell_options]))
 
-    def _source_single_file(file_and_args, environment):
-        source_file = [source_command]
-        source_file.extend(x for x in file_and_args)
-        source_file = ' '.join(source_file)
+    def _source_files(files, environment):
+        commands = []
+        for file_and_args in files:
+            source_file = [source_command]
+            source_file.extend(x for x in file_and_args)
+            commands.extend([' '.join(source_file), suppress_output,
+                             concatenate_on_success])
 
         # If the environment contains 'python' use it, if not
         # go with sys.executable. Below we just need a working
@@ -932,11 +981,8 @@ def _source_single_file(file_and_args, environment):
         dump_cmd = 'import os, json; print(json.dumps(dict(os.environ)))'
         dump_environment = python_cmd + ' -c "{0}"'.format(dump_cmd)
 
-        # Try to source the file
-        source_file_arguments = ' '.join([
-            source_file, suppress_output,
-            concatenate_on_success, dump_environment,
-        ])
+        # Try to source the files
+        source_file_arguments = ' '.join(commands + [dump_environment])
         output = shell(source_file_arguments, output=str, env=environment)
         environment = json.loads(output)
 
@@ -950,14 +996,32 @@ def _source_single_file(file_and_args, environment):
 
         return environment
 
+    def _source_files_cached(files, environment):
+        key = None
+        # Sourcing os.devnull can't go stale, so it is always cached
+        if cache or all(f == [os.devnull] for f in files):
+            shell_args = (shell_cmd, shell_options, source_command,
+                          suppress_output, concatenate_on_success)
+            key = _sourcing_cache_key(files, environment, shell_args)
+        if key is not None and key in _sourcing_cache:
+            return dict(_sourcing_cache[key])
+
+        environment = _source_files(files, environment)
+        if key is not None:
+            _sourcing_cache[key] = dict(environment)
+        return environment
+
+    # Normalize the input to the helper functions
+    files = [[f] if isinstance(f, six.string_types) else list(f)
+             for f in files]
+
     current_environment = kwargs.get('env', dict(os.environ))
-    for f in files:
-        # Normalize the input to the helper function
-        if isinstance(f, six.string_types):
-            f = [f]
+    if batch:
+        return _source_files_cached(files, current_environment)
 
-        current_environment = _source_single_file(
-            f, environment=current_environment
+    for f in files:
+        current_environment = _source_files_cached(
+            [f], environment=current_environment
         )
 
     return current_environment
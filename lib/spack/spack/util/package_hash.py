@@ -14,6 +14,33 @@
 import spack.util.naming
 
 
+def is_directive(node):
+    """Check to determine if the node is a valid directive
+
+    Directives are assumed to be represented in the AST as a named function
+    call expression.  This means that they will NOT be represented by a
+    named function call within a function call expression (e.g., as
+    callbacks are sometimes represented).
+
+    Args:
+        node (AST): the AST node being checked
+
+    Returns:
+        (bool): ``True`` if the node represents a known directive,
+            ``False`` otherwise
+    """
+    return (isinstance(node, ast.Expr) and
+            node.value and isinstance(node.value, ast.Call) and
+            isinstance(node.value.func, ast.Name) and
+            node.value.func.id in spack.directives.__all__)
+
+
+def parse_file(filename):
+    """Parse a Python file into an AST."""
+    with open(filename) as f:
+        return ast.parse(f.read(), filename)
+
+
 class RemoveDocstrings(ast.NodeTransformer):
     """Transformer that removes docstrings from a Python AST."""
     def remove_docstring(self, node):
@@ -41,24 +68,7 @@ def __init__(self, spec):
         self.spec = spec
 
     def is_directive(self, node):
-        """Check to determine if the node is a valid directive
-
-        Directives are assumed to be represented in the AST as a named function
-        call expression.  This means that they will NOT be represented by a
-        named function call within a function call expression (e.g., as
-        callbacks are sometimes represented).
-
-        Args:
-            node (AST): the AST node being checked
-
-        Returns:
-            (bool): ``True`` if the node represents a known directive,
-                ``False`` otherwise
-        """
-        return (isinstance(node, ast.Expr) and
-                node.value and isinstance(node.value, ast.Call) and
-                isinstance(node.value.func, ast.Name) and
-                node.value.func.id in spack.directives.__all__)
+        return is_directive(node)
 
     def is_spack_attr(self, node):
         return (isinstance(node, ast.Assign) and
@@ -138,9 +148,7 @@ def package_ast(spec):
     spec = spack.spec.Spec(spec)
 
     filename = spack.repo.path.filename_for_package_name(spec.name)
-    with open(filename) as f:
-        text = f.read()
-        root = ast.parse(text)
+    root = parse_file(filename)
 
     root = RemoveDocstrings().visit(root)
 
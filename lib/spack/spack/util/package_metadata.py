@@ -0,0 +1,840 @@
+# Copyright 2013-2020 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Extract package metadata without importing package files.
+
+Read-only commands like ``spack list`` only need the data declared by
+directives (versions, variants, dependencies, ...) and a few class
+attributes. Importing a package to get them means executing its module
+and all of its directives. Most packages declare this data with literal
+arguments, so here we read it off the AST of ``package.py`` instead, and
+only import a package when its directives are computed dynamically.
+
+Directive calls are recognized in the same way as when package files are
+hashed (see ``spack.util.package_hash``).
+
+The resulting ``PackageMetadata`` records are cached per repository in a
+``PackageMetadataIndex`` (see ``spack.repo.MetadataIndexer``), which also
+feeds the provider and tag indexes.
+"""
+import ast
+import contextlib
+import copy
+import glob
+import inspect
+import os
+import re
+import textwrap
+
+import six
+from six import StringIO
+
+import llnl.util.tty as tty
+
+import spack.dependency
+import spack.error
+import spack.paths
+import spack.repo
+import spack.spec
+import spack.util.naming
+import spack.util.spack_json as sjson
+from spack.version import Version
+
+#: Class attributes that are stored in a ``PackageMetadata`` record
+metadata_attrs = ('homepage', 'maintainers', 'tags', 'build_system_class',
+                  'phases')
+
+#: Class attributes that determine how versions are fetched
+fetch_attrs = ('url', 'urls', 'git', 'hg', 'svn', 'go', 's3',
+               'fetch_options', 'has_code')
+
+#: Methods that compute fetch URLs, which packages may override
+fetch_methods = ('url_for_version', 'url_version', 'nearest_url',
+                 'version_urls')
+
+#: Matches the name at the start of a spec without a namespace
+_spec_name_re = re.compile(r'\s*([\w-]+)(?=$|[@%+~^\s])')
+
+
+class PackageMetadata(object):
+    """Directive data and metadata attributes of a single package.
+
+    This mimics the parts of the package class interface that read-only
+    commands need. Specs are kept as strings: ``when`` conditions are
+    ``None`` for unconditional directives, and otherwise spec strings that
+    are either anonymous or named after the package itself.
+    """
+    def __init__(self, name, namespace, doc=None, homepage=None,
+                 maintainers=None, tags=None, build_system_class=None,
+                 phases=None, fetch_attrs=None, versions=None,
+                 variants=None, dependencies=None, provided=None,
+                 conflicts=None, patches=None):
+        self.name = name
+        self.namespace = namespace
+        self.doc = doc
+        self.homepage = homepage
+        self.maintainers = maintainers or []
+        self.tags = tags or []
+        self.build_system_class = build_system_class
+        self.phases = list(phases or [])
+
+        #: attribute name -> value of the attributes in ``fetch_attrs``
+        #: that the package sets, or ``None`` if they're computed
+        self.fetch_attrs = fetch_attrs
+
+        #: version string -> fetch arguments
+        self.version_args = versions or {}
+        #: variant name -> dict with default, description, multi and
+        #: allowed_values
+        self.variants = variants or {}
+        #: dependency name -> list of dicts with spec, when and type
+        self.dependencies = dependencies or {}
+        #: list of dicts with spec and when
+        self.provided = provided or []
+        #: list of dicts with spec, when and msg
+        self.conflicts = conflicts or []
+        #: list of dicts with url_or_filename, when, level and working_dir
+        self.patches = patches or []
+
+        self._versions = None
+
+    @property
+    def fullname(self):
+        return '%s.%s' % (self.namespace, self.name)
+
+    @property
+    def versions(self):
+        """Versions of the package, as in ``PackageBase.versions``."""
+        if self._versions is None:
+            self._versions = dict(
+                (Version(v), args) for v, args in self.version_args.items())
+        return self._versions
+
+    @property
+    def provided_specs(self):
+        """Virtual specs provided by the package, as in
+        ``PackageBase.provided``: each provided spec maps to the set of
+        ``when`` specs under which it is provided."""
+        provided = {}
+        for p in self.provided:
+            when_spec = spack.spec.Spec(p['when']) if p['when'] else \
+                spack.spec.Spec()
+            when_spec.name = self.name
+            provided.setdefault(
+                spack.spec.Spec(p['spec']), set()).add(when_spec)
+        return provided
+
+    def dependencies_of_type(self, *deptypes):
+        """Get dependencies that can possibly have these deptypes.
+
+        See ``PackageBase.dependencies_of_type()``.
+        """
+        return dict(
+            (name, conds) for name, conds in self.dependencies.items()
+            if any(dt in cond['type'] for cond in conds for dt in deptypes))
+
+    def possible_dependencies(self, transitive=True, expand_virtuals=True,
+                              deptype='all', visited=None, missing=None):
+        """Return dict of possible dependencies of this package.
+
+        See ``PackageBase.possible_dependencies()``, whose results this
+        reproduces from metadata records.
+        """
+        deptype = spack.dependency.canonical_deptype(deptype)
+
+        visited = {} if visited is None else visited
+        missing = {} if missing is None else missing
+
+        visited.setdefault(self.name, set())
+
+        for name, conds in self.dependencies_of_type(*deptype).items():
+            # expand virtuals if enabled, otherwise just stop at virtuals
+            if spack.repo.path.is_virtual(name):
+                if expand_virtuals:
+                    providers = spack.repo.path.providers_for(name)
+                    dep_names = [spec.name for spec in providers]
+                else:
+                    visited[self.name].add(name)
+                    visited.setdefault(name, set())
+                    continue
+            else:
+                dep_names = [name]
+
+            visited[self.name].update(dep_names)
+
+            for dep_name in dep_names:
+                if dep_name in visited:
+                    continue
+
+                visited.setdefault(dep_name, set())
+
+                if not transitive:
+                    continue
+
+                try:
+                    dep = spack.repo.path.get_pkg_metadata(
+                        dep_name, cached=True)
+                except spack.repo.UnknownPackageError:
+                    missing.setdefault(self.name, set()).add(dep_name)
+                    continue
+
+                dep.possible_dependencies(
+                    transitive, expand_virtuals, deptype, visited, missing)
+
+        return visited
+
+    @property
+    def has_code(self):
+        """Whether the package has source code to fetch."""
+        if self.fetch_attrs is None:
+            return spack.repo.path.get_pkg_class(self.fullname).has_code
+        return self.fetch_attrs.get('has_code', True)
+
+    def fetcher(self, version):
+        """Fetch strategy for a version of the package.
+
+        See ``spack.fetch_strategy.for_package_version()``. The package is
+        imported only if its fetch attributes are computed.
+        """
+        import spack.fetch_strategy as fs  # circular import
+        if self.fetch_attrs is None:
+            pkg = spack.repo.path.get(self.fullname)
+        else:
+            pkg = _FetchAttributes(self)
+        return fs.for_package_version(pkg, version)
+
+    def format_doc(self, **kwargs):
+        """Wrap doc string at 72 characters and format nicely"""
+        indent = kwargs.get('indent', 0)
+
+        if not self.doc:
+            return ""
+
+        doc = re.sub(r'\s+', ' ', self.doc)
+        lines = textwrap.wrap(doc, 72)
+        results = StringIO()
+        for line in lines:
+            results.write((" " * indent) + line + "\n")
+        return results.getvalue()
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'namespace': self.namespace,
+            'doc': self.doc,
+            'homepage': self.homepage,
+            'maintainers': self.maintainers,
+            'tags': self.tags,
+            'build_system_class': self.build_system_class,
+            'phases': self.phases,
+            'fetch_attrs': self.fetch_attrs,
+            'versions': self.version_args,
+            'variants': self.variants,
+            'dependencies': self.dependencies,
+            'provided': self.provided,
+            'conflicts': self.conflicts,
+            'patches': self.patches,
+        }
+
+    @staticmethod
+    def from_dict(d):
+        d = dict(d)
+        return PackageMetadata(d.pop('name'), d.pop('namespace'), **d)
+
+    @staticmethod
+    def from_package_class(pkg_cls):
+        """Build a record from an imported package class."""
+        def when_str(when_spec):
+            if when_spec.name == pkg_cls.name:
+                when_spec = when_spec.copy(deps=False)
+                when_spec.name = None
+            return str(when_spec) or None
+
+        variants = dict(
+            (name, {'default': v.default,
+                    'description': v.description,
+                    'multi': v.multi,
+                    'allowed_values': v.allowed_values})
+            for name, v in pkg_cls.variants.items())
+
+        dependencies = dict(
+            (name, [{'spec': str(dep.spec),
+                     'when': when_str(when),
+                     'type': sorted(dep.type)}
+                    for when, dep in conds.items()])
+            for name, conds in pkg_cls.dependencies.items())
+
+        provided = [
+            {'spec': str(spec), 'when': when_str(when)}
+            for spec, whens in pkg_cls.provided.items() for when in whens]
+
+        conflicts = [
+            {'spec': spec, 'when': when_str(when), 'msg': msg}
+            for spec, whens in pkg_cls.conflicts.items()
+            for when, msg in whens]
+
+        patches = [
+            {'url_or_filename': getattr(p, 'url', None) or p.relative_path,
+             'when': when_str(when),
+             'level': p.level,
+             'working_dir': p.working_dir}
+            for when, patch_list in pkg_cls.patches.items()
+            for p in patch_list]
+
+        return PackageMetadata(
+            pkg_cls.name, pkg_cls.namespace,
+            doc=pkg_cls.__doc__,
+            homepage=getattr(pkg_cls, 'homepage', None),
+            maintainers=list(getattr(pkg_cls, 'maintainers', [])),
+            tags=list(getattr(pkg_cls, 'tags', [])),
+            build_system_class=getattr(pkg_cls, 'build_system_class', None),
+            phases=list(getattr(pkg_cls, 'phases', [])),
+            versions=dict(
+                (str(v), dict(args)) for v, args in pkg_cls.versions.items()),
+            variants=variants,
+            dependencies=dependencies,
+            provided=provided,
+            conflicts=conflicts,
+            patches=patches)
+
+
+class _FetchAttributes(object):
+    """Stands in for a package in ``fs.for_package_version()``, with the
+    fetch attributes of a ``PackageMetadata`` record and the URL methods
+    of ``PackageBase``."""
+    def __init__(self, metadata):
+        import spack.package  # circular import through spack.repo
+        self.name = metadata.name
+        self.versions = metadata.versions
+        self.fetch_options = spack.package.PackageBase.fetch_options
+        self.has_code = True
+        for attr, value in metadata.fetch_attrs.items():
+            setattr(self, attr, value)
+
+    def _base_method(name):
+        def method(self, *args):
+            import spack.package  # circular import through spack.repo
+            function = six.get_unbound_function(
+                getattr(spack.package.PackageBase, name))
+            return function(self, *args)
+        method.__name__ = name
+        return method
+
+    version_urls = _base_method('version_urls')
+    nearest_url = _base_method('nearest_url')
+    url_for_version = _base_method('url_for_version')
+    url_version = _base_method('url_version')
+    del _base_method
+
+
+class _MetadataBuilder(object):
+    """Applies directive calls to a ``PackageMetadata`` record.
+
+    Each method has the signature of the directive with the same name.
+    """
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    @staticmethod
+    def _when(when):
+        if when is False:
+            return False
+        if when is None or when is True or when == '':
+            return None
+        return when
+
+    def version(self, ver, checksum=None, **kwargs):
+        if checksum is not None:
+            kwargs['checksum'] = checksum
+        self.metadata.version_args[str(ver)] = kwargs
+
+    def variant(self, name, default=None, description='', values=None,
+                multi=None, validator=None):
+        # Let the real directive report malformed variants
+        if default is None or default == '' or validator is not None:
+            raise DynamicMetadataError('cannot check variant %s' % name)
+
+        import spack.variant  # circular import through spack.repo
+        if values is None:
+            # Same default as the variant directive
+            if str(default).upper() in ('TRUE', 'FALSE'):
+                values = (True, False)
+            else:
+                values = lambda x: True  # noqa: E731
+
+        description = str(description).strip()
+        self.metadata.variants[name] = {
+            'default': default,
+            'description': description,
+            'multi': bool(multi),
+            'allowed_values': spack.variant.Variant(
+                name, default, description, values, bool(multi)
+            ).allowed_values}
+
+    def depends_on(self, spec, when=None,
+                   type=spack.dependency.default_deptype, patches=None):
+        when = self._when(when)
+        if when is False:
+            return
+
+        # Parsing every dependency spec is what makes importing slow, so
+        # just pick the package name out of simple specs
+        match = _spec_name_re.match(spec)
+        if match:
+            dep_name = match.group(1)
+        else:
+            dep_name = spack.spec.Spec(spec).name
+
+        conds = self.metadata.dependencies.setdefault(dep_name, [])
+        for cond in conds:
+            if cond['when'] == when:
+                # Same condition: the directive merges into one dependency
+                merged = spack.spec.Spec(cond['spec'])
+                merged.constrain(spec, deps=False)
+                cond['spec'] = str(merged)
+                cond['type'] = sorted(set(cond['type']).union(
+                    spack.dependency.canonical_deptype(type)))
+                return
+
+        conds.append({
+            'spec': spec.strip(),
+            'when': when,
+            'type': list(spack.dependency.canonical_deptype(type))})
+
+    def extends(self, spec, **kwargs):
+        self.depends_on(spec, when=kwargs.get('when'))
+
+    def provides(self, *specs, **kwargs):
+        when = self._when(kwargs.get('when'))
+        if when is False:
+            return
+
+        for string in specs:
+            for provided_spec in spack.spec.parse(string):
+                self.metadata.provided.append(
+                    {'spec': str(provided_spec), 'when': when})
+
+    def conflicts(self, conflict_spec, when=None, msg=None):
+        when = self._when(when)
+        if when is False:
+            return
+
+        self.metadata.conflicts.append(
+            {'spec': conflict_spec, 'when': when, 'msg': msg})
+
+    def patch(self, url_or_filename, level=1, when=None, working_dir='.',
+              **kwargs):
+        when = self._when(when)
+        if when is False:
+            return
+
+        self.metadata.patches.append({
+            'url_or_filename': url_or_filename,
+            'when': when,
+            'level': level,
+            'working_dir': working_dir})
+
+    def resource(self, **kwargs):
+        pass
+
+
+def _literal_args(call):
+    """Positional and keyword arguments of a call, if they're literals."""
+    if (getattr(call, 'starargs', None) or getattr(call, 'kwargs', None) or
+            any(k.arg is None for k in call.keywords)):
+        raise DynamicMetadataError('arguments are unpacked')
+
+    try:
+        args = [ast.literal_eval(a) for a in call.args]
+        kwargs = dict(
+            (k.arg, ast.literal_eval(k.value)) for k in call.keywords)
+    except (ValueError, TypeError, SyntaxError):
+        raise DynamicMetadataError('arguments are not literals')
+
+    return args, kwargs
+
+
+def _directive_call(node):
+    """Name of the directive called by a statement, or ``None``."""
+    import spack.util.package_hash as ph  # circular import through spack.repo
+    if ph.is_directive(node):
+        return node.value.func.id
+    return None
+
+
+#: Functions that are called in class bodies but don't touch metadata
+_harmless_calls = ('run_after', 'run_before', 'filter_compiler_wrappers')
+
+
+def _may_change_metadata(node):
+    """Whether a statement may call directives or set metadata attributes.
+    """
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            func = child.func
+            if isinstance(func, ast.Call):
+                # e.g. run_after('install')(PackageBase.sanity_check_prefix)
+                func = func.func
+            if not (isinstance(func, ast.Name) and
+                    func.id in _harmless_calls):
+                return True
+
+        if (isinstance(child, ast.Name) and child.id in metadata_attrs and
+                isinstance(child.ctx, ast.Store)):
+            return True
+    return False
+
+
+def _sets_fetch_attrs(node):
+    """Whether a statement may set attributes in ``fetch_attrs``."""
+    return any(
+        isinstance(child, ast.Name) and child.id in fetch_attrs and
+        isinstance(child.ctx, ast.Store)
+        for child in ast.walk(node))
+
+
+def _find_class(root, class_name):
+    classes = [node for node in root.body
+               if isinstance(node, ast.ClassDef) and node.name == class_name]
+    if len(classes) != 1:
+        raise DynamicMetadataError('cannot find class %s' % class_name)
+    return classes[0]
+
+
+def _class_body(class_node, key):
+    """Directive calls and literal attributes in a class body.
+
+    Returns a list of ``(key, directive name, args, kwargs)`` tuples, a
+    dictionary of the attributes listed in ``metadata_attrs`` and
+    ``fetch_attrs``, and whether the fetch attributes are all literals.
+    Anything that could change the directives or metadata attributes at
+    class creation time is reported with a ``DynamicMetadataError``.
+    """
+    directives, attrs, static_fetch = [], {}, True
+    for i, node in enumerate(class_node.body):
+        name = _directive_call(node)
+        if name:
+            args, kwargs = _literal_args(node.value)
+            directives.append(((key, i), name, args, kwargs))
+
+        elif isinstance(node, ast.Assign):
+            targets = [t.id for t in node.targets if isinstance(t, ast.Name)]
+            try:
+                value = ast.literal_eval(node.value)
+            except (ValueError, TypeError, SyntaxError):
+                if any(t in metadata_attrs for t in targets):
+                    raise DynamicMetadataError('attribute is not a literal')
+                if any(t in fetch_attrs for t in targets):
+                    static_fetch = False
+                continue
+            attrs.update(
+                (t, value) for t in targets
+                if t in metadata_attrs or t in fetch_attrs)
+
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            if node.name in metadata_attrs:
+                raise DynamicMetadataError('%s is computed' % node.name)
+            if node.name in fetch_attrs or node.name in fetch_methods:
+                static_fetch = False
+
+        elif _may_change_metadata(node):
+            raise DynamicMetadataError(
+                'unsupported statement at line %d' % node.lineno)
+
+        elif _sets_fetch_attrs(node):
+            static_fetch = False
+
+    return directives, attrs, static_fetch
+
+
+#: Directive calls of base classes, memoized by class
+_base_class_directives = {}
+
+
+def _base_directives(cls):
+    """Directive calls a package inherits from a base class.
+
+    This mirrors ``DirectiveMeta``, which collects directives following
+    the MRO and drops duplicates inherited through several bases.
+    """
+    import spack.package  # circular import through spack.repo
+    import spack.util.package_hash as ph  # circular import through spack.repo
+    if not (isinstance(cls, type) and
+            issubclass(cls, spack.package.PackageBase)):
+        return []
+
+    if cls not in _base_class_directives:
+        try:
+            directives = []
+            for base in reversed(cls.__bases__):
+                directives.extend(_base_directives(base))
+
+            filename = inspect.getsourcefile(cls)
+            root = ph.parse_file(filename)
+            own, _, _ = _class_body(
+                _find_class(root, cls.__name__), filename)
+            directives.extend(own)
+
+            seen = set()
+            result = []
+            for d in directives:
+                if d[0] not in seen:
+                    seen.add(d[0])
+                    result.append(d)
+            _base_class_directives[cls] = result
+
+        except DynamicMetadataError as e:
+            _base_class_directives[cls] = e
+
+    result = _base_class_directives[cls]
+    if isinstance(result, DynamicMetadataError):
+        raise result
+    return result
+
+
+def _linearize(bases):
+    """Method resolution order of a class with these bases, without the
+    class itself (C3 linearization, as Python does it)."""
+    seqs = [list(inspect.getmro(b)) for b in bases] + [list(bases)]
+    mro = []
+    while True:
+        seqs = [seq for seq in seqs if seq]
+        if not seqs:
+            return mro
+        for seq in seqs:
+            head = seq[0]
+            if not any(head in s[1:] for s in seqs):
+                break
+        else:
+            raise DynamicMetadataError('inconsistent base classes')
+        mro.append(head)
+        for seq in seqs:
+            if seq[0] is head:
+                del seq[0]
+
+
+def _inherited_attrs(bases):
+    """Metadata and fetch attributes that a package class inherits from
+    its bases, and whether the fetch attributes are static."""
+    import spack.package  # circular import through spack.repo
+    attrs, static_fetch = {}, True
+    for cls in _linearize(bases):
+        for name, value in vars(cls).items():
+            if name in fetch_methods:
+                if cls is not spack.package.PackageBase:
+                    static_fetch = False
+                continue
+
+            if name in attrs or (
+                    name not in metadata_attrs and name not in fetch_attrs):
+                continue
+
+            if isinstance(value, (property, classmethod, staticmethod)) or \
+                    callable(value):
+                if name in metadata_attrs:
+                    raise DynamicMetadataError('%s is computed' % name)
+                static_fetch = False
+                continue
+
+            attrs[name] = copy.deepcopy(value)
+
+    return attrs, static_fetch
+
+
+def extract_metadata(pkg_name, namespace, filename):
+    """Extract a ``PackageMetadata`` record from a package file.
+
+    Raises:
+        DynamicMetadataError: if the metadata can't be determined without
+            importing the package.
+    """
+    import spack.pkgkit  # circular import through spack.repo
+    import spack.util.package_hash as ph  # circular import through spack.repo
+    try:
+        root = ph.parse_file(filename)
+    except SyntaxError:
+        raise DynamicMetadataError('syntax error')
+
+    # Directives at module scope end up in the next class created
+    if any(_directive_call(node) for node in root.body):
+        raise DynamicMetadataError('directives at module scope')
+
+    class_node = _find_class(
+        root, spack.util.naming.mod_to_class(pkg_name))
+    if class_node.decorator_list:
+        raise DynamicMetadataError('package class is decorated')
+
+    base_classes = []
+    for base in class_node.bases:
+        # Package files see everything in spack.pkgkit
+        if not isinstance(base, ast.Name):
+            raise DynamicMetadataError('unsupported base class')
+        base_cls = getattr(spack.pkgkit, base.id, None)
+        if not (isinstance(base_cls, type) and
+                issubclass(base_cls, spack.package.PackageBase)):
+            raise DynamicMetadataError('unknown base class %s' % base.id)
+        base_classes.append(base_cls)
+
+    directives = []
+    for base_cls in reversed(base_classes):
+        directives.extend(_base_directives(base_cls))
+
+    own, own_attrs, static_fetch = _class_body(class_node, filename)
+    directives.extend(own)
+
+    attrs, inherited_static_fetch = _inherited_attrs(base_classes)
+    attrs.update(own_attrs)
+
+    metadata = PackageMetadata(
+        pkg_name, namespace, doc=ast.get_docstring(class_node, clean=False))
+    for attr in metadata_attrs:
+        if attr in attrs:
+            setattr(metadata, attr, attrs[attr])
+    if static_fetch and inherited_static_fetch:
+        metadata.fetch_attrs = dict(
+            (attr, attrs[attr]) for attr in fetch_attrs if attr in attrs)
+
+    builder = _MetadataBuilder(metadata)
+    seen = set()
+    for key, name, args, kwargs in directives:
+        if key in seen:
+            continue
+        seen.add(key)
+
+        try:
+            getattr(builder, name)(*args, **kwargs)
+        except DynamicMetadataError:
+            raise
+        except Exception as e:
+            raise DynamicMetadataError(
+                'cannot evaluate %s(): %s' % (name, str(e)))
+
+    return metadata
+
+
+def possible_dependencies(*specs, **kwargs):
+    """Get the possible dependencies of a number of packages.
+
+    Like ``spack.package.possible_dependencies()``, but from metadata
+    records, so that packages are imported only if necessary.
+    """
+    records = []
+    for spec in specs:
+        if not isinstance(spec, spack.spec.Spec):
+            spec = spack.spec.Spec(spec)
+
+        if spack.repo.path.is_virtual(spec.name):
+            records.extend(
+                spack.repo.path.get_pkg_metadata(p.name)
+                for p in spack.repo.path.providers_for(spec.name))
+        else:
+            records.append(spack.repo.path.get_pkg_metadata(spec.fullname))
+
+    visited = {}
+    for metadata in records:
+        metadata.possible_dependencies(visited=visited, **kwargs)
+
+    return visited
+
+
+#: Records reused within ``reuse_records()``, or ``None`` outside of it
+_reused_records = None
+
+
+@contextlib.contextmanager
+def reuse_records():
+    """Extract the metadata of each package only once in this context.
+
+    Several indexes are built from the same records (see
+    ``spack.repo.RepoIndex``), so the records are kept until the end of
+    the context rather than extracted again for each index.
+    """
+    global _reused_records
+    if _reused_records is not None:
+        yield
+        return
+
+    _reused_records = {}
+    try:
+        yield
+    finally:
+        _reused_records = None
+
+
+def get_metadata(pkg_fullname, repo=None):
+    """Get metadata for a package, importing it only if necessary."""
+    repo = repo or spack.repo.path.repo_for_pkg(pkg_fullname)
+    pkg_name = pkg_fullname.rpartition('.')[2]
+    key = (repo.namespace, pkg_name)
+
+    if _reused_records is not None and key in _reused_records:
+        return PackageMetadata.from_dict(_reused_records[key])
+
+    try:
+        metadata = extract_metadata(
+            pkg_name, repo.namespace,
+            repo.filename_for_package_name(pkg_name))
+    except DynamicMetadataError as e:
+        tty.debug('Importing %s for its metadata: %s' % (pkg_fullname, e))
+        metadata = PackageMetadata.from_package_class(
+            repo.get_pkg_class(pkg_name))
+
+    if _reused_records is not None:
+        _reused_records[key] = copy.deepcopy(metadata.to_dict())
+    return metadata
+
+
+def sources_mtime():
+    """Latest modification time of the Spack files that all records
+    depend on, besides the package files themselves: the build system
+    base classes and the code that extracts records."""
+    module_path = spack.paths.module_path
+    sources = glob.glob(os.path.join(spack.paths.build_systems_path, '*.py'))
+    sources.extend(os.path.join(module_path, f) for f in (
+        'package.py', 'directives.py', 'pkgkit.py', 'variant.py'))
+    sources.append(os.path.join(module_path, 'util', 'package_metadata.py'))
+    return max(os.path.getmtime(f) for f in sources if os.path.exists(f))
+
+
+class PackageMetadataIndex(object):
+    """Maps package names to their ``PackageMetadata`` records."""
+
+    def __init__(self):
+        self._records = {}
+
+    def __getitem__(self, pkg_name):
+        return PackageMetadata.from_dict(self._records[pkg_name])
+
+    def __contains__(self, pkg_name):
+        return pkg_name in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def to_json(self, stream):
+        sjson.dump({'metadata': self._records}, stream)
+
+    @staticmethod
+    def from_json(stream):
+        index = PackageMetadataIndex()
+        index._records = sjson.load(stream)['metadata']
+        return index
+
+    def update_package(self, pkg_fullname):
+        """Update the record of a package in the index."""
+        metadata = get_metadata(pkg_fullname)
+        self._records[metadata.name] = metadata.to_dict()
+
+    def remove_package(self, pkg_fullname):
+        """Remove a package from the index."""
+        self._records.pop(pkg_fullname.rpartition('.')[2], None)
+
+    def merge(self, other):
+        """Merge another metadata index into this one."""
+        self._records.update(other._records)
+
+
+class DynamicMetadataError(spack.error.SpackError):
+    """Raised when package metadata can only be found by importing it."""
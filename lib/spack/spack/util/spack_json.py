@@ -26,6 +26,10 @@ def load(stream):
     else:
         load = json.load
 
+    # Strings are already native on Python 3, so don't copy everything
+    if sys.version_info[0] >= 3:
+        return load(stream)
+
     return _strify(load(stream, object_hook=_strify), ignore_dicts=True)
 
 
@@ -14,9 +14,10 @@
 """
 import ctypes
 import collections
+import re
 
 from ordereddict_backport import OrderedDict
-from six import string_types, StringIO
+from six import string_types, integer_types, StringIO
 
 import ruamel.yaml as yaml
 from ruamel.yaml import RoundTripLoader, RoundTripDumper
@@ -207,6 +208,111 @@ def dump(obj, default_flow_style=False, stream=None):
                      Dumper=SafeDumper, stream=stream)
 
 
+#: Types that ``dump_flow`` writes itself, rather than through ruamel
+_flow_mapping_types = (dict, syaml_dict)
+_flow_sequence_types = (list, syaml_list, tuple)
+_flow_scalar_types = string_types + integer_types + (float,)
+
+#: Strings that ``dump`` writes in plain style in any flow context: either
+#: identifiers, or alphanumeric strings that can't be read as numbers
+_flow_plain_str = re.compile(
+    r'^(?:[A-Za-z_][A-Za-z0-9_.-]*|[1-9][0-9a-z]*[a-df-z][0-9a-z]*)$')
+_flow_plain_exceptions = set(['true', 'false', 'null'])
+
+#: Text written by ``dump`` for other scalars, by context, type and value
+_flow_scalars = {}
+
+#: Documents that ``dump`` writes each scalar in, for each context, and the
+#: text around the scalar in them
+_flow_scalar_contexts = {
+    'key': (lambda x: syaml_dict([(x, 0)]), '{', '0}\n'),
+    'value': (lambda x: syaml_dict([('k', x)]), '{k: ', '}\n'),
+    'item': (lambda x: syaml_dict([('k', [x])]), '{k: [', ']}\n'),
+}
+
+
+class _FlowFallback(Exception):
+    """Raised when ``dump_flow`` can't write an object itself."""
+
+
+def _flow_scalar(obj, context):
+    """Text written by ``dump(..., default_flow_style=True)`` for a scalar
+    in a given context."""
+    if isinstance(obj, string_types) and _flow_plain_str.match(obj) and \
+            obj.lower() not in _flow_plain_exceptions:
+        return obj + ': ' if context == 'key' else obj
+
+    # Anything else, e.g. ruamel's own types, may carry its own style
+    if obj is not None and not isinstance(obj, _flow_scalar_types):
+        raise _FlowFallback()
+
+    key = (context, type(obj), obj if isinstance(obj, string_types)
+           else repr(obj))
+    text = _flow_scalars.get(key)
+    if text is None:
+        make_doc, prefix, suffix = _flow_scalar_contexts[context]
+        doc = dump(make_doc(obj), default_flow_style=True)
+
+        # Multi-line scalars are indented according to their depth
+        if not (doc.startswith(prefix) and doc.endswith(suffix)) or \
+                '\n' in doc[len(prefix):-len(suffix)]:
+            raise _FlowFallback()
+        text = _flow_scalars[key] = doc[len(prefix):-len(suffix)]
+    return text
+
+
+def _flow_write(obj, out, context='value'):
+    if type(obj) in _flow_mapping_types:
+        if not obj:
+            out.append('{}')
+            return
+        out.append('{')
+        first = True
+        for key, value in obj.items():
+            if not first:
+                out.append(', ')
+            first = False
+            out.append(_flow_scalar(key, 'key'))
+            _flow_write(value, out)
+        out.append('}')
+
+    elif type(obj) in _flow_sequence_types:
+        if not obj:
+            out.append('[]')
+            return
+        out.append('[')
+        first = True
+        for item in obj:
+            if not first:
+                out.append(', ')
+            first = False
+            _flow_write(item, out, 'item')
+        out.append(']')
+
+    else:
+        out.append(_flow_scalar(obj, context))
+
+
+def dump_flow(obj):
+    """Return the same text as ``dump(obj, default_flow_style=True)``.
+
+    Mappings and sequences of the types Spack builds itself are written
+    directly, and scalars are written in the same style ruamel would choose,
+    which is computed once per distinct scalar. This is much faster than
+    going through ruamel for small documents like spec node dictionaries.
+    """
+    if type(obj) not in _flow_mapping_types:
+        return dump(obj, default_flow_style=True)
+
+    out = []
+    try:
+        _flow_write(obj, out)
+    except _FlowFallback:
+        return dump(obj, default_flow_style=True)
+    out.append('\n')
+    return ''.join(out)
+
+
 def file_line(mark):
     """Format a mark as <file>:<line> information."""
     result = mark.name
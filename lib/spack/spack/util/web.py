@@ -13,6 +13,7 @@
 import re
 import shutil
 import ssl
+import stat
 import sys
 import traceback
 
@@ -244,7 +245,7 @@ def remove_url(url):
     # Don't even try for other URL schemes.
 
 
-def _iter_s3_contents(contents, prefix):
+def _iter_s3_contents(contents, prefix, stamps=False):
     for entry in contents:
         key = entry['Key']
 
@@ -256,10 +257,14 @@ def _iter_s3_contents(contents, prefix):
         if key == '.':
             continue
 
-        yield key
+        if stamps:
+            yield key, entry['ETag']
+        else:
+            yield key
 
 
-def _list_s3_objects(client, bucket, prefix, num_entries, start_after=None):
+def _list_s3_objects(client, bucket, prefix, num_entries, start_after=None,
+                     stamps=False):
     list_args = dict(
         Bucket=bucket,
         Prefix=prefix[1:],
@@ -274,19 +279,20 @@ def _list_s3_objects(client, bucket, prefix, num_entries, start_after=None):
     if result['IsTruncated']:
         last_key = result['Contents'][-1]['Key']
 
-    iter = _iter_s3_contents(result['Contents'], prefix)
+    iter = _iter_s3_contents(result['Contents'], prefix, stamps)
 
     return iter, last_key
 
 
-def _iter_s3_prefix(client, url, num_entries=1024):
+def _iter_s3_prefix(client, url, num_entries=1024, stamps=False):
     key = None
     bucket = url.netloc
     prefix = re.sub(r'^/*', '/', url.path)
 
     while True:
         contents, key = _list_s3_objects(
-            client, bucket, prefix, num_entries, start_after=key)
+            client, bucket, prefix, num_entries, start_after=key,
+            stamps=stamps)
 
         for x in contents:
             yield x
@@ -321,6 +327,29 @@ def list_url(url, recursive=False):
             for key in _iter_s3_prefix(s3, url)))
 
 
+def list_url_stamps(url):
+    """Map each file directly under url to a stamp that changes when the
+    file is replaced: its size and modification time for local files, its
+    ETag for S3 objects.
+    """
+    url = url_util.parse(url)
+
+    local_path = url_util.local_file_path(url)
+    if local_path:
+        stamps = {}
+        for subpath in os.listdir(local_path):
+            st = os.stat(os.path.join(local_path, subpath))
+            if stat.S_ISREG(st.st_mode):
+                stamps[subpath] = '{0}-{1!r}'.format(st.st_size, st.st_mtime)
+        return stamps
+
+    if url.scheme == 's3':
+        s3 = s3_util.create_s3_session(url)
+        return dict((key, etag)
+                    for key, etag in _iter_s3_prefix(s3, url, stamps=True)
+                    if '/' not in key)
+
+
 def spider(root_urls, depth=0, concurrency=32):
     """Get web pages from root URLs.
 